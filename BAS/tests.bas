@@ -102,6 +102,75 @@
 1010 READ I , J , K , L 
 1020 PRINT ":4561.5" 
 1030 PRINT I ; J ; K ; L 
+1040 PRINT "* FOR loop, not entered" 
+1050 PRINT ":5" 
+1060 FOR I = 5 TO 1 
+1070 PRINT "Should not print this line" 
+1080 FOR J = 1 TO 2 
+1090 NEXT 
+1100 NEXT 
+1110 PRINT I 
+1120 PRINT "* FOR loop, jumped out of" 
+1130 PRINT ":6" 
+1140 FOR I = 1 TO 3 
+1150 IF I = 2 THEN 1170 
+1160 NEXT I 
+1170 FOR J = 1 TO 2 
+1180 FOR I = 1 TO 2 
+1190 NEXT I 
+1200 NEXT J 
+1210 PRINT I + J 
+1220 PRINT "* Array of four dimensions, mixed values" 
+1230 PRINT ":7 2.5 3000000000" 
+1240 DIM B ( 2 , 3 , 2 , 3 ) 
+1250 LET B ( 1 , 2 , 1 , 3 ) = 7 
+1260 LET B ( 2 , 3 , 2 , 3 ) = 2.5 
+1270 LET B ( 0 , 0 , 0 , 0 ) = 3000000000 
+1280 PRINT B ( 1 , 2 , 1 , 3 ) ; " " ; B ( 2 , 3 , 2 , 3 ) ; " " ; B ( 0 , 0 , 0 , 0 ) 
+1290 PRINT "* Array and variable sharing a name" 
+1300 PRINT ":4 9" 
+1310 LET B = 4 
+1320 LET B ( 1 , 1 , 1 , 1 ) = 9 
+1330 PRINT B ; " " ; B ( 1 , 1 , 1 , 1 ) 
+1340 PRINT "* Constant expressions match variable ones" 
+1350 PRINT ":1 1 ABD -9" 
+1360 LET D = 180 
+1370 LET T = 2 
+1380 PRINT IFF ( 3.14159 / 180 = 3.14159 / D , 1 , 0 ) ; " " ; IFF ( SQR ( 2 ) * PI / 2 = SQR ( T ) * PI / T , 1 , 0 ) ; " " ; LEFT$ ( "ABC" , 2 ) + "D" ; " " ; - ( 4 + 5 ) 
+1390 PRINT "* Loop and subroutine within a line" 
+1400 PRINT ":123 FIRST/SECOND" 
+1410 FOR I = 1 TO 3 : PRINT I ; : NEXT I : PRINT " " ; : GOSUB 1660 
+1420 PRINT "* Unary minus on functions and arrays" 
+1430 PRINT ":-2.0 -5 -3 5" 
+1440 DIM U ( 2 ) 
+1450 LET U ( 1 ) = 5 
+1460 PRINT - SQR ( 4 ) ; " " ; - U ( 1 ) ; " " ; 2 - ABS ( - 5 ) ; " " ; - - U ( 1 ) 
+1470 PRINT "* Computed branch into the middle of a block" 
+1480 PRINT ":BC" 
+1490 LET K = 1510 
+1500 GOTO K + 10 
+1510 PRINT "A" ; 
+1520 PRINT "B" ; 
+1530 PRINT "C" 
+1540 PRINT "* Registered statements and functions" 
+1545 PRINT ":7 9 ABAB" 
+1550 POKE 1 , 7 
+1555 POKE 2 , PEEK ( 1 ) + 2 
+1560 PRINT PEEK ( 1 ) ; " " ; PEEK ( 2 ) ; " " ; REPEAT$ ( "AB" , 2 ) 
+1561 PRINT "* RND called once by a statement run again" 
+1562 PRINT ":0" 
+1563 R = RND ( - 1 ) 
+1564 RB = 5 
+1565 RX = RND ( 1 ) + RB ( 1 ) 
+1566 RY = RND ( 1 ) 
+1567 R = RND ( - 1 ) + RND ( 1 ) 
+1568 RZ = RND ( 1 ) 
+1569 PRINT INT ( ( RY - RZ ) * 1000000 ) 
+1570 REM This test must come last, as its error ends the run 
+1575 PRINT "* Unassigned variable in a condition" 
+1580 PRINT ":Name ZZ is not defined in line 1590" 
+1590 IF ZZ = 0 THEN 1600 ELSE 1600 
+1600 PRINT "No error for ZZ" 
 1610 REM *** Finished *** 
 1620 STOP 
 1630 REM A SUBROUTINE TEST 
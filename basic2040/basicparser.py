@@ -14,84 +14,389 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from .basictoken import BASICToken as Token
-from .flowsignal import FlowSignal
+from .flowsignal import (
+    FlowSignal,
+    LoopFrame,
+    RETURN_SIGNAL,
+    STOP_SIGNAL,
+    NEXT_SIGNAL,
+    FREEZE_SIGNAL,
+)
+from array import array
 import math
 import random
 from time import monotonic
 
 
-"""Implements a BASIC array, which may have up
-to three dimensions of fixed size.
+"""Implements a BASIC array, which may have any
+number of dimensions of fixed size.
 
 """
 
+# Range of values held by a packed numeric array
+_PACKED_MIN = -0x80000000
+_PACKED_MAX = 0x7FFFFFFF
+
 
 class BASICArray:
-    def __init__(self, dimensions):
+    def __init__(self, dimensions, string=False):
         """Initialises the object with the specified
-        number of dimensions. Maximum number of
-        dimensions is three
+        dimensions. The elements are held in a single flat
+        sequence in row-major order, rather than as nested
+        lists, so that an array takes up little more memory
+        than its elements do.
+
+        A numeric array starts out packed into an array.array
+        of 32 bit integers. The first time any other value is
+        stored in it, such as a float, the elements are moved
+        into a list, so that every value reads back exactly as
+        it was stored. String arrays are always held in a list.
 
         :param dimensions: List of array dimensions and their
         corresponding sizes
+        :param string: True for a string array
 
         """
-        self.dims = min(3, len(dimensions))
+        self.dims = len(dimensions)
 
         if self.dims == 0:
             raise SyntaxError("Zero dimensional array specified")
 
         # Check for invalid sizes and ensure int
+        # MSBASIC: Overdim by one, as some dialects are 1 based and expect
+        #          to use the last item at index = size
+        self.sizes = []
+        count = 1
         for i in range(self.dims):
             if dimensions[i] < 0:
                 raise SyntaxError("Negative array size specified")
             # Allow sizes like 1.0f, but not 1.1f
             if int(dimensions[i]) != dimensions[i]:
                 raise SyntaxError("Fractional array size specified")
-            dimensions[i] = int(dimensions[i])
+            self.sizes.append(int(dimensions[i]) + 1)
+            count = count * self.sizes[-1]
 
         # MSBASIC: Initialize to Zero
-        # MSBASIC: Overdim by one, as some dialects are 1 based and expect
-        #          to use the last item at index = size
-        if self.dims == 1:
-            self.data = [0 for x in range(dimensions[0] + 1)]
-        elif self.dims == 2:
-            self.data = [
-                [0 for x in range(dimensions[1] + 1)] for x in range(dimensions[0] + 1)
-            ]
+        if string:
+            self.data = [0] * count
         else:
-            self.data = [
-                [
-                    [0 for x in range(dimensions[2] + 1)]
-                    for x in range(dimensions[1] + 1)
-                ]
-                for x in range(dimensions[0] + 1)
-            ]
+            self.data = array("i", (0 for x in range(count)))
+
+    def get(self, indexes):
+        """Returns the element at the specified indexes
+
+        :param indexes: The list of indexes, one for each dimension
+
+        :return: The value of the element
+
+        """
+        if self.dims != len(indexes):
+            raise IndexError("Incorrect number of indices applied to array")
+
+        # Work out the position of the element in the flat storage
+        sizes = self.sizes
+        position = 0
+        dimension = 0
+        for index in indexes:
+            size = sizes[dimension]
+            if not 0 <= index < size:
+                raise IndexError("Array index out of range")
+
+            position = position * size + index
+            dimension = dimension + 1
+
+        return self.data[position]
+
+    def set(self, indexes, value):
+        """Stores a value in the element at the specified indexes
+
+        :param indexes: The list of indexes, one for each dimension
+        :param value: The value to be stored
+
+        """
+        if self.dims != len(indexes):
+            raise IndexError("Incorrect number of indices applied to array")
+
+        sizes = self.sizes
+        position = 0
+        dimension = 0
+        for index in indexes:
+            size = sizes[dimension]
+            if not 0 <= index < size:
+                raise IndexError("Array index out of range")
+
+            position = position * size + index
+            dimension = dimension + 1
+
+        if not isinstance(self.data, list) and (
+            type(value) != int or not _PACKED_MIN <= value <= _PACKED_MAX
+        ):
+            # The value cannot be packed, so unpack the array
+            self.data = list(self.data)
+
+        self.data[position] = value
 
     def pretty_print(self):
-        print(str(self.data))
+        print(str(list(self.data)))
+
+
+# Value of a variable slot which has not been assigned. Any
+# arithmetic on it fails, so reading it can be detected without
+# testing every value read
+_UNSET = object()
+
+
+def _nothing():
+    """Compiled form of statements with no run time
+    effect, such as REM and DATA
+
+    """
+    return None
+
+
+def split_statements(tokenlist):
+    """Splits the tokens of a program line into the colon
+    separated statements it holds
+
+    :param tokenlist: The tokens of the line, without its
+    line number
+
+    :return: A tuple holding a tuple of tokens for each statement
+
+    """
+    statements = []
+    start = 0
+    for position in range(len(tokenlist)):
+        if tokenlist[position].category == Token.COLON:
+            statements.append(tuple(tokenlist[start:position]))
+            start = position + 1
+
+    statements.append(tuple(tokenlist[start:]))
+
+    return tuple(statements)
+
+
+# Precedence of the operators, from the most loosely binding
+_LOGICAL = 1
+_NOT = 2
+_RELATIONAL = 3
+_ADDITIVE = 4
+_MULTIPLICATIVE = 5
+
+# Precedence of each binary operator, keyed by token category
+_PRECEDENCE = {
+    Token.OR: _LOGICAL,
+    Token.AND: _LOGICAL,
+    Token.EQUAL: _RELATIONAL,
+    Token.ASSIGNOP: _RELATIONAL,
+    Token.NOTEQUAL: _RELATIONAL,
+    Token.LESSER: _RELATIONAL,
+    Token.GREATER: _RELATIONAL,
+    Token.LESSEQUAL: _RELATIONAL,
+    Token.GREATEQUAL: _RELATIONAL,
+    Token.PLUS: _ADDITIVE,
+    Token.MINUS: _ADDITIVE,
+    Token.TIMES: _MULTIPLICATIVE,
+    Token.DIVIDE: _MULTIPLICATIVE,
+    Token.MODULO: _MULTIPLICATIVE,
+}
+
+
+def _binary(category, left, right):
+    """Combines the closures for the two operands of a binary
+    operator into a single closure applying the operator. Both
+    operands are always evaluated, left first.
+
+    :param category: The token category of the operator
+    :param left: Closure evaluating the left operand
+    :param right: Closure evaluating the right operand
+
+    :return: A closure evaluating the whole expression
+
+    """
+    if category == Token.PLUS:
+        return lambda: left() + right()
+
+    elif category == Token.MINUS:
+        return lambda: left() - right()
+
+    elif category == Token.TIMES:
+        return lambda: left() * right()
+
+    elif category == Token.DIVIDE:
+        return lambda: left() / right()
 
+    elif category == Token.MODULO:
+        return lambda: left() % right()
 
-"""Implements a BASIC parser that parses a single
-statement when supplied.
+    elif category == Token.EQUAL:
+        return lambda: left() == right()
+
+    elif category == Token.NOTEQUAL:
+        return lambda: left() != right()
+
+    elif category == Token.LESSER:
+        return lambda: left() < right()
+
+    elif category == Token.GREATER:
+        return lambda: left() > right()
+
+    elif category == Token.LESSEQUAL:
+        return lambda: left() <= right()
+
+    elif category == Token.GREATEQUAL:
+        return lambda: left() >= right()
+
+    elif category == Token.OR:
+
+        def logical_or():
+            left_val = left()
+            right_val = right()
+            return left_val or right_val
+
+        return logical_or
+
+    elif category == Token.AND:
+
+        def logical_and():
+            left_val = left()
+            right_val = right()
+            return left_val and right_val
+
+        return logical_and
+
+
+def native_parse(name, function, types, statement=False):
+    """Builds the parse callable for a function or statement
+    implemented in Python, such as one reading a sensor, to be
+    registered with a BASICParser. Each argument is evaluated and
+    checked against its declared type in a single pass, and the
+    values passed straight to the Python callable.
+
+    :param name: The keyword, used in error messages
+    :param function: The Python callable, passed the value
+    of each argument in turn
+    :param types: A string with a character for each argument,
+    N for a number or S for a string
+    :param statement: True for a statement, whose arguments follow
+    the keyword without parentheses, False for a function
+
+    :return: A callable which parses a use of the function or
+    statement and returns a closure executing it
+
+    >>> from .lexer import Lexer
+    >>> category = len(Token.catnames)
+    >>> parser = BASICParser(None, None)
+    >>> parser.register_statement(category, native_parse("SHOW", print, "NS", True))
+    >>> lexer = Lexer({"SHOW": category})
+    >>> parser.compile(lexer.tokenize('10 SHOW 1 + 2, "A" ')[1:], 10)()
+    3 A
+    """
+    for kind in types:
+        if kind != "N" and kind != "S":
+            raise ValueError("Argument types must be N or S for " + name)
+
+    # True for each argument that must be a string
+    strings = tuple([kind == "S" for kind in types])
+
+    def parse(parser):
+        line_number = parser.line_number()
+
+        arguments = ()
+        token = parser.token()
+        if statement:
+            # The lexer ends a line with trailing whitespace with an
+            # empty token without a category, which ends the arguments
+            if token != None and token.category != None:
+                arguments = [parser.expression()]
+                while True:
+                    token = parser.token()
+                    if token == None or token.category == None:
+                        break
+
+                    parser.consume(Token.COMMA)
+                    arguments.append(parser.expression())
+
+        elif len(strings) > 0:
+            arguments = parser.arguments()
+
+        elif token != None and token.category == Token.LEFTPAREN:
+            # Allow empty parentheses after a function without arguments
+            parser.advance()
+            parser.consume(Token.RIGHTPAREN)
+
+        if len(arguments) != len(strings):
+            raise SyntaxError(
+                "Expecting "
+                + str(len(strings))
+                + " arguments to "
+                + name
+                + " in line "
+                + str(line_number)
+            )
+
+        checks = tuple(zip(arguments, strings))
+
+        def native():
+            values = []
+            for argument, string in checks:
+                value = argument()
+                if isinstance(value, str) != string:
+                    raise TypeError(
+                        "Invalid type supplied to " + name + " in line " + str(line_number)
+                    )
+
+                values.append(value)
+
+            return function(*values)
+
+        if statement:
+
+            def nativestmt():
+                native()
+
+            return nativestmt
+
+        return native
+
+    return parse
+
+
+"""Implements a BASIC parser that compiles a single
+statement into a reusable closure when supplied.
 
 """
 
 
 class BASICParser:
-    def __init__(self, basicdata, terminal):
+    def __init__(self, basicdata, terminal, slots=False):
+        """Initialises the parser
+
+        :param basicdata: The BASICData holding the program's DATA
+        :param terminal: The terminal used for input and output
+        :param slots: True to hold variables in slots rather than
+        by name. Each variable name is then resolved to the position
+        of its slot when a statement is compiled, so that running the
+        statement indexes a list instead of looking up each name
+
+        """
         # Symbol table to hold variable names mapped
-        # to values
+        # to values. When variables are held in slots, this
+        # is instead the list of values, and the slot of each
+        # variable is mapped from its name
         self.__symbol_table = {}
+        self.__slot_map = None
+        if slots:
+            self.__symbol_table = []
+            self.__slot_map = {}
 
-        # Stack on which to store operands
-        # when evaluating expressions
-        self.__operand_stack = []
+        # Table of arrays, keyed by the plain array name. This is
+        # kept apart from the symbol table, as MSBASIC allows a
+        # simple variable and an array to share the same name
+        self.__array_table = {}
 
         # BasicDATA structure containing program DATA Statements
         self.__data = basicdata
-        # List to hold values read from DATA statements
-        self.__data_values = []
 
         # These values will be
         # initialised on a per
@@ -99,50 +404,527 @@ class BASICParser:
         self.__tokenlist = []
         self.__tokenindex = None
 
-        # Previous flowsignal used to determine initializion of
-        # loop variable
-        self.last_flowsignal = None
-
         # file handle list
         self.__file_handles = {}
 
+        # File name and access mode of each open file, and the
+        # names of all files opened for reading during the run,
+        # so that the files can be reopened when a frozen run
+        # is resumed
+        self.__file_modes = {}
+        self.__files_read = []
+
         # Store the terminal object
         self.__terminal = terminal
 
+        # Function supplying the FlowSignal for a branch to a line
+        # given as a literal, set by the program so that it can
+        # resolve each such branch before the run starts
+        self.__branch_resolver = None
+
+        # Methods parsing each statement, keyed by the category
+        # of the token the statement starts with
+        self.__statements = {
+            Token.NAME: self.__assignmentstmt,
+            Token.PRINT: self.__printstmt,
+            Token.LET: self.__letstmt,
+            Token.GOTO: self.__gotostmt,
+            Token.GOSUB: self.__gosubstmt,
+            Token.RETURN: self.__returnstmt,
+            Token.STOP: self.__stopstmt,
+            Token.INPUT: self.__inputstmt,
+            Token.DIM: self.__dimstmt,
+            Token.RANDOMIZE: self.__randomizestmt,
+            Token.DATA: self.__datastmt,
+            Token.READ: self.__readstmt,
+            Token.RESTORE: self.__restorestmt,
+            Token.OPEN: self.__openstmt,
+            Token.CLOSE: self.__closestmt,
+            Token.FSEEK: self.__fseekstmt,
+            Token.CLEAR: self.__clearstmt,
+            Token.CURSOR: self.__cursorstmt,
+            Token.FREEZE: self.__freezestmt,
+            Token.REM: self.__remstmt,
+            Token.FOR: self.__forstmt,
+            Token.NEXT: self.__nextstmt,
+            Token.IF: self.__ifstmt,
+            Token.ON: self.__ongosubstmt,
+        }
+
+        # Count of the operands parsed so far whose value can
+        # change from one run of a statement to the next, such as
+        # variables, so that an expression parsed without adding to
+        # it can be evaluated once, when it is compiled
+        self.__varying = 0
+
+        # Methods parsing each built in function, keyed by the
+        # category of the function name, called once the name
+        # has been consumed
+        self.__functions = {
+            Token.RND: self.__rndfn,
+            Token.PI: self.__pifn,
+            Token.RNDINT: self.__rndintfn,
+            Token.MAX: self.__maxfn,
+            Token.MIN: self.__minfn,
+            Token.POW: self.__powfn,
+            Token.TERNARY: self.__ternaryfn,
+            Token.LEFT: self.__leftfn,
+            Token.RIGHT: self.__rightfn,
+            Token.MID: self.__midfn,
+            Token.INSTR: self.__instrfn,
+            Token.SQR: self.__sqrfn,
+            Token.ABS: self.__absfn,
+            Token.ATN: self.__atnfn,
+            Token.COS: self.__cosfn,
+            Token.EXP: self.__expfn,
+            Token.INT: self.__intfn,
+            Token.ROUND: self.__roundfn,
+            Token.LOG: self.__logfn,
+            Token.SIN: self.__sinfn,
+            Token.TAN: self.__tanfn,
+            Token.CHR: self.__chrfn,
+            Token.ASC: self.__ascfn,
+            Token.STR: self.__strfn,
+            Token.VAL: self.__valfn,
+            Token.LEN: self.__lenfn,
+            Token.UPPER: self.__upperfn,
+            Token.LOWER: self.__lowerfn,
+            Token.TAB: self.__tabfn,
+        }
+
+        # Built in functions whose result depends on nothing but
+        # their arguments, so that calls with constant arguments
+        # can be folded
+        self.__pure = set(self.__functions)
+        self.__pure.discard(Token.RND)
+        self.__pure.discard(Token.RNDINT)
+
+    def reset(self):
+        """Clears all of the run time state (variables and open
+        files) so that a new run can start.
+        The state is emptied in place, as previously compiled
+        statements keep references to it.
+
+        """
+        if self.__slot_map == None:
+            self.__symbol_table.clear()
+
+        else:
+            # Compiled statements keep the slots they were given,
+            # so only the values are cleared
+            for slot in range(len(self.__symbol_table)):
+                self.__symbol_table[slot] = _UNSET
+
+        self.__array_table.clear()
+
+        for handles in self.__file_handles:
+            self.__file_handles[handles].close()
+        self.__file_handles.clear()
+        self.__file_modes.clear()
+        del self.__files_read[:]
+
+    def variables(self):
+        """Returns the variables which have been assigned a value
+
+        :return: A dictionary mapping each variable name to its value
+
+        """
+        if self.__slot_map == None:
+            return dict(self.__symbol_table)
+
+        variables = {}
+        for name, slot in self.__slot_map.items():
+            if self.__symbol_table[slot] is not _UNSET:
+                variables[name] = self.__symbol_table[slot]
+
+        return variables
+
+    def arrays(self):
+        """Returns the arrays which have been dimensioned
+
+        :return: A dictionary mapping each array name to its BASICArray
+
+        """
+        return dict(self.__array_table)
+
+    def loop_frame(self, variable, end, step):
+        """Creates the frame for a loop, bound to the storage of its
+        loop variable
+
+        :param variable: The name of the loop variable
+        :param end: The value the loop variable runs to
+        :param step: The amount added to the loop variable by each NEXT
+
+        :return: The LoopFrame
+
+        """
+        return LoopFrame(
+            variable, end, step, self.__symbol_table, self.__key(variable)
+        )
+
+    def __key(self, name):
+        """Resolves the name of a simple variable to its key in the
+        symbol table, which is the name itself unless variables are
+        held in slots. A slot is allocated for a name not seen before.
+
+        :param name: The name of the variable
+
+        :return: The key of the variable
+
+        """
+        if self.__slot_map == None:
+            return name
+
+        slot = self.__slot_map.get(name)
+        if slot == None:
+            slot = len(self.__symbol_table)
+            self.__slot_map[name] = slot
+            self.__symbol_table.append(_UNSET)
+
+        return slot
+
+    def freeze(self, line_number):
+        """Captures the variables, arrays and open files, made up only of
+        numbers, strings, lists and dictionaries so that the result
+        can be written out and read back by thaw() in a later session.
+        Only files opened for INPUT can be captured, as the contents of
+        any file being written could not be relied upon.
+
+        :param line_number: The line number of the FREEZE statement,
+        to aid error reporting
+
+        :return: A dictionary holding the variables, the arrays, the
+        number, name and position of each open file, and the names of
+        all files read during the run
+
+        """
+        arrays = {}
+        for name, value in self.__array_table.items():
+            arrays[name] = {
+                "sizes": value.sizes,
+                "data": list(value.data),
+                "packed": not isinstance(value.data, list),
+            }
+
+        files = []
+        for num, handle in self.__file_handles.items():
+            name, accessMode = self.__file_modes[num]
+            if accessMode != "r":
+                raise RuntimeError(
+                    "FREEZE: file #"
+                    + str(num)
+                    + " is open for output in line "
+                    + str(line_number)
+                )
+
+            files.append([num, name, handle.tell()])
+
+        return {
+            "variables": self.variables(),
+            "arrays": arrays,
+            "files": files,
+            "read": list(self.__files_read),
+        }
+
+    def thaw(self, state):
+        """Restores the variables, arrays and open files captured by freeze().
+        The run time state is assumed to have been reset beforehand.
+
+        :param state: The dictionary returned by freeze()
+
+        """
+        for name, value in state["variables"].items():
+            self.__symbol_table[self.__key(name)] = value
+
+        for name, value in state["arrays"].items():
+            basic_array = BASICArray([size - 1 for size in value["sizes"]], True)
+            basic_array.data = value["data"]
+            if value["packed"]:
+                basic_array.data = array("i", value["data"])
+
+            self.__array_table[name] = basic_array
+
+        for num, name, position in state["files"]:
+            handle = open(name, "r")
+            handle.seek(position)
+            self.__file_handles[num] = handle
+            self.__file_modes[num] = (name, "r")
+
+        self.__files_read.extend(state["read"])
+
     def parse(self, tokenlist, line_number):
+        """Compiles and immediately executes the supplied
+        statement. See compile() for details
+
+        :param tokenlist: The tokenized program statement
+        :param line_number: The line number of the statement
+
+        :return: The FlowSignal to indicate to the program
+        how to branch if necessary, None otherwise
+
+        """
+        return self.compile(tokenlist, line_number)()
+
+    def register_statement(self, category, parse):
+        """Adds a statement to the language, or replaces a built
+        in one, for example to drive hardware attached to the
+        board. The keyword must already be known to the lexer,
+        such as by passing it in the keywords given to the Lexer.
+
+        :param category: The token category of the keyword
+        that starts the statement
+        :param parse: A callable which is passed this parser,
+        positioned after the keyword, and returns a closure
+        executing the statement. The closure returns a FlowSignal
+        if the program needs to branch, None otherwise
+
+        """
+
+        def parsestmt():
+            self.__advance()  # Advance past the keyword
+            return parse(self)
+
+        self.__statements[category] = parsestmt
+
+    def register_function(self, category, parse):
+        """Adds a function to the language, or replaces a built in
+        one. The function name must already be known to the lexer,
+        such as by passing it in the keywords given to the Lexer.
+
+        :param category: The token category of the function name
+        :param parse: A callable which is passed this parser,
+        positioned after the function name, and returns a closure
+        evaluating the function
+
+        """
+        self.__functions[category] = lambda: parse(self)
+        self.__pure.discard(category)
+
+    def token(self):
+        """Returns the current token, for use by registered
+        statements and functions
+
+        :return: The BASICToken, or None if all of the tokens
+        of the statement have been consumed
+
+        """
+        if self.__tokenindex >= len(self.__tokenlist):
+            return None
+
+        return self.__token
+
+    def advance(self):
+        """Advances to the next token, for use by registered
+        statements and functions
+
+        """
+        self.__advance()
+
+    def consume(self, expected_category):
+        """Consumes a token of the expected category, for use by
+        registered statements and functions, raising an error if the
+        current token is of a different category
+
+        :param expected_category: The expected token category
+
+        """
+        self.__consume(expected_category)
+
+    def expression(self):
+        """Parses an expression, for use by registered statements
+        and functions
+
+        :return: A closure evaluating the expression
+
+        """
+        return self.__logexpr()
+
+    def arguments(self):
+        """Parses comma separated arguments in parentheses, for use
+        by registered functions
+
+        :return: A tuple of closures evaluating the arguments
+
+        """
+        return self.__arguments()
+
+    def line_number(self):
+        """Returns the line number of the statement being
+        compiled, to aid error reporting
+
+        :return: The line number
+
+        """
+        return self.__line_number
+
+    def compile_expression(self, tokenlist, line_number):
+        """Compiles an expression on its own, such as a call to a
+        function found by a code generator within a statement
+
+        :param tokenlist: The tokens of the expression
+        :param line_number: The line number of the statement
+        holding the expression
+
+        :return: A closure evaluating the expression
+
+        """
+        self.__line_number = line_number
+        self.__tokenlist = tokenlist
+        self.__tokenindex = 0
+        self.__token = tokenlist[0]
+
+        expression = self.__logexpr()
+
+        if self.__tokenindex < len(tokenlist):
+            raise SyntaxError("Unexpected token in line " + str(line_number))
+
+        return expression
+
+    def symbol_tables(self):
+        """Returns the tables holding the values of variables
+        and arrays, for use by code compiled outside the parser.
+        Variables are found in the symbol table by the key given by
+        variable_key()
+
+        :return: A tuple of the symbol table and the array table
+
+        """
+        return self.__symbol_table, self.__array_table
+
+    def variable_key(self, name):
+        """Returns the key of a simple variable in the symbol
+        table, giving it a slot if variables are held in slots and
+        it does not have one yet
+
+        :param name: The name of the variable
+
+        :return: The key
+
+        """
+        return self.__key(name)
+
+    def is_varying(self, category):
+        """Tells whether a token names a function that may return a
+        different value each time it is called, such as RND or a
+        function registered by the host, rather than one whose result
+        depends on nothing but its arguments
+
+        :param category: The token category
+
+        :return: True if the token names such a function
+
+        """
+        return category in self.__functions and category not in self.__pure
+
+    def set_branch_resolver(self, resolver):
+        """Sets the function supplying the FlowSignal for each
+        branch to a line given as a literal, such as GOTO 100. The
+        program uses this to hand out a signal which it resolves to
+        the position of the line before the run starts, so that the
+        line need not be looked up as the branch is taken.
+
+        :param resolver: A callable passed the line number and the
+        type of the branch, SIMPLE_JUMP or GOSUB, and returning the
+        FlowSignal, or None to make a new signal for each branch
+
+        """
+        self.__branch_resolver = resolver
+
+    def branch_signal(self, line_number, ftype):
+        """Returns the FlowSignal for a branch to a line given
+        as a literal, made once when the statement is compiled
+
+        :param line_number: The line number branched to
+        :param ftype: The type of the branch, SIMPLE_JUMP or GOSUB
+
+        :return: The FlowSignal
+
+        """
+        if self.__branch_resolver == None:
+            return FlowSignal(line_number, ftype, False)
+
+        return self.__branch_resolver(line_number, ftype)
+
+    def compile(self, tokenlist, line_number):
         """Must be initialised with the list of
         BTokens to be processed. These tokens
         represent a BASIC statement without
         its corresponding line number.
 
+        The statement is parsed once and turned into
+        a closure which can be called each time the
+        statement is to be executed.
+
         :param tokenlist: The tokenized program statement
         :param line_number: The line number of the statement
 
-        :return: The FlowSignal to indicate to the program
-        how to branch if necessary, None otherwise
+        :return: A callable which executes the statement and returns
+        the FlowSignal to indicate to the program how to branch if
+        necessary, None otherwise
 
         """
-        # Remember the line number to aid error reporting
-        self.__line_number = line_number
-        self.__tokenlist = []
-        for token in tokenlist:
-            if token.category == token.COLON:
-                self.__tokenindex = 0
+        stmts = self.compile_statements(split_statements(tokenlist), line_number)
+
+        if len(stmts) == 1:
+            return stmts[0]
 
-                # Assign the first token
-                self.__token = self.__tokenlist[self.__tokenindex]
-                flow = self.__stmt()
+        def line():
+            # Stop at the first statement requiring a branch
+            for stmt in stmts:
+                flow = stmt()
                 if flow:
                     return flow
 
-                self.__tokenlist = []
-            else:
-                self.__tokenlist.append(token)
+            return None
 
-        self.__tokenindex = 0
-        # Assign the first token
-        self.__token = self.__tokenlist[self.__tokenindex]
-        return self.__stmt()
+        return line
+
+    def compile_statements(self, statements, line_number):
+        """Compiles each of the statements of a program line,
+        already split at the colons between them, so that the
+        program can start executing the line from any of them
+
+        :param statements: A tuple holding a tuple of tokens for
+        each statement
+        :param line_number: The line number of the statements
+
+        :return: A tuple of closures, one for each statement, which
+        execute the statement and return the FlowSignal to indicate
+        to the program how to branch if necessary, None otherwise
+
+        """
+        # Remember the line number to aid error reporting
+        self.__line_number = line_number
+
+        stmts = []
+        for statement in statements:
+            self.__tokenlist = statement
+            stmts.append(self.__compile_stmt())
+
+        return tuple(stmts)
+
+    def __compile_stmt(self):
+        """Compiles the statement held in the current token list
+
+        :return: A closure executing the statement. If the statement
+        cannot be parsed, the closure raises the parse error when it is
+        executed, so that any preceding statements on the same line still
+        run first
+
+        """
+        try:
+            self.__tokenindex = 0
+
+            # Assign the first token
+            self.__token = self.__tokenlist[self.__tokenindex]
+            return self.__stmt()
+
+        except Exception as err:
+
+            def error(err=err):
+                raise err
+
+            return error
 
     def __advance(self):
         """Advances to the next token"""
@@ -167,108 +949,49 @@ class BASICParser:
             )
 
     def __stmt(self):
-        """Parses a program statement
+        """Parses a program statement, using the table of
+        statements to find the method that parses it
 
-        :return: The FlowSignal to indicate to the program
-        how to branch if necessary, None otherwise
+        :return: A closure executing the statement, which returns
+        the FlowSignal to indicate to the program how to branch
+        if necessary, None otherwise
 
         """
-        if self.__token.category in [Token.FOR, Token.IF, Token.NEXT, Token.ON]:
-            return self.__compoundstmt()
-
-        else:
-            return self.__simplestmt()
-
-    def __simplestmt(self):
-        """Parses a non-compound program statement
-
-        :return: The FlowSignal to indicate to the program
-        how to branch if necessary, None otherwise
-
-        """
-        if self.__token.category == Token.NAME:
-            self.__assignmentstmt()
-            return None
-
-        elif self.__token.category == Token.PRINT:
-            self.__printstmt()
-            return None
-
-        elif self.__token.category == Token.LET:
-            self.__letstmt()
-            return None
-
-        elif self.__token.category == Token.GOTO:
-            return self.__gotostmt()
-
-        elif self.__token.category == Token.GOSUB:
-            return self.__gosubstmt()
-
-        elif self.__token.category == Token.RETURN:
-            return self.__returnstmt()
-
-        elif self.__token.category == Token.STOP:
-            return self.__stopstmt()
-
-        elif self.__token.category == Token.INPUT:
-            self.__inputstmt()
-            return None
-
-        elif self.__token.category == Token.DIM:
-            self.__dimstmt()
-            return None
+        parse = self.__statements.get(self.__token.category)
+        if parse == None:
+            raise RuntimeError(
+                "Expecting program statement in line " + str(self.__line_number)
+            )
 
-        elif self.__token.category == Token.RANDOMIZE:
-            self.__randomizestmt()
-            return None
+        return parse()
 
-        elif self.__token.category == Token.DATA:
-            self.__datastmt()
-            return None
+    def __remstmt(self):
+        """Parses a REM statement, which is ignored"""
 
-        elif self.__token.category == Token.READ:
-            self.__readstmt()
-            return None
+        return _nothing
 
-        elif self.__token.category == Token.RESTORE:
-            self.__restorestmt()
-            return None
+    def __clearstmt(self):
+        """Parses a CLEAR statement, which clears the screen"""
 
-        elif self.__token.category == Token.OPEN:
-            return self.__openstmt()
+        terminal = self.__terminal
 
-        elif self.__token.category == Token.CLOSE:
-            self.__closestmt()
-            return None
-
-        elif self.__token.category == Token.FSEEK:
-            self.__fseekstmt()
-            return None
-
-        elif self.__token.category == Token.CLEAR:
-            self.__terminal.clear()
-            return None
+        def clearstmt():
+            terminal.clear()
 
-        elif self.__token.category == Token.CURSOR:
-            self.__cursorstmt()
-            return None
-        else:
-            # Ignore comments, but raise an error
-            # for anything else
-            if self.__token.category != Token.REM:
-                raise RuntimeError(
-                    "Expecting program statement in line " + str(self.__line_number)
-                )
+        return clearstmt
 
     def __printstmt(self):
         """Parses a PRINT statement, causing
-        the value that is on top of the
-        operand stack to be printed on
-        the screen.
+        the values of the listed expressions
+        to be printed on the screen.
 
         """
         self.__advance()  # Advance past PRINT token
 
+        line_number = self.__line_number
+        file_handles = self.__file_handles
+        terminal = self.__terminal
+
         fileIO = False
         if self.__token.category == Token.HASH:
             fileIO = True
@@ -277,16 +1000,7 @@ class BASICParser:
             self.__consume(Token.HASH)
 
             # Acquire the file number
-            self.__expr()
-            filenum = self.__operand_stack.pop()
-
-            if self.__file_handles.get(filenum) == None:
-                raise RuntimeError(
-                    "PRINT: file #"
-                    + str(filenum)
-                    + " not opened in line "
-                    + str(self.__line_number)
-                )
+            filenum = self.__expr()
 
             # Process the comma
             if (
@@ -296,85 +1010,153 @@ class BASICParser:
                 self.__consume(Token.COMMA)
 
         # Check there are items to print
+        items = []
+        newline = True
         if not self.__tokenindex >= len(self.__tokenlist):
-            self.__logexpr()
-            if fileIO:
-                self.__file_handles[filenum].write("%s" % (self.__operand_stack.pop()))
-            else:
-                self.__terminal.write(str(self.__operand_stack.pop()))
+            items.append(self.__logexpr())
 
             while self.__token.category == Token.SEMICOLON:
                 if self.__tokenindex == len(self.__tokenlist) - 1:
                     # If a semicolon ends this line, don't print
                     # a newline.. a-la ms-basic
-                    return
+                    newline = False
+                    break
                 self.__advance()
-                self.__logexpr()
-                if fileIO:
-                    self.__file_handles[filenum].write(
-                        "%s" % (self.__operand_stack.pop())
-                    )
-                else:
-                    self.__terminal.write(str(self.__operand_stack.pop()))
+                items.append(self.__logexpr())
+
+        items = tuple(items)
 
-        # Final newline
         if fileIO:
-            self.__file_handles[filenum].write("\n")
+
+            def printstmt():
+                num = filenum()
+                handle = file_handles.get(num)
+                if handle == None:
+                    raise RuntimeError(
+                        "PRINT: file #"
+                        + str(num)
+                        + " not opened in line "
+                        + str(line_number)
+                    )
+
+                for item in items:
+                    handle.write("%s" % (item()))
+
+                # Final newline
+                if newline:
+                    handle.write("\n")
+
         else:
-            self.__terminal.enter()
+
+            def printstmt():
+                for item in items:
+                    terminal.write(str(item()))
+
+                # Final newline
+                if newline:
+                    terminal.enter()
+
+        return printstmt
 
     def __letstmt(self):
         """Parses a LET statement,
         consuming the LET keyword.
         """
         self.__advance()  # Advance past the LET token
-        self.__assignmentstmt()
+        return self.__assignmentstmt()
 
     def __gotostmt(self):
         """Parses a GOTO statement
 
-        :return: A FlowSignal containing the target line number
-        of the GOTO
+        :return: A closure returning a FlowSignal containing the
+        target line number of the GOTO
 
         """
         self.__advance()  # Advance past GOTO token
-        self.__expr()
-
-        # Set up and return the flow signal
-        return FlowSignal(ftarget=self.__operand_stack.pop())
+        return self.__branch(FlowSignal.SIMPLE_JUMP)
 
     def __gosubstmt(self):
         """Parses a GOSUB statement
 
-        :return: A FlowSignal containing the first line number
-        of the subroutine
+        :return: A closure returning a FlowSignal containing the
+        first line number of the subroutine
 
         """
 
         self.__advance()  # Advance past GOSUB token
-        self.__expr()
+        return self.__branch(FlowSignal.GOSUB)
+
+    def __branch(self, ftype):
+        """Parses the target of a branch, which may be an
+        expression computing the line number
+
+        :param ftype: The type of the branch, SIMPLE_JUMP or GOSUB
+
+        :return: A closure returning the FlowSignal for the branch.
+        If the target is a line number given as a literal, this is
+        the same signal each time, made as the target is parsed
+
+        """
+        token = self.__token
+        start = self.__tokenindex
+        target = self.__expr()
 
-        # Set up and return the flow signal
-        return FlowSignal(ftarget=self.__operand_stack.pop(), ftype=FlowSignal.GOSUB)
+        if token.category == Token.UNSIGNEDINT and self.__tokenindex == start + 1:
+            signal = self.branch_signal(token.value, ftype)
+
+            def literal():
+                return signal
+
+            return literal
+
+        def computed():
+            # Set up and return the flow signal
+            return FlowSignal(target(), ftype, False)
+
+        return computed
 
     def __returnstmt(self):
         """Parses a RETURN statement"""
 
         self.__advance()  # Advance past RETURN token
 
-        # Set up and return the flow signal
-        return FlowSignal(ftype=FlowSignal.RETURN)
+        def returnstmt():
+            # Set up and return the flow signal
+            return RETURN_SIGNAL
+
+        return returnstmt
 
     def __stopstmt(self):
         """Parses a STOP statement"""
 
         self.__advance()  # Advance past STOP token
 
-        for handles in self.__file_handles:
-            self.__file_handles[handles].close()
-        self.__file_handles.clear()
+        file_handles = self.__file_handles
+        file_modes = self.__file_modes
+
+        def stopstmt():
+            for handles in file_handles:
+                file_handles[handles].close()
+            file_handles.clear()
+            file_modes.clear()
 
-        return FlowSignal(ftype=FlowSignal.STOP)
+            return STOP_SIGNAL
+
+        return stopstmt
+
+    def __freezestmt(self):
+        """Parses a FREEZE statement, which has the program save
+        an image of its state and then carry on at the following
+        statement, so that a later run can resume from that point
+        rather than start again from the beginning
+
+        """
+        self.__advance()  # Advance past FREEZE token
+
+        def freezestmt():
+            return FREEZE_SIGNAL
+
+        return freezestmt
 
     def __assignmentstmt(self):
         """Parses an assignment statement,
@@ -389,31 +1171,44 @@ class BASICParser:
 
         if self.__token.category == Token.LEFTPAREN:
             # We are assiging to an array
-            self.__arrayassignmentstmt(left)
+            return self.__arrayassignmentstmt(left)
 
-        else:
-            # We are assigning to a simple variable
-            self.__consume(Token.ASSIGNOP)
-            self.__logexpr()
+        # We are assigning to a simple variable
+        self.__consume(Token.ASSIGNOP)
+        right = self.__logexpr()
 
-            # Check that we are using the right variable name format
-            right = self.__operand_stack.pop()
+        line_number = self.__line_number
+        symbol_table = self.__symbol_table
+        key = self.__key(left)
 
-            if left.endswith("$") and not isinstance(right, str):
-                raise SyntaxError(
-                    "Syntax error: Attempt to assign non string to string variable"
-                    + " in line "
-                    + str(self.__line_number)
-                )
+        # Check that we are using the right variable name format
+        if left.endswith("$"):
+
+            def assignmentstmt():
+                value = right()
+                if not isinstance(value, str):
+                    raise SyntaxError(
+                        "Syntax error: Attempt to assign non string to string variable"
+                        + " in line "
+                        + str(line_number)
+                    )
 
-            elif not left.endswith("$") and isinstance(right, str):
-                raise SyntaxError(
-                    "Syntax error: Attempt to assign string to numeric variable"
-                    + " in line "
-                    + str(self.__line_number)
-                )
+                symbol_table[key] = value
 
-            self.__symbol_table[left] = right
+        else:
+
+            def assignmentstmt():
+                value = right()
+                if isinstance(value, str):
+                    raise SyntaxError(
+                        "Syntax error: Attempt to assign string to numeric variable"
+                        + " in line "
+                        + str(line_number)
+                    )
+
+                symbol_table[key] = value
+
+        return assignmentstmt
 
     def __dimstmt(self):
         """Parses  DIM statement and creates a symbol
@@ -424,11 +1219,10 @@ class BASICParser:
         self.__advance()  # Advance past DIM keyword
 
         # MSBASIC: allow dims of multiple arrays delimited by commas
+        arrays = []
         while True:
-            # Extract the array name, append a suffix so
-            # that we can distinguish from simple variables
-            # in the symbol table
-            name = self.__token.lexeme + "_array"
+            # Extract the array name
+            name = self.__token.lexeme
             self.__advance()  # Advance past array name
 
             self.__consume(Token.LEFTPAREN)
@@ -436,31 +1230,32 @@ class BASICParser:
             # Extract the dimensions
             dimensions = []
             if not self.__tokenindex >= len(self.__tokenlist):
-                self.__expr()
-                dimensions.append(self.__operand_stack.pop())
+                dimensions.append(self.__expr())
 
                 while self.__token.category == Token.COMMA:
-                    self.__advance()  # Advance past comma
-                    self.__expr()
-                    dimensions.append(self.__operand_stack.pop())
-
-            self.__consume(Token.RIGHTPAREN)
-
-            if len(dimensions) > 3:
-                raise SyntaxError(
-                    "Maximum number of array dimensions is three "
-                    + "in line "
-                    + str(self.__line_number)
-                )
+                    self.__advance()  # Advance past comma
+                    dimensions.append(self.__expr())
+
+            self.__consume(Token.RIGHTPAREN)
 
-            self.__symbol_table[name] = BASICArray(dimensions)
+            arrays.append((name, tuple(dimensions), name.endswith("$")))
 
             if self.__tokenindex == len(self.__tokenlist):
                 # We have parsed the last token here...
-                return
+                break
             else:
                 self.__consume(Token.COMMA)
 
+        array_table = self.__array_table
+
+        def dimstmt():
+            for name, dimensions, string in arrays:
+                array_table[name] = BASICArray(
+                    [dimension() for dimension in dimensions], string
+                )
+
+        return dimstmt
+
     def __arrayassignmentstmt(self, name):
         """Parses an assignment to an array variable
 
@@ -473,66 +1268,56 @@ class BASICParser:
         # Extract the dimensions
         indexvars = []
         if not self.__tokenindex >= len(self.__tokenlist):
-            self.__expr()
-            indexvars.append(self.__operand_stack.pop())
+            indexvars.append(self.__expr())
 
             while self.__token.category == Token.COMMA:
                 self.__advance()  # Advance past comma
-                self.__expr()
-                indexvars.append(self.__operand_stack.pop())
+                indexvars.append(self.__expr())
 
-        try:
-            BASICarray = self.__symbol_table[name + "_array"]
+        self.__consume(Token.RIGHTPAREN)
+        self.__consume(Token.ASSIGNOP)
 
-        except KeyError:
-            raise KeyError(
-                "Array could not be found in line " + str(self.__line_number)
-            )
+        right = self.__logexpr()
 
-        if BASICarray.dims != len(indexvars):
-            raise IndexError(
-                "Incorrect number of indices applied to array "
-                + "in line "
-                + str(self.__line_number)
-            )
+        indexvars = tuple(indexvars)
+        line_number = self.__line_number
+        array_table = self.__array_table
+        string_array = name.endswith("$")
 
-        self.__consume(Token.RIGHTPAREN)
-        self.__consume(Token.ASSIGNOP)
+        def arrayassignmentstmt():
+            indexes = [index() for index in indexvars]
 
-        self.__logexpr()
+            try:
+                BASICarray = array_table[name]
 
-        # Check that we are using the right variable name format
-        right = self.__operand_stack.pop()
+            except KeyError:
+                raise KeyError("Array could not be found in line " + str(line_number))
 
-        if name.endswith("$") and not isinstance(right, str):
-            raise SyntaxError(
-                "Attempt to assign non string to string array"
-                + " in line "
-                + str(self.__line_number)
-            )
+            # Check that we are using the right variable name format
+            value = right()
 
-        elif not name.endswith("$") and isinstance(right, str):
-            raise SyntaxError(
-                "Attempt to assign string to numeric array"
-                + " in line "
-                + str(self.__line_number)
-            )
+            if string_array and not isinstance(value, str):
+                raise SyntaxError(
+                    "Attempt to assign non string to string array"
+                    + " in line "
+                    + str(line_number)
+                )
 
-        # Assign to the specified array index
-        try:
-            if len(indexvars) == 1:
-                BASICarray.data[indexvars[0]] = right
+            elif not string_array and isinstance(value, str):
+                raise SyntaxError(
+                    "Attempt to assign string to numeric array"
+                    + " in line "
+                    + str(line_number)
+                )
 
-            elif len(indexvars) == 2:
-                BASICarray.data[indexvars[0]][indexvars[1]] = right
+            # Assign to the specified array index
+            try:
+                BASICarray.set(indexes, value)
 
-            elif len(indexvars) == 3:
-                BASICarray.data[indexvars[0]][indexvars[1]][indexvars[2]] = right
+            except IndexError as err:
+                raise IndexError(str(err) + " in line " + str(line_number))
 
-        except IndexError:
-            raise IndexError(
-                "Array index out of range in line " + str(self.__line_number)
-            )
+        return arrayassignmentstmt
 
     def __openstmt(self):
         """Parses an open statement, opens the indicated file and
@@ -542,8 +1327,7 @@ class BASICParser:
         self.__advance()  # Advance past OPEN token
 
         # Acquire the filename
-        self.__logexpr()
-        filename = self.__operand_stack.pop()
+        filename = self.__logexpr()
 
         # Process the FOR keyword
         self.__consume(Token.FOR)
@@ -570,52 +1354,67 @@ class BASICParser:
         self.__consume(Token.HASH)
 
         # Acquire the file number
-        self.__expr()
-        filenum = self.__operand_stack.pop()
+        filenum = self.__expr()
 
-        branchOnError = False
+        branch = None
         if self.__token.category == Token.ELSE:
-            branchOnError = True
             self.__advance()  # Advance past ELSE
 
             if self.__token.category == Token.GOTO:
                 self.__advance()  # Advance past optional GOTO
 
-            self.__expr()
+            branch = self.__branch(FlowSignal.SIMPLE_JUMP)
 
-        if self.__file_handles.get(filenum) != None:
-            if branchOnError:
-                return FlowSignal(ftarget=self.__operand_stack.pop())
-            else:
-                raise RuntimeError(
-                    "File #",
-                    filenum,
-                    " already opened in line " + str(self.__line_number),
-                )
+        line_number = self.__line_number
+        file_handles = self.__file_handles
+        file_modes = self.__file_modes
+        files_read = self.__files_read
 
-        try:
-            self.__file_handles[filenum] = open(filename, accessMode)
+        def openstmt():
+            name = filename()
+            num = filenum()
+            if branch:
+                signal = branch()
 
-        except:
-            if branchOnError:
-                return FlowSignal(ftarget=self.__operand_stack.pop())
-            else:
-                raise RuntimeError(
-                    "File "
-                    + filename
-                    + " could not be opened in line "
-                    + str(self.__line_number)
-                )
+            if file_handles.get(num) != None:
+                if branch:
+                    return signal
+                else:
+                    raise RuntimeError(
+                        "File #",
+                        num,
+                        " already opened in line " + str(line_number),
+                    )
+
+            try:
+                file_handles[num] = open(name, accessMode)
 
-        if accessMode == "r+":
-            self.__file_handles[filenum].seek(0)
-            filelen = 0
-            for lines in self.__file_handles[filenum]:
-                filelen += len(lines) + 1
+            except:
+                if branch:
+                    return signal
+                else:
+                    raise RuntimeError(
+                        "File "
+                        + name
+                        + " could not be opened in line "
+                        + str(line_number)
+                    )
+
+            file_modes[num] = (name, accessMode)
+            if accessMode != "w+" and name not in files_read:
+                files_read.append(name)
 
-            self.__file_handles[filenum].seek(filelen)
+            if accessMode == "r+":
+                file_handles[num].seek(0)
+                filelen = 0
+                for lines in file_handles[num]:
+                    filelen += len(lines) + 1
 
-        return None
+                file_handles[num].seek(filelen)
+
+            return None
+
+        return openstmt
 
     def __closestmt(self):
         """Parses a close, closes the file and removes
@@ -628,19 +1427,27 @@ class BASICParser:
         self.__consume(Token.HASH)
 
         # Acquire the file number
-        self.__expr()
-        filenum = self.__operand_stack.pop()
+        filenum = self.__expr()
 
-        if self.__file_handles.get(filenum) == None:
-            raise RuntimeError(
-                "CLOSE: file #"
-                + str(filenum)
-                + " not opened in line "
-                + str(self.__line_number)
-            )
+        line_number = self.__line_number
+        file_handles = self.__file_handles
+        file_modes = self.__file_modes
+
+        def closestmt():
+            num = filenum()
+            if file_handles.get(num) == None:
+                raise RuntimeError(
+                    "CLOSE: file #"
+                    + str(num)
+                    + " not opened in line "
+                    + str(line_number)
+                )
 
-        self.__file_handles[filenum].close()
-        self.__file_handles.pop(filenum)
+            file_handles[num].close()
+            file_handles.pop(num)
+            file_modes.pop(num)
+
+        return closestmt
 
     def __fseekstmt(self):
         """Parses an fseek statement, seeks the indicated file position"""
@@ -651,24 +1458,30 @@ class BASICParser:
         self.__consume(Token.HASH)
 
         # Acquire the file number
-        self.__expr()
-        filenum = self.__operand_stack.pop()
-
-        if self.__file_handles.get(filenum) == None:
-            raise RuntimeError(
-                "FSEEK: file #"
-                + str(filenum)
-                + " not opened in line "
-                + str(self.__line_number)
-            )
+        filenum = self.__expr()
 
         # Process the comma
         self.__consume(Token.COMMA)
 
         # Acquire the file position
-        self.__expr()
+        position = self.__expr()
+
+        line_number = self.__line_number
+        file_handles = self.__file_handles
+
+        def fseekstmt():
+            num = filenum()
+            if file_handles.get(num) == None:
+                raise RuntimeError(
+                    "FSEEK: file #"
+                    + str(num)
+                    + " not opened in line "
+                    + str(line_number)
+                )
 
-        self.__file_handles[filenum].seek(self.__operand_stack.pop())
+            file_handles[num].seek(position())
+
+        return fseekstmt
 
     def __cursorstmt(self):
         """Parses a CURSOR statement
@@ -681,18 +1494,22 @@ class BASICParser:
             raise RuntimeError(
                 "Expecting column and line positions on line " + str(self.__line_number)
             )
-        else:
-            # get the X
-            self.__logexpr()
-            xpos = self.__operand_stack.pop()
 
-            self.__consume(Token.COMMA)
+        # get the X
+        xpos = self.__logexpr()
+
+        self.__consume(Token.COMMA)
+
+        # get the Y
+        ypos = self.__logexpr()
 
-            # get the Y
-            self.__logexpr()
-            ypos = self.__operand_stack.pop()
+        terminal = self.__terminal
 
-            self.__terminal.cursor(xpos, ypos)
+        def cursorstmt():
+            x = xpos()
+            terminal.cursor(x, ypos())
+
+        return cursorstmt
 
     def __inputstmt(self):
         """Parses an input statement, extracts the input
@@ -703,6 +1520,7 @@ class BASICParser:
         self.__advance()  # Advance past INPUT token
 
         fileIO = False
+        filenum = None
         if self.__token.category == Token.HASH:
             fileIO = True
 
@@ -710,21 +1528,12 @@ class BASICParser:
             self.__consume(Token.HASH)
 
             # Acquire the file number
-            self.__expr()
-            filenum = self.__operand_stack.pop()
-
-            if self.__file_handles.get(filenum) == None:
-                raise RuntimeError(
-                    "INPUT: file #"
-                    + str(filenum)
-                    + " not opened in line "
-                    + str(self.__line_number)
-                )
+            filenum = self.__expr()
 
             # Process the comma
             self.__consume(Token.COMMA)
 
-        prompt = "? "
+        prompt = None
         if self.__token.category == Token.STRING:
             if fileIO:
                 raise SyntaxError(
@@ -734,8 +1543,7 @@ class BASICParser:
                 )
 
             # Acquire the input prompt
-            self.__logexpr()
-            prompt = self.__operand_stack.pop()
+            prompt = self.__logexpr()
             self.__consume(Token.SEMICOLON)
 
         # Acquire the comma separated input variables
@@ -755,68 +1563,97 @@ class BASICParser:
                 variables.append(self.__token.lexeme)
                 self.__advance()  # Advance past variable
 
-        valid_input = False
-        while not valid_input:
-            # Gather input from the user into the variables
+        # Pair each name with its key in the symbol table
+        variables = [(variable, self.__key(variable)) for variable in variables]
+
+        line_number = self.__line_number
+        symbol_table = self.__symbol_table
+        file_handles = self.__file_handles
+        terminal = self.__terminal
+
+        def inputstmt():
             if fileIO:
-                inputvals = (
-                    (self.__file_handles[filenum].readline().replace("\n", "")).replace(
-                        "\r", ""
+                num = filenum()
+                if file_handles.get(num) == None:
+                    raise RuntimeError(
+                        "INPUT: file #"
+                        + str(num)
+                        + " not opened in line "
+                        + str(line_number)
                     )
-                ).split(",", (len(variables) - 1))
-                valid_input = True
-            else:
-                self.__terminal.write(str(prompt))
-                inputvals = self.__terminal.input().split(",", (len(variables) - 1))
 
-            for variable in variables:
-                left = variable
+            text = "? "
+            if prompt:
+                text = prompt()
 
-                try:
-                    right = inputvals.pop(0)
+            valid_input = False
+            while not valid_input:
+                # Gather input from the user into the variables
+                if fileIO:
+                    inputvals = (
+                        (file_handles[num].readline().replace("\n", "")).replace(
+                            "\r", ""
+                        )
+                    ).split(",", (len(variables) - 1))
+                    valid_input = True
+                else:
+                    terminal.write(str(text))
+                    inputvals = terminal.input().split(",", (len(variables) - 1))
 
-                    if left.endswith("$"):
-                        self.__symbol_table[left] = str(right)
-                        valid_input = True
+                for left, key in variables:
+                    try:
+                        right = inputvals.pop(0)
 
-                    elif not left.endswith("$"):
-                        try:
-                            if "." in right:
-                                self.__symbol_table[left] = float(right)
+                        if left.endswith("$"):
+                            symbol_table[key] = str(right)
+                            valid_input = True
 
-                            else:
-                                self.__symbol_table[left] = int(right)
+                        elif not left.endswith("$"):
+                            try:
+                                if "." in right:
+                                    symbol_table[key] = float(right)
 
-                            valid_input = True
+                                else:
+                                    symbol_table[key] = int(right)
 
-                        except ValueError:
-                            if not fileIO:
-                                valid_input = False
-                            self.__terminal.print(
-                                "Non-numeric input provided to a numeric variable - redo from start"
-                            )
-                            break
+                                valid_input = True
 
-                except IndexError:
-                    # No more input to process
-                    if not fileIO:
-                        valid_input = False
-                    self.__terminal.print("Not enough values input - redo from start")
-                    break
+                            except ValueError:
+                                if not fileIO:
+                                    valid_input = False
+                                terminal.print(
+                                    "Non-numeric input provided to a numeric variable - redo from start"
+                                )
+                                break
+
+                    except IndexError:
+                        # No more input to process
+                        if not fileIO:
+                            valid_input = False
+                        terminal.print("Not enough values input - redo from start")
+                        break
+
+        return inputstmt
 
     def __restorestmt(self):
 
         self.__advance()  # Advance past RESTORE token
 
         # Acquire the line number
-        self.__expr()
+        restore_line = self.__expr()
+
+        data = self.__data
 
-        self.__data_values.clear()
-        self.__data.restore(self.__operand_stack.pop())
+        def restorestmt():
+            data.restore(restore_line())
+
+        return restorestmt
 
     def __datastmt(self):
         """Parses a DATA statement"""
 
+        return _nothing
+
     def __readstmt(self):
         """Parses a READ statement."""
 
@@ -833,134 +1670,190 @@ class BASICParser:
                 variables.append(self.__token.lexeme)
                 self.__advance()  # Advance past variable
 
-        # Gather input from the DATA statement into the variables
-        for variable in variables:
+        # Pair each name with its key in the symbol table
+        variables = [(variable, self.__key(variable)) for variable in variables]
+
+        line_number = self.__line_number
+        symbol_table = self.__symbol_table
+        data = self.__data
+
+        def readstmt():
+            # Gather input from the DATA statements into the variables
+            for left, key in variables:
+                right = data.readValue(line_number)
+
+                if left.endswith("$"):
+                    # Python inserts quotes around input data
+                    if isinstance(right, int):
+                        raise ValueError(
+                            "Non-string input provided to a string variable "
+                            + "in line "
+                            + str(line_number)
+                        )
 
-            if len(self.__data_values) < 1:
-                self.__data_values = self.__data.readData(self.__line_number)
+                    else:
+                        symbol_table[key] = right
+
+                elif not left.endswith("$"):
+                    try:
+                        numeric = float(right)
+                        if numeric.is_integer():
+                            numeric = int(numeric)
+                        symbol_table[key] = numeric
+
+                    except ValueError:
+                        raise ValueError(
+                            "Non-numeric input provided to a numeric variable "
+                            + "in line "
+                            + str(line_number)
+                        )
 
-            left = variable
-            right = self.__data_values.pop(0)
+        return readstmt
 
-            if left.endswith("$"):
-                # Python inserts quotes around input data
-                if isinstance(right, int):
-                    raise ValueError(
-                        "Non-string input provided to a string variable "
-                        + "in line "
-                        + str(self.__line_number)
-                    )
+    def __logexpr(self):
+        """Parses a full expression, including relational
+        and logical operators
 
-                else:
-                    self.__symbol_table[left] = right
+        :return: A closure evaluating the expression
 
-            elif not left.endswith("$"):
-                try:
-                    numeric = float(right)
-                    if numeric.is_integer():
-                        numeric = int(numeric)
-                    self.__symbol_table[left] = numeric
-
-                except ValueError:
-                    raise ValueError(
-                        "Non-numeric input provided to a numeric variable "
-                        + "in line "
-                        + str(self.__line_number)
-                    )
+        """
+        return self.__expression(_LOGICAL)
 
     def __expr(self):
         """Parses a numerical expression consisting
-        of two terms being added or subtracted,
-        leaving the result on the operand stack.
+        of terms being added or subtracted.
+
+        :return: A closure evaluating the expression
 
         """
-        self.__term()  # Pushes value of left term
-        # onto top of stack
+        return self.__expression(_ADDITIVE)
 
-        while self.__token.category in [Token.PLUS, Token.MINUS]:
-            savedcategory = self.__token.category
-            self.__advance()
-            self.__term()  # Pushes value of right term
-            # onto top of stack
-            rightoperand = self.__operand_stack.pop()
-            leftoperand = self.__operand_stack.pop()
+    def __expression(self, precedence):
+        """Parses an expression by precedence climbing. Operands
+        are joined by the operators binding at least as tightly as
+        the given precedence, the right hand operand of each operator
+        taking in any operators binding more tightly than it does, so
+        that binary operators are left associative.
 
-            if savedcategory == Token.PLUS:
-                self.__operand_stack.append(leftoperand + rightoperand)
+        A single relational operator may be applied at each level.
+        NOT applies to a relational expression, so binds more loosely
+        than the relational operators, but more tightly than AND
+        and OR.
 
-            else:
-                self.__operand_stack.append(leftoperand - rightoperand)
+        :param precedence: The precedence of the most loosely
+        binding operators to accept
 
-    def __term(self):
-        """Parses a numerical expression consisting
-        of two factors being multiplied together,
-        leaving the result on the operand stack.
+        :return: A closure evaluating the expression
 
         """
-        self.__sign = 1  # Initialise sign to keep track of unary
-        # minuses
-        self.__factor()  # Leaves value of term on top of stack
+        varying = self.__varying
+
+        # Whether a relational operator may still be applied,
+        # which it may not once NOT, AND or OR has been
+        relational = precedence <= _RELATIONAL
 
-        while self.__token.category in [Token.TIMES, Token.DIVIDE, Token.MODULO]:
-            savedcategory = self.__token.category
+        if precedence <= _NOT and self.__token.category == Token.NOT:
             self.__advance()
-            self.__sign = 1  # Initialise sign
-            self.__factor()  # Leaves value of term on top of stack
-            rightoperand = self.__operand_stack.pop()
-            leftoperand = self.__operand_stack.pop()
+            operand = self.__expression(_RELATIONAL)
+            left = self.__fold(lambda: not operand(), varying)
+            relational = False
 
-            if savedcategory == Token.TIMES:
-                self.__operand_stack.append(leftoperand * rightoperand)
+        else:
+            left = self.__unary()
 
-            elif savedcategory == Token.DIVIDE:
-                self.__operand_stack.append(leftoperand / rightoperand)
+        while True:
+            category = self.__token.category
+            operator = _PRECEDENCE.get(category)
+            if operator == None or operator < precedence:
+                return left
 
-            else:
-                self.__operand_stack.append(leftoperand % rightoperand)
+            if operator == _RELATIONAL:
+                if not relational:
+                    return left
 
-    def __factor(self):
-        """Evaluates a numerical expression
-        and leaves its value on top of the
-        operand stack.
+                relational = False
+
+                # Since BASIC uses same operator for both
+                # assignment and equality, we need to check for this
+                if category == Token.ASSIGNOP:
+                    category = Token.EQUAL
+
+            elif operator == _LOGICAL:
+                relational = False
 
-        """
-        if self.__token.category == Token.PLUS:
             self.__advance()
-            self.__factor()
+            right = self.__expression(operator + 1)
+
+            left = self.__fold(_binary(category, left, right), varying)
+
+    def __unary(self):
+        """Parses a single operand of an expression, together
+        with any unary plus and minus signs before it
+
+        :return: A closure evaluating the operand
+
+        """
+        sign = 1
+        while True:
+            if self.__tokenindex >= len(self.__tokenlist):
+                raise RuntimeError(
+                    "Expecting factor in numeric expression"
+                    + " in line "
+                    + str(self.__line_number)
+                )
+
+            if self.__token.category == Token.MINUS:
+                sign = -sign
+
+            elif self.__token.category != Token.PLUS:
+                return self.__factor(sign)
 
-        elif self.__token.category == Token.MINUS:
-            self.__sign = -self.__sign
             self.__advance()
-            self.__factor()
 
-        elif self.__token.category == Token.UNSIGNEDINT:
-            self.__operand_stack.append(self.__sign * int(self.__token.lexeme))
+    def __factor(self, sign):
+        """Parses a single operand of an expression,
+        without any signs before it
+
+        :param sign: -1 if the operand is to be negated,
+        otherwise 1
+
+        :return: A closure evaluating the operand
+
+        """
+        if self.__token.category == Token.UNSIGNEDINT:
+            value = sign * self.__token.value
             self.__advance()
+            return lambda: value
 
         elif self.__token.category == Token.UNSIGNEDFLOAT:
-            self.__operand_stack.append(self.__sign * float(self.__token.lexeme))
+            value = sign * self.__token.value
             self.__advance()
+            return lambda: value
 
         elif self.__token.category == Token.STRING:
-            self.__operand_stack.append(self.__token.lexeme)
+            value = self.__token.lexeme
             self.__advance()
+            return lambda: value
 
         elif (
             self.__token.category == Token.NAME
             and self.__token.category not in Token.functions
         ):
+            name = self.__token.lexeme
+            line_number = self.__line_number
+            symbol_table = self.__symbol_table
+            array_table = self.__array_table
+            key = self.__key(name)
+            self.__varying += 1
+
             # Check if this is a simple or array variable
             # MSBASIC Allows simple and complex variables to have the
             # same id.  This is probably a bad idea, but it's used in
             # some old example programs.  So check if next token is parens
             if (
-                (self.__token.lexeme + "_array") in self.__symbol_table
-                and self.__tokenindex < len(self.__tokenlist) - 1
+                self.__tokenindex < len(self.__tokenlist) - 1
                 and self.__tokenlist[self.__tokenindex + 1].category == Token.LEFTPAREN
             ):
-                # Capture the current lexeme
-                arrayname = self.__token.lexeme + "_array"
-
                 # Array must be processed
                 # Capture the index variables
                 self.__advance()  # Advance past the array name
@@ -969,63 +1862,101 @@ class BASICParser:
                     self.__consume(Token.LEFTPAREN)
                     indexvars = []
                     if not self.__tokenindex >= len(self.__tokenlist):
-                        self.__expr()
-                        indexvars.append(self.__operand_stack.pop())
+                        indexvars.append(self.__expr())
 
                         while self.__token.category == Token.COMMA:
                             self.__advance()  # Advance past comma
-                            self.__expr()
-                            indexvars.append(self.__operand_stack.pop())
+                            indexvars.append(self.__expr())
+
+                except RuntimeError:
+                    raise RuntimeError(
+                        "Array used without index in line " + str(self.__line_number)
+                    )
+
+                indexvars = tuple(indexvars)
+
+                def factor():
+                    try:
+                        BASICarray = array_table[name]
+
+                    except KeyError:
+                        # No such array, so fall back to a
+                        # simple variable of the same name
+                        try:
+                            return sign * symbol_table[key]
+
+                        except (KeyError, TypeError):
+                            raise RuntimeError(
+                                "Name "
+                                + name
+                                + " is not defined"
+                                + " in line "
+                                + str(line_number)
+                            )
+
+                    try:
+                        indexes = [index() for index in indexvars]
+
+                    except RuntimeError:
+                        raise RuntimeError(
+                            "Array used without index in line " + str(line_number)
+                        )
+
+                    try:
+                        arrayval = BASICarray.get(indexes)
 
-                    BASICarray = self.__symbol_table[arrayname]
-                    arrayval = self.__get_array_val(BASICarray, indexvars)
+                    except IndexError as err:
+                        raise IndexError(str(err) + " in line " + str(line_number))
 
                     if arrayval != None:
-                        self.__operand_stack.append(self.__sign * arrayval)
+                        return sign * arrayval
 
                     else:
                         raise IndexError(
-                            "Empty array value returned in line "
-                            + str(self.__line_number)
+                            "Empty array value returned in line " + str(line_number)
                         )
-                except RuntimeError:
-                    raise RuntimeError(
-                        "Array used without index in line " + str(self.__line_number)
-                    )
-
-            elif self.__token.lexeme in self.__symbol_table:
-                # Simple variable must be processed
-                self.__operand_stack.append(
-                    self.__sign * self.__symbol_table[self.__token.lexeme]
-                )
 
             else:
-                raise RuntimeError(
-                    "Name "
-                    + self.__token.lexeme
-                    + " is not defined"
-                    + " in line "
-                    + str(self.__line_number)
-                )
+
+                def factor():
+                    # Simple variable must be processed
+                    try:
+                        return sign * symbol_table[key]
+
+                    except (KeyError, TypeError):
+                        raise RuntimeError(
+                            "Name "
+                            + name
+                            + " is not defined"
+                            + " in line "
+                            + str(line_number)
+                        )
 
             self.__advance()
+            return factor
 
         elif self.__token.category == Token.LEFTPAREN:
             self.__advance()
 
-            # Save sign because expr() calls term() which resets
-            # sign to 1
-            savesign = self.__sign
-            self.__logexpr()  # Value of expr is pushed onto stack
+            varying = self.__varying
+            inner = self.__logexpr()
+
+            self.__consume(Token.RIGHTPAREN)
 
-            if savesign == -1:
+            if sign == -1:
                 # Change sign of expression
-                self.__operand_stack[-1] = -self.__operand_stack[-1]
+                return self.__fold(lambda: -inner(), varying)
 
-            self.__consume(Token.RIGHTPAREN)
+            return inner
+
+        elif self.__token.category in self.__functions:
+            varying = self.__varying
+            function = self.__evaluate_function(self.__token.category)
 
-        elif self.__token.category in Token.functions:
-            self.__operand_stack.append(self.__evaluate_function(self.__token.category))
+            if sign == -1:
+                return self.__fold(lambda: -function(), varying)
+
+            return function
 
         else:
             raise RuntimeError(
@@ -1035,75 +1966,17 @@ class BASICParser:
                 + self.__token.lexeme
             )
 
-    def __get_array_val(self, BASICarray, indexvars):
-        """Extracts the value from the given BASICArray at the specified indexes
-
-        :param BASICarray: The BASICArray
-        :param indexvars: The list of indexes, one for each dimension
-
-        :return: The value at the indexed position in the array
-
-        """
-        if BASICarray.dims != len(indexvars):
-            raise IndexError(
-                "Incorrect number of indices applied to array "
-                + "in line "
-                + str(self.__line_number)
-            )
-
-        # Fetch the value from the array
-        try:
-            if len(indexvars) == 1:
-                arrayval = BASICarray.data[indexvars[0]]
-
-            elif len(indexvars) == 2:
-                arrayval = BASICarray.data[indexvars[0]][indexvars[1]]
-
-            elif len(indexvars) == 3:
-                arrayval = BASICarray.data[indexvars[0]][indexvars[1]][indexvars[2]]
-
-        except IndexError:
-            raise IndexError(
-                "Array index out of range in line " + str(self.__line_number)
-            )
-
-        return arrayval
-
-    def __compoundstmt(self):
-        """Parses compound statements,
-        specifically if-then-else and
-        loops
-
-        :return: The FlowSignal to indicate to the program
-        how to branch if necessary, None otherwise
-
-        """
-        if self.__token.category == Token.FOR:
-            return self.__forstmt()
-
-        elif self.__token.category == Token.NEXT:
-            return self.__nextstmt()
-
-        elif self.__token.category == Token.IF:
-            return self.__ifstmt()
-
-        elif self.__token.category == Token.ON:
-            return self.__ongosubstmt()
-
     def __ifstmt(self):
         """Parses if-then-else
         statements
 
-        :return: The FlowSignal to indicate to the program
-        how to branch if necessary, None otherwise
+        :return: A closure returning the FlowSignal to indicate to
+        the program how to branch if necessary, None otherwise
 
         """
 
         self.__advance()  # Advance past IF token
-        self.__logexpr()
-
-        # Save result of expression
-        saveval = self.__operand_stack.pop()
+        condition = self.__logexpr()
 
         # Process the THEN part and save the jump value
         self.__consume(Token.THEN)
@@ -1111,41 +1984,39 @@ class BASICParser:
         if self.__token.category == Token.GOTO:
             self.__advance()  # Advance past optional GOTO
 
-        self.__expr()
-        then_jump = self.__operand_stack.pop()
-
-        # Jump if the expression evaluated to True
-        if saveval:
-            # Set up and return the flow signal
-            return FlowSignal(ftarget=then_jump)
+        then_jump = self.__branch(FlowSignal.SIMPLE_JUMP)
 
         # See if there is an ELSE part
+        else_jump = None
         if self.__token.category == Token.ELSE:
             self.__advance()
 
             if self.__token.category == Token.GOTO:
                 self.__advance()  # Advance past optional GOTO
 
-            self.__expr()
+            else_jump = self.__branch(FlowSignal.SIMPLE_JUMP)
 
-            # Set up and return the flow signal
-            return FlowSignal(ftarget=self.__operand_stack.pop())
+        def ifstmt():
+            # Jump if the expression evaluated to True
+            if condition():
+                return then_jump()
+
+            if else_jump:
+                return else_jump()
 
-        else:
             # No ELSE action
             return None
 
+        return ifstmt
+
     def __forstmt(self):
         """Parses for loops
 
-        :return: The FlowSignal to indicate that
+        :return: A closure returning the FlowSignal to indicate that
         a loop start has been processed
 
         """
 
-        # Set up default loop increment value
-        step = 1
-
         self.__advance()  # Advance past FOR token
 
         # Process the loop variable initialisation
@@ -1161,584 +2032,848 @@ class BASICParser:
 
         self.__advance()  # Advance past loop variable
         self.__consume(Token.ASSIGNOP)
-        self.__expr()
-
-        # Check that we are using the right variable name format
-        # for numeric variables
-        start_val = self.__operand_stack.pop()
+        start = self.__expr()
 
         # Advance past the 'TO' keyword
         self.__consume(Token.TO)
 
         # Process the terminating value
-        self.__expr()
-        end_val = self.__operand_stack.pop()
+        end = self.__expr()
 
         # Check if there is a STEP value
-        increment = True
+        step_expr = None
         if not self.__tokenindex >= len(self.__tokenlist):
             self.__consume(Token.STEP)
 
             # Acquire the step value
-            self.__expr()
-            step = self.__operand_stack.pop()
-
-            # Check whether we are decrementing or
-            # incrementing
-            if step == 0:
-                raise IndexError(
-                    "Zero step value supplied for loop"
-                    + " in line "
-                    + str(self.__line_number)
-                )
+            step_expr = self.__expr()
 
-            elif step < 0:
-                increment = False
+        line_number = self.__line_number
+        symbol_table = self.__symbol_table
+        key = self.__key(loop_variable)
+        skip_signal = FlowSignal(ftype=FlowSignal.LOOP_SKIP, ftarget=loop_variable)
 
-        # Now determine the status of the loop
+        def forstmt():
+            # Set up default loop increment value
+            step = 1
 
-        # Note that we cannot use the presence of the loop variable in
-        # the symbol table for this test, as the same variable may already
-        # have been instantiated elsewhere in the program
-        #
-        # Need to initialize the loop variable anytime the for
-        # statement is reached from a statement other than an active NEXT.
+            start_val = start()
+            end_val = end()
 
-        from_next = False
-        if self.last_flowsignal:
-            if self.last_flowsignal.ftype == FlowSignal.LOOP_REPEAT:
-                from_next = True
+            if step_expr:
+                step = step_expr()
 
-        if not from_next:
-            self.__symbol_table[loop_variable] = start_val
+                if step == 0:
+                    raise IndexError(
+                        "Zero step value supplied for loop"
+                        + " in line "
+                        + str(line_number)
+                    )
 
-        else:
-            # We need to modify the loop variable
-            # according to the STEP value
-            self.__symbol_table[loop_variable] += step
-
-        # If the loop variable has reached the end value,
-        # remove it from the set of extant loop variables to signal that
-        # this is the last loop iteration
-        stop = False
-        if increment and self.__symbol_table[loop_variable] > end_val:
-            stop = True
-
-        elif not increment and self.__symbol_table[loop_variable] < end_val:
-            stop = True
-
-        if stop:
-            # Loop must terminate
-            return FlowSignal(ftype=FlowSignal.LOOP_SKIP, ftarget=loop_variable)
-        else:
-            # Set up and return the flow signal
-            return FlowSignal(ftype=FlowSignal.LOOP_BEGIN)
+            symbol_table[key] = start_val
+
+            # If the loop variable is already past the end
+            # value, the loop body is not entered at all
+            if (step > 0 and start_val > end_val) or (
+                step < 0 and start_val < end_val
+            ):
+                return skip_signal
+
+            # Otherwise hand the evaluated loop state to the program,
+            # so that NEXT can step the loop without running FOR again
+            return FlowSignal(
+                LoopFrame(loop_variable, end_val, step, symbol_table, key),
+                FlowSignal.LOOP_BEGIN,
+                False,
+            )
+
+        return forstmt
 
     def __nextstmt(self):
         """Processes a NEXT statement that terminates
         a loop
 
-        :return: A FlowSignal indicating that a loop
-        has been processed
+        :return: A closure returning a FlowSignal indicating
+        that a loop has been processed
 
         """
 
         self.__advance()  # Advance past NEXT token
 
-        return FlowSignal(ftype=FlowSignal.LOOP_REPEAT)
+        # The loop variable is optional
+        loop_variable = None
+        if (
+            self.__tokenindex < len(self.__tokenlist)
+            and self.__token.category == Token.NAME
+        ):
+            loop_variable = self.__token.lexeme
+            self.__advance()
+
+        # The signal only names the loop, so it can be built once
+        if loop_variable == None:
+            signal = NEXT_SIGNAL
+        else:
+            signal = FlowSignal(ftype=FlowSignal.LOOP_REPEAT, ftarget=loop_variable)
+
+        def nextstmt():
+            return signal
+
+        return nextstmt
 
     def __ongosubstmt(self):
         """Process the ON-GOSUB statement
 
-        :return: A FlowSignal indicating the subroutine line number
-        if the condition is true, None otherwise
+        :return: A closure returning a FlowSignal indicating the
+        subroutine line number if the condition is true, None otherwise
 
         """
 
         self.__advance()  # Advance past ON token
-        self.__expr()
+        selector = self.__expr()
+
+        if self.__token.category == Token.GOTO:
+            self.__consume(Token.GOTO)
+            branchtype = FlowSignal.SIMPLE_JUMP
+        else:
+            self.__consume(Token.GOSUB)
+            branchtype = FlowSignal.GOSUB
+
+        branches = []
+        # Acquire the comma separated values
+        if not self.__tokenindex >= len(self.__tokenlist):
+            branches.append(self.__branch(branchtype))
+
+            while self.__token.category == Token.COMMA:
+                self.__advance()  # Advance past comma
+                branches.append(self.__branch(branchtype))
+
+        branches = tuple(branches)
+
+        def ongosubstmt():
+            # Save result of expression
+            saveval = selector()
+
+            if saveval < 1 or saveval > len(branches) or len(branches) == 0:
+                return None
+
+            return branches[saveval - 1]()
+
+        return ongosubstmt
+
+    def __evaluate_function(self, category):
+        """Parses a call to a built in function, using the
+        table of functions to find the method that parses it
+
+        :param category: The category of the function name token
+
+        :return: A closure evaluating the function and
+        returning its result
+
+        """
+        parse = self.__functions.get(category)
+        if parse == None:
+            raise SyntaxError(
+                "Unrecognised function in line " + str(self.__line_number)
+            )
+
+        self.__advance()  # Advance past function name
+
+        varying = self.__varying
+        function = parse()
+
+        if category in self.__pure:
+            return self.__fold(function, varying)
+
+        # Anything else, such as RND or a function registered
+        # by the host, may return a different value each time
+        self.__varying += 1
+        return function
+
+    def __fold(self, closure, varying):
+        """Folds a closure into a constant if every operand
+        parsed for it is a constant, by evaluating it once now.
+        If the evaluation fails, such as on a division by zero,
+        the closure is kept so that the error is raised when the
+        statement runs, as it would be without folding.
 
-        # Save result of expression
-        saveval = self.__operand_stack.pop()
+        :param closure: The closure evaluating the expression
+        :param varying: The count of varying operands taken before
+        the expression was parsed
 
-        if self.__token.category == Token.GOTO:
-            self.__consume(Token.GOTO)
-            branchtype = 1
-        else:
-            self.__consume(Token.GOSUB)
-            branchtype = 2
+        :return: A closure returning the value of the expression
 
-        branch_values = []
-        # Acquire the comma separated values
-        if not self.__tokenindex >= len(self.__tokenlist):
-            self.__expr()
-            branch_values.append(self.__operand_stack.pop())
+        """
+        if self.__varying != varying:
+            return closure
 
-            while self.__token.category == Token.COMMA:
-                self.__advance()  # Advance past comma
-                self.__expr()
-                branch_values.append(self.__operand_stack.pop())
+        try:
+            value = closure()
 
-        if saveval < 1 or saveval > len(branch_values) or len(branch_values) == 0:
-            return None
-        elif branchtype == 1:
-            return FlowSignal(ftarget=branch_values[saveval - 1])
-        else:
-            return FlowSignal(
-                ftarget=branch_values[saveval - 1], ftype=FlowSignal.GOSUB
-            )
+        except Exception:
+            return closure
 
-    def __relexpr(self):
-        """Parses a relational expression"""
-        self.__expr()
-
-        # Since BASIC uses same operator for both
-        # assignment and equality, we need to check for this
-        if self.__token.category == Token.ASSIGNOP:
-            self.__token.category = Token.EQUAL
-
-        if self.__token.category in [
-            Token.LESSER,
-            Token.LESSEQUAL,
-            Token.GREATER,
-            Token.GREATEQUAL,
-            Token.EQUAL,
-            Token.NOTEQUAL,
-        ]:
-            savecat = self.__token.category
-            self.__advance()
-            self.__expr()
+        return lambda: value
 
-            right = self.__operand_stack.pop()
-            left = self.__operand_stack.pop()
+    def __argument(self):
+        """Parses the single argument of a function, in parentheses
 
-            if savecat == Token.EQUAL:
-                self.__operand_stack.append(left == right)  # Push True or False
+        :return: A closure evaluating the argument
 
-            elif savecat == Token.NOTEQUAL:
-                self.__operand_stack.append(left != right)  # Push True or False
+        """
+        self.__consume(Token.LEFTPAREN)
 
-            elif savecat == Token.LESSER:
-                self.__operand_stack.append(left < right)  # Push True or False
+        value = self.__expr()
 
-            elif savecat == Token.GREATER:
-                self.__operand_stack.append(left > right)  # Push True or False
+        self.__consume(Token.RIGHTPAREN)
 
-            elif savecat == Token.LESSEQUAL:
-                self.__operand_stack.append(left <= right)  # Push True or False
+        return value
 
-            elif savecat == Token.GREATEQUAL:
-                self.__operand_stack.append(left >= right)  # Push True or False
+    def __arguments(self):
+        """Parses the comma separated arguments of a function,
+        in parentheses
 
-    def __logexpr(self):
-        """Parses a logical expression"""
-        self.__notexpr()
+        :return: A tuple of closures evaluating the arguments
 
-        while self.__token.category in [Token.OR, Token.AND]:
-            savecat = self.__token.category
-            self.__advance()
-            self.__notexpr()
+        """
+        self.__consume(Token.LEFTPAREN)
 
-            right = self.__operand_stack.pop()
-            left = self.__operand_stack.pop()
+        value_list = [self.__expr()]
 
-            if savecat == Token.OR:
-                self.__operand_stack.append(left or right)  # Push True or False
+        while self.__token.category == Token.COMMA:
+            self.__advance()  # Advance past comma
+            value_list.append(self.__expr())
 
-            elif savecat == Token.AND:
-                self.__operand_stack.append(left and right)  # Push True or False
+        self.__consume(Token.RIGHTPAREN)
 
-    def __notexpr(self):
-        """Parses a logical not expression"""
-        if self.__token.category == Token.NOT:
-            self.__advance()
-            self.__relexpr()
-            right = self.__operand_stack.pop()
-            self.__operand_stack.append(not right)
-        else:
-            self.__relexpr()
+        return tuple(value_list)
 
-    def __evaluate_function(self, category):
-        """Evaluate the function in the statement
-        and return the result.
+    def __rndfn(self):
+        """Parses a call to the RND function
 
-        :return: The result of the function
+        :return: A closure evaluating the function
 
         """
+        self.__consume(Token.LEFTPAREN)
 
-        self.__advance()  # Advance past function name
-
-        # Process arguments according to function
-        if category == Token.RND:
-            self.__consume(Token.LEFTPAREN)
+        arg = self.__expr()
 
-            self.__expr()
-            arg = self.__operand_stack.pop()
+        self.__consume(Token.RIGHTPAREN)
 
-            self.__consume(Token.RIGHTPAREN)
+        def rnd():
+            value = arg()
             # MSBASIC basic reseeds with negative values
             # as arg to RND... not sure if it returned anything
             # Zero returns the last value again (not implemented)
             # Any positive value returns random fload btw 0 and 1
-            if arg < 0:
-                random.seed(arg)
+            if value < 0:
+                random.seed(value)
 
             return random.random()
 
-        if category == Token.PI:
-            return math.pi
+        return rnd
 
-        if category == Token.RNDINT:
-            self.__consume(Token.LEFTPAREN)
+    def __pifn(self):
+        """Parses a call to the PI function
 
-            self.__expr()
-            lo = self.__operand_stack.pop()
+        :return: A closure evaluating the function
 
-            self.__consume(Token.COMMA)
+        """
+        return lambda: math.pi
 
-            self.__expr()
-            hi = self.__operand_stack.pop()
+    def __rndintfn(self):
+        """Parses a call to the RNDINT function
 
-            self.__consume(Token.RIGHTPAREN)
+        :return: A closure evaluating the function
+
+        """
+        line_number = self.__line_number
+
+        self.__consume(Token.LEFTPAREN)
 
+        lo = self.__expr()
+
+        self.__consume(Token.COMMA)
+
+        hi = self.__expr()
+
+        self.__consume(Token.RIGHTPAREN)
+
+        def rndint():
+            lo_val = lo()
+            hi_val = hi()
             try:
-                return random.randint(lo, hi)
+                return random.randint(lo_val, hi_val)
 
             except ValueError:
                 raise ValueError(
-                    "Invalid value supplied to RNDINT in line "
-                    + str(self.__line_number)
+                    "Invalid value supplied to RNDINT in line " + str(line_number)
                 )
 
-        if category == Token.MAX:
-            self.__consume(Token.LEFTPAREN)
+        return rndint
 
-            self.__expr()
-            value_list = [self.__operand_stack.pop()]
+    def __maxfn(self):
+        """Parses a call to the MAX function
 
-            while self.__token.category == Token.COMMA:
-                self.__advance()  # Advance past comma
-                self.__expr()
-                value_list.append(self.__operand_stack.pop())
+        :return: A closure evaluating the function
 
-            self.__consume(Token.RIGHTPAREN)
+        """
+        line_number = self.__line_number
 
+        value_list = self.__arguments()
+
+        def maxfn():
+            values = [value() for value in value_list]
             try:
-                return max(*value_list)
+                return max(*values)
 
             except TypeError:
                 raise TypeError(
-                    "Invalid type supplied to MAX in line " + str(self.__line_number)
+                    "Invalid type supplied to MAX in line " + str(line_number)
                 )
 
-        if category == Token.MIN:
-            self.__consume(Token.LEFTPAREN)
+        return maxfn
 
-            self.__expr()
-            value_list = [self.__operand_stack.pop()]
+    def __minfn(self):
+        """Parses a call to the MIN function
 
-            while self.__token.category == Token.COMMA:
-                self.__advance()  # Advance past comma
-                self.__expr()
-                value_list.append(self.__operand_stack.pop())
+        :return: A closure evaluating the function
 
-            self.__consume(Token.RIGHTPAREN)
+        """
+        line_number = self.__line_number
 
+        value_list = self.__arguments()
+
+        def minfn():
+            values = [value() for value in value_list]
             try:
-                return min(*value_list)
+                return min(*values)
 
             except TypeError:
                 raise TypeError(
-                    "Invalid type supplied to MIN in line " + str(self.__line_number)
+                    "Invalid type supplied to MIN in line " + str(line_number)
                 )
 
-        if category == Token.POW:
-            self.__consume(Token.LEFTPAREN)
+        return minfn
 
-            self.__expr()
-            base = self.__operand_stack.pop()
+    def __powfn(self):
+        """Parses a call to the POW function
 
-            self.__consume(Token.COMMA)
+        :return: A closure evaluating the function
 
-            self.__expr()
-            exponent = self.__operand_stack.pop()
+        """
+        line_number = self.__line_number
 
-            self.__consume(Token.RIGHTPAREN)
+        self.__consume(Token.LEFTPAREN)
 
+        base = self.__expr()
+
+        self.__consume(Token.COMMA)
+
+        exponent = self.__expr()
+
+        self.__consume(Token.RIGHTPAREN)
+
+        def powfn():
+            base_val = base()
+            exponent_val = exponent()
             try:
-                return math.pow(base, exponent)
+                return math.pow(base_val, exponent_val)
 
             except ValueError:
                 raise ValueError(
-                    "Invalid value supplied to POW in line " + str(self.__line_number)
+                    "Invalid value supplied to POW in line " + str(line_number)
                 )
 
-        if category == Token.TERNARY:
-            self.__consume(Token.LEFTPAREN)
+        return powfn
 
-            self.__logexpr()
-            condition = self.__operand_stack.pop()
+    def __ternaryfn(self):
+        """Parses a call to the IFF function
 
-            self.__consume(Token.COMMA)
+        :return: A closure evaluating the function
 
-            self.__expr()
-            whentrue = self.__operand_stack.pop()
+        """
+        self.__consume(Token.LEFTPAREN)
 
-            self.__consume(Token.COMMA)
+        condition = self.__logexpr()
+
+        self.__consume(Token.COMMA)
 
-            self.__expr()
-            whenfalse = self.__operand_stack.pop()
+        whentrue = self.__expr()
 
-            self.__consume(Token.RIGHTPAREN)
+        self.__consume(Token.COMMA)
 
-            return whentrue if condition else whenfalse
+        whenfalse = self.__expr()
 
-        if category == Token.LEFT:
-            self.__consume(Token.LEFTPAREN)
+        self.__consume(Token.RIGHTPAREN)
 
-            self.__expr()
-            instring = self.__operand_stack.pop()
+        def ternary():
+            condition_val = condition()
+            whentrue_val = whentrue()
+            whenfalse_val = whenfalse()
+            return whentrue_val if condition_val else whenfalse_val
 
-            self.__consume(Token.COMMA)
+        return ternary
 
-            self.__expr()
-            chars = self.__operand_stack.pop()
+    def __leftfn(self):
+        """Parses a call to the LEFT$ function
 
-            self.__consume(Token.RIGHTPAREN)
+        :return: A closure evaluating the function
+
+        """
+        line_number = self.__line_number
+
+        self.__consume(Token.LEFTPAREN)
+
+        instring = self.__expr()
 
+        self.__consume(Token.COMMA)
+
+        chars = self.__expr()
+
+        self.__consume(Token.RIGHTPAREN)
+
+        def left():
+            instring_val = instring()
+            chars_val = chars()
             try:
-                return instring[:chars]
+                return instring_val[:chars_val]
 
             except TypeError:
                 raise TypeError(
-                    "Invalid type supplied to LEFT$ in line " + str(self.__line_number)
+                    "Invalid type supplied to LEFT$ in line " + str(line_number)
                 )
 
-        if category == Token.RIGHT:
-            self.__consume(Token.LEFTPAREN)
+        return left
 
-            self.__expr()
-            instring = self.__operand_stack.pop()
+    def __rightfn(self):
+        """Parses a call to the RIGHT$ function
 
-            self.__consume(Token.COMMA)
+        :return: A closure evaluating the function
+
+        """
+        line_number = self.__line_number
+
+        self.__consume(Token.LEFTPAREN)
 
-            self.__expr()
-            chars = self.__operand_stack.pop()
+        instring = self.__expr()
 
-            self.__consume(Token.RIGHTPAREN)
+        self.__consume(Token.COMMA)
+
+        chars = self.__expr()
+
+        self.__consume(Token.RIGHTPAREN)
 
+        def right():
+            instring_val = instring()
+            chars_val = chars()
             try:
-                return instring[-chars:]
+                return instring_val[-chars_val:]
 
             except TypeError:
                 raise TypeError(
-                    "Invalid type supplied to RIGHT$ in line " + str(self.__line_number)
+                    "Invalid type supplied to RIGHT$ in line " + str(line_number)
                 )
 
-        if category == Token.MID:
-            self.__consume(Token.LEFTPAREN)
+        return right
 
-            self.__expr()
-            instring = self.__operand_stack.pop()
+    def __midfn(self):
+        """Parses a call to the MID$ function
 
-            self.__consume(Token.COMMA)
+        :return: A closure evaluating the function
 
-            self.__expr()
-            # Older basic dialets were always 1 based
-            start = self.__operand_stack.pop() - 1
+        """
+        line_number = self.__line_number
 
-            if self.__token.category == Token.COMMA:
-                self.__advance()  # Advance past comma
-                self.__expr()
-                chars = self.__operand_stack.pop()
-            else:
-                chars = None
+        self.__consume(Token.LEFTPAREN)
 
-            self.__consume(Token.RIGHTPAREN)
+        instring = self.__expr()
+
+        self.__consume(Token.COMMA)
+
+        start = self.__expr()
+
+        chars = None
+        if self.__token.category == Token.COMMA:
+            self.__advance()  # Advance past comma
+            chars = self.__expr()
+
+        self.__consume(Token.RIGHTPAREN)
+
+        def mid():
+            instring_val = instring()
+            # Older basic dialets were always 1 based
+            start_val = start() - 1
+            chars_val = None
+            if chars:
+                chars_val = chars()
 
             try:
-                if chars:
-                    return instring[start : start + chars]
+                if chars_val:
+                    return instring_val[start_val : start_val + chars_val]
                 else:
-                    return instring[start:]
+                    return instring_val[start_val:]
 
             except TypeError:
                 raise TypeError(
-                    "Invalid type supplied to MID$ in line " + str(self.__line_number)
+                    "Invalid type supplied to MID$ in line " + str(line_number)
                 )
 
-        if category == Token.INSTR:
-            self.__consume(Token.LEFTPAREN)
+        return mid
 
-            self.__expr()
-            hackstackstring = self.__operand_stack.pop()
-            if not isinstance(hackstackstring, str):
-                raise TypeError(
-                    "Invalid type supplied to INSTR in line " + str(self.__line_number)
-                )
+    def __instrfn(self):
+        """Parses a call to the INSTR function
 
-            self.__consume(Token.COMMA)
+        :return: A closure evaluating the function
+
+        """
+        line_number = self.__line_number
 
-            self.__expr()
-            needlestring = self.__operand_stack.pop()
+        self.__consume(Token.LEFTPAREN)
+
+        haystack = self.__expr()
+
+        self.__consume(Token.COMMA)
+
+        needle = self.__expr()
+
+        start = end = None
+        if self.__token.category == Token.COMMA:
+            self.__advance()  # Advance past comma
+            start = self.__expr()
 
-            start = end = None
             if self.__token.category == Token.COMMA:
                 self.__advance()  # Advance past comma
-                self.__expr()
-                # Older basic dialets were always 1 based
-                start = self.__operand_stack.pop() - 1
+                end = self.__expr()
 
-                if self.__token.category == Token.COMMA:
-                    self.__advance()  # Advance past comma
-                    self.__expr()
-                    end = self.__operand_stack.pop() - 1
+        self.__consume(Token.RIGHTPAREN)
 
-            self.__consume(Token.RIGHTPAREN)
+        def instr():
+            hackstackstring = haystack()
+            if not isinstance(hackstackstring, str):
+                raise TypeError(
+                    "Invalid type supplied to INSTR in line " + str(line_number)
+                )
+
+            needlestring = needle()
+
+            start_val = end_val = None
+            if start:
+                # Older basic dialets were always 1 based
+                start_val = start() - 1
+
+                if end:
+                    end_val = end() - 1
 
             try:
                 # Older basis dialets are 1 based, so the return value
                 # here needs to be incremented by one.  ALSO
                 # this moves the -1 not found value to 0
                 # which indicated not found in most dialects
-                return hackstackstring.find(needlestring, start, end) + 1
+                return hackstackstring.find(needlestring, start_val, end_val) + 1
 
             except TypeError:
                 raise TypeError(
-                    "Invalid type supplied to INSTR in line " + str(self.__line_number)
+                    "Invalid type supplied to INSTR in line " + str(line_number)
                 )
 
-        self.__consume(Token.LEFTPAREN)
+        return instr
 
-        self.__expr()
-        value = self.__operand_stack.pop()
+    def __sqrfn(self):
+        """Parses a call to the SQR function
 
-        self.__consume(Token.RIGHTPAREN)
+        :return: A closure evaluating the function
+
+        """
+        line_number = self.__line_number
+
+        value = self.__argument()
 
-        if category == Token.SQR:
+        def sqr():
+            arg = value()
             try:
-                return math.sqrt(value)
+                return math.sqrt(arg)
 
             except ValueError:
                 raise ValueError(
-                    "Invalid value supplied to SQR in line " + str(self.__line_number)
+                    "Invalid value supplied to SQR in line " + str(line_number)
                 )
 
-        elif category == Token.ABS:
+        return sqr
+
+    def __absfn(self):
+        """Parses a call to the ABS function
+
+        :return: A closure evaluating the function
+
+        """
+        line_number = self.__line_number
+
+        value = self.__argument()
+
+        def absfn():
+            arg = value()
             try:
-                return abs(value)
+                return abs(arg)
 
             except ValueError:
                 raise ValueError(
-                    "Invalid value supplied to ABS in line " + str(self.__line_number)
+                    "Invalid value supplied to ABS in line " + str(line_number)
                 )
 
-        elif category == Token.ATN:
+        return absfn
+
+    def __atnfn(self):
+        """Parses a call to the ATN function
+
+        :return: A closure evaluating the function
+
+        """
+        line_number = self.__line_number
+
+        value = self.__argument()
+
+        def atn():
+            arg = value()
             try:
-                return math.atan(value)
+                return math.atan(arg)
 
             except ValueError:
                 raise ValueError(
-                    "Invalid value supplied to ATN in line " + str(self.__line_number)
+                    "Invalid value supplied to ATN in line " + str(line_number)
                 )
 
-        elif category == Token.COS:
+        return atn
+
+    def __cosfn(self):
+        """Parses a call to the COS function
+
+        :return: A closure evaluating the function
+
+        """
+        line_number = self.__line_number
+
+        value = self.__argument()
+
+        def cos():
+            arg = value()
             try:
-                return math.cos(value)
+                return math.cos(arg)
 
             except ValueError:
                 raise ValueError(
-                    "Invalid value supplied to COS in line " + str(self.__line_number)
+                    "Invalid value supplied to COS in line " + str(line_number)
                 )
 
-        elif category == Token.EXP:
+        return cos
+
+    def __expfn(self):
+        """Parses a call to the EXP function
+
+        :return: A closure evaluating the function
+
+        """
+        line_number = self.__line_number
+
+        value = self.__argument()
+
+        def exp():
+            arg = value()
             try:
-                return math.exp(value)
+                return math.exp(arg)
 
             except ValueError:
                 raise ValueError(
-                    "Invalid value supplied to EXP in line " + str(self.__line_number)
+                    "Invalid value supplied to EXP in line " + str(line_number)
                 )
 
-        elif category == Token.INT:
+        return exp
+
+    def __intfn(self):
+        """Parses a call to the INT function
+
+        :return: A closure evaluating the function
+
+        """
+        line_number = self.__line_number
+
+        value = self.__argument()
+
+        def intfn():
+            arg = value()
             try:
-                return math.floor(value)
+                return math.floor(arg)
 
             except ValueError:
                 raise ValueError(
-                    "Invalid value supplied to INT in line " + str(self.__line_number)
+                    "Invalid value supplied to INT in line " + str(line_number)
                 )
 
-        elif category == Token.ROUND:
+        return intfn
+
+    def __roundfn(self):
+        """Parses a call to the ROUND function
+
+        :return: A closure evaluating the function
+
+        """
+        line_number = self.__line_number
+
+        value = self.__argument()
+
+        def roundfn():
+            arg = value()
             try:
-                return round(value)
+                return round(arg)
 
             except TypeError:
                 raise TypeError(
-                    "Invalid type supplied to LEN in line " + str(self.__line_number)
+                    "Invalid type supplied to LEN in line " + str(line_number)
                 )
 
-        elif category == Token.LOG:
+        return roundfn
+
+    def __logfn(self):
+        """Parses a call to the LOG function
+
+        :return: A closure evaluating the function
+
+        """
+        line_number = self.__line_number
+
+        value = self.__argument()
+
+        def log():
+            arg = value()
             try:
-                return math.log(value)
+                return math.log(arg)
 
             except ValueError:
                 raise ValueError(
-                    "Invalid value supplied to LOG in line " + str(self.__line_number)
+                    "Invalid value supplied to LOG in line " + str(line_number)
                 )
 
-        elif category == Token.SIN:
+        return log
+
+    def __sinfn(self):
+        """Parses a call to the SIN function
+
+        :return: A closure evaluating the function
+
+        """
+        line_number = self.__line_number
+
+        value = self.__argument()
+
+        def sin():
+            arg = value()
             try:
-                return math.sin(value)
+                return math.sin(arg)
 
             except ValueError:
                 raise ValueError(
-                    "Invalid value supplied to SIN in line " + str(self.__line_number)
+                    "Invalid value supplied to SIN in line " + str(line_number)
                 )
 
-        elif category == Token.TAN:
+        return sin
+
+    def __tanfn(self):
+        """Parses a call to the TAN function
+
+        :return: A closure evaluating the function
+
+        """
+        line_number = self.__line_number
+
+        value = self.__argument()
+
+        def tan():
+            arg = value()
             try:
-                return math.tan(value)
+                return math.tan(arg)
 
             except ValueError:
                 raise ValueError(
-                    "Invalid value supplied to TAN in line " + str(self.__line_number)
+                    "Invalid value supplied to TAN in line " + str(line_number)
                 )
 
-        elif category == Token.CHR:
+        return tan
+
+    def __chrfn(self):
+        """Parses a call to the CHR$ function
+
+        :return: A closure evaluating the function
+
+        """
+        line_number = self.__line_number
+
+        value = self.__argument()
+
+        def chrfn():
+            arg = value()
             try:
-                return chr(value)
+                return chr(arg)
 
             except TypeError:
                 raise TypeError(
-                    "Invalid type supplied to CHR$ in line " + str(self.__line_number)
+                    "Invalid type supplied to CHR$ in line " + str(line_number)
                 )
 
             except ValueError:
                 raise ValueError(
-                    "Invalid value supplied to CHR$ in line " + str(self.__line_number)
+                    "Invalid value supplied to CHR$ in line " + str(line_number)
                 )
 
-        elif category == Token.ASC:
+        return chrfn
+
+    def __ascfn(self):
+        """Parses a call to the ASC function
+
+        :return: A closure evaluating the function
+
+        """
+        line_number = self.__line_number
+
+        value = self.__argument()
+
+        def asc():
+            arg = value()
             try:
-                return ord(value)
+                return ord(arg)
 
             except TypeError:
                 raise TypeError(
-                    "Invalid type supplied to ASC in line " + str(self.__line_number)
+                    "Invalid type supplied to ASC in line " + str(line_number)
                 )
 
             except ValueError:
                 raise ValueError(
-                    "Invalid value supplied to ASC in line " + str(self.__line_number)
+                    "Invalid value supplied to ASC in line " + str(line_number)
                 )
 
-        elif category == Token.STR:
-            return str(value)
+        return asc
+
+    def __strfn(self):
+        """Parses a call to the STR$ function
+
+        :return: A closure evaluating the function
+
+        """
+        value = self.__argument()
+
+        return lambda: str(value())
+
+    def __valfn(self):
+        """Parses a call to the VAL function
+
+        :return: A closure evaluating the function
+
+        """
+        value = self.__argument()
 
-        elif category == Token.VAL:
+        def val():
+            arg = value()
             try:
-                numeric = float(value)
+                numeric = float(arg)
                 if numeric.is_integer():
                     return int(numeric)
                 return numeric
@@ -1747,44 +2882,93 @@ class BASICParser:
             except ValueError:
                 return 0
 
-        elif category == Token.LEN:
+        return val
+
+    def __lenfn(self):
+        """Parses a call to the LEN function
+
+        :return: A closure evaluating the function
+
+        """
+        line_number = self.__line_number
+
+        value = self.__argument()
+
+        def lenfn():
+            arg = value()
             try:
-                return len(value)
+                return len(arg)
 
             except TypeError:
                 raise TypeError(
-                    "Invalid type supplied to LEN in line " + str(self.__line_number)
+                    "Invalid type supplied to LEN in line " + str(line_number)
                 )
 
-        elif category == Token.UPPER:
-            if not isinstance(value, str):
+        return lenfn
+
+    def __upperfn(self):
+        """Parses a call to the UPPER$ function
+
+        :return: A closure evaluating the function
+
+        """
+        line_number = self.__line_number
+
+        value = self.__argument()
+
+        def upper():
+            arg = value()
+            if not isinstance(arg, str):
                 raise TypeError(
-                    "Invalid type supplied to UPPER$ in line " + str(self.__line_number)
+                    "Invalid type supplied to UPPER$ in line " + str(line_number)
                 )
 
-            return value.upper()
+            return arg.upper()
+
+        return upper
+
+    def __lowerfn(self):
+        """Parses a call to the LOWER$ function
+
+        :return: A closure evaluating the function
 
-        elif category == Token.LOWER:
-            if not isinstance(value, str):
+        """
+        line_number = self.__line_number
+
+        value = self.__argument()
+
+        def lower():
+            arg = value()
+            if not isinstance(arg, str):
                 raise TypeError(
-                    "Invalid type supplied to LOWER$ in line " + str(self.__line_number)
+                    "Invalid type supplied to LOWER$ in line " + str(line_number)
                 )
 
-            return value.lower()
+            return arg.lower()
+
+        return lower
+
+    def __tabfn(self):
+        """Parses a call to the TAB function
+
+        :return: A closure evaluating the function
+
+        """
+        line_number = self.__line_number
+
+        value = self.__argument()
 
-        elif category == Token.TAB:
+        def tab():
             # Return a string of value spaces
-            if not isinstance(value, int):
+            arg = value()
+            if not isinstance(arg, int):
                 raise TypeError(
-                    "Invalid type supplied to TAB in line " + str(self.__line_number)
+                    "Invalid type supplied to TAB in line " + str(line_number)
                 )
 
-            return " " * value
+            return " " * arg
 
-        else:
-            raise SyntaxError(
-                "Unrecognised function in line " + str(self.__line_number)
-            )
+        return tab
 
     def __randomizestmt(self):
         """Implements a function to seed the random
@@ -1793,11 +2977,15 @@ class BASICParser:
         """
         self.__advance()  # Advance past RANDOMIZE token
 
+        seed = None
         if not self.__tokenindex >= len(self.__tokenlist):
-            self.__expr()  # Process the seed
-            seed = self.__operand_stack.pop()
+            seed = self.__expr()  # Process the seed
 
-            random.seed(seed)
+        def randomizestmt():
+            if seed:
+                random.seed(seed())
 
-        else:
-            random.seed(int(monotonic()))
+            else:
+                random.seed(int(monotonic()))
+
+        return randomizestmt
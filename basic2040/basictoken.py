@@ -15,11 +15,13 @@
 
 """Class to represent a token for the BASIC
 programming language. A token consists of
-three items:
+four items:
 
 column      Column in which token starts
 category    Category of the token
 lexeme      Token in string form
+value       Numeric value of a number token, converted
+            once by the lexer, otherwise None
 
 """
 
@@ -119,6 +121,9 @@ class BASICToken:
     RIGHT = 88  # RIGHT$ function
     CLEAR = 89  # CLEAR keyword
     CURSOR = 90  # CURSOR function
+    FREEZE = 91  # FREEZE keyword
+    THAW = 92  # THAW command
+    VARS = 93  # VARS command
 
     # Displayable names for each token category
     catnames = [
@@ -214,6 +219,9 @@ class BASICToken:
         "RIGHT",
         "CLEAR",
         "CURSOR",
+        "FREEZE",
+        "THAW",
+        "VARS",
     ]
 
     smalltokens = {
@@ -309,6 +317,9 @@ class BASICToken:
         "RIGHT$": RIGHT,
         "CLEAR": CLEAR,
         "CURSOR": CURSOR,
+        "FREEZE": FREEZE,
+        "THAW": THAW,
+        "VARS": VARS,
     }
 
     # Functions
@@ -344,11 +355,16 @@ class BASICToken:
         RIGHT,
     }
 
-    def __init__(self, column, category, lexeme):
+    # Loaded programs hold a great many tokens, so avoid
+    # giving each of them its own attribute dictionary
+    __slots__ = ("column", "category", "lexeme", "value")
+
+    def __init__(self, column, category, lexeme, value=None):
 
         self.column = column  # Column in which token starts
         self.category = category  # Category of the token
         self.lexeme = lexeme  # Token in string form
+        self.value = value  # Numeric value of a number token
 
     def __str__(self):
         return self.lexeme
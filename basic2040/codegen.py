@@ -0,0 +1,541 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Translates program statements into Python source, which is
+compiled into functions run in place of the closures made by the
+parser. A compiled function evaluates a whole expression in one
+go, rather than calling a closure for every operator and operand,
+so arithmetic runs several times faster.
+
+Assignments, to simple variables and to array elements, and IF
+statements with line numbers as their targets are translated.
+Other statements keep their closures, as do calls to functions
+within a translated statement. Statements calling a function
+that may return a different value each time, such as RND, are
+not translated at all, for the reason given below. Compiling each
+statement takes both time and memory, and relies on compile(),
+which MicroPython may not provide, so code generation is only
+used when asked for.
+
+A translated statement must behave exactly as its closure does.
+Rather than repeat every check the closure makes, the translated
+statement hands over to the closure whenever anything goes wrong,
+such as a variable not yet being assigned, so that the closure
+raises the error it always would. A failed statement does nothing
+before it fails other than call any functions in it, and those it
+may call are only those which return the same value for the same
+arguments, so running it again from the start changes nothing else.
+
+>>> from .basicparser import BASICParser
+>>> from .lexer import Lexer
+>>> parser = BASICParser(None, None)
+>>> tokens = Lexer().tokenize('10 X = 2 * (3 + Y)')[1:]
+>>> generator = CodeGenerator(parser)
+>>> print(generator.source(tokens), end="")
+def statement():
+    try:
+        value = (2 * ((3 + v['Y'])))
+        if not isinstance(value, str):
+            v['X'] = value
+            return None
+    except Exception:
+        pass
+    return fallback()
+"""
+
+from .basictoken import BASICToken as Token
+from .basicparser import (
+    _PRECEDENCE,
+    _LOGICAL,
+    _NOT,
+    _RELATIONAL,
+    _ADDITIVE,
+)
+from .flowsignal import FlowSignal
+
+# Python operator for each BASIC binary operator other
+# than AND and OR
+_OPERATORS = {
+    Token.PLUS: "+",
+    Token.MINUS: "-",
+    Token.TIMES: "*",
+    Token.DIVIDE: "/",
+    Token.MODULO: "%",
+    Token.EQUAL: "==",
+    Token.ASSIGNOP: "==",
+    Token.NOTEQUAL: "!=",
+    Token.LESSER: "<",
+    Token.GREATER: ">",
+    Token.LESSEQUAL: "<=",
+    Token.GREATEQUAL: ">=",
+}
+
+
+def _or(left, right):
+    """Applies OR to two values, both already evaluated as
+    the parser's closures do
+
+    """
+    return left or right
+
+
+def _and(left, right):
+    """Applies AND to two values, both already evaluated as
+    the parser's closures do
+
+    """
+    return left and right
+
+
+class _Untranslatable(Exception):
+    """Raised when a statement cannot be translated, so
+    that its closure is kept instead
+
+    """
+
+    pass
+
+
+class CodeGenerator:
+    """Translates statements into Python functions, bound to the
+    symbol tables of the parser that compiled their closures
+
+    """
+
+    def __init__(self, parser):
+        """Creates a code generator for the statements
+        compiled by the supplied parser
+
+        :param parser: The BASICParser
+
+        """
+        self.__parser = parser
+        self.__symbol_table, self.__array_table = parser.symbol_tables()
+
+        # The statement being translated, and the
+        # position of the current token within it
+        self.__tokens = ()
+        self.__index = 0
+        self.__line_number = None
+
+        # Names bound in the namespace of the function
+        # being generated, such as the closures of calls
+        # to functions, keyed by name
+        self.__names = {}
+
+    def generate(self, statements, line_number, compiled):
+        """Translates the statements of a program line
+
+        :param statements: A tuple holding a tuple of tokens
+        for each statement of the line
+        :param line_number: The line number
+        :param compiled: The closures made by the parser for
+        each of the statements
+
+        :return: A tuple holding, for each statement, its
+        translation or, if it cannot be translated, its closure
+
+        """
+        functions = []
+        for position in range(len(statements)):
+            closure = compiled[position]
+            try:
+                source = self.source(statements[position], line_number)
+                namespace = self.__names
+                namespace["v"] = self.__symbol_table
+                namespace["a"] = self.__array_table
+                namespace["fallback"] = closure
+                code = compile(source, "<line " + str(line_number) + ">", "exec")
+                exec(code, namespace)
+                functions.append(namespace["statement"])
+
+            except _Untranslatable:
+                functions.append(closure)
+
+        return tuple(functions)
+
+    def source(self, statement, line_number=None):
+        """Returns the Python source of the function
+        translating a statement
+
+        :param statement: The tokens of the statement
+        :param line_number: The line number of the statement
+
+        :return: The source of a function named statement
+
+        """
+        self.__tokens = statement
+        self.__index = 0
+        self.__line_number = line_number
+        self.__names = {"_or": _or, "_and": _and}
+
+        if len(statement) == 0:
+            raise _Untranslatable()
+
+        category = statement[0].category
+        if category == Token.LET:
+            self.__index = 1
+            category = self.__category()
+
+        if category == Token.NAME:
+            return self.__assignment()
+
+        elif category == Token.IF:
+            return self.__if()
+
+        raise _Untranslatable()
+
+    def __category(self):
+        """Returns the category of the current token, or
+        None if all of the tokens have been used
+
+        """
+        if self.__index >= len(self.__tokens):
+            return None
+
+        return self.__tokens[self.__index].category
+
+    def __consume(self, category):
+        """Moves past the current token, which must
+        be of the expected category
+
+        :param category: The expected category
+
+        """
+        if self.__category() != category:
+            raise _Untranslatable()
+
+        self.__index = self.__index + 1
+
+    def __end(self):
+        """Checks that all of the tokens have been used"""
+        if self.__index < len(self.__tokens):
+            raise _Untranslatable()
+
+    def __assignment(self):
+        """Translates an assignment to a simple variable
+        or an array element
+
+        :return: The source of the function
+
+        """
+        name = self.__tokens[self.__index].lexeme
+        self.__index = self.__index + 1
+
+        check = "not isinstance(value, str)"
+        if name.endswith("$"):
+            check = "isinstance(value, str)"
+
+        if self.__category() == Token.LEFTPAREN:
+            indexes = self.__indexes()
+            self.__consume(Token.ASSIGNOP)
+            value = self.__expression(_LOGICAL)[0]
+            self.__end()
+
+            return (
+                "def statement():\n"
+                "    try:\n"
+                "        indexes = [" + indexes + "]\n"
+                "        array = a[" + repr(name) + "]\n"
+                "        value = " + value + "\n"
+                "        if " + check + ":\n"
+                "            array.set(indexes, value)\n"
+                "            return None\n"
+                "    except Exception:\n"
+                "        pass\n"
+                "    return fallback()\n"
+            )
+
+        self.__consume(Token.ASSIGNOP)
+        value = self.__expression(_LOGICAL)[0]
+        self.__end()
+
+        return (
+            "def statement():\n"
+            "    try:\n"
+            "        value = " + value + "\n"
+            "        if " + check + ":\n"
+            "            v[" + repr(self.__parser.variable_key(name)) + "] = value\n"
+            "            return None\n"
+            "    except Exception:\n"
+            "        pass\n"
+            "    return fallback()\n"
+        )
+
+    def __if(self):
+        """Translates an IF statement whose THEN and ELSE
+        parts are line numbers
+
+        :return: The source of the function
+
+        """
+        self.__index = 1
+        # The condition is tested, so uses the exact form, which
+        # fails for a variable that has not been assigned
+        condition = self.__expression(_LOGICAL)[0]
+        self.__consume(Token.THEN)
+
+        self.__names["then_signal"] = self.__jump()
+        otherwise = "None"
+        if self.__category() == Token.ELSE:
+            self.__index = self.__index + 1
+            self.__names["else_signal"] = self.__jump()
+            otherwise = "else_signal"
+
+        self.__end()
+
+        return (
+            "def statement():\n"
+            "    try:\n"
+            "        if " + condition + ":\n"
+            "            return then_signal\n"
+            "        return " + otherwise + "\n"
+            "    except Exception:\n"
+            "        pass\n"
+            "    return fallback()\n"
+        )
+
+    def __jump(self):
+        """Translates the target of a THEN or ELSE, with its
+        optional GOTO, which must be a line number
+
+        :return: The FlowSignal for the jump
+
+        """
+        if self.__category() == Token.GOTO:
+            self.__index = self.__index + 1
+
+        if self.__category() != Token.UNSIGNEDINT:
+            raise _Untranslatable()
+
+        target = self.__tokens[self.__index].value
+        self.__index = self.__index + 1
+
+        return self.__parser.branch_signal(target, FlowSignal.SIMPLE_JUMP)
+
+    def __indexes(self):
+        """Translates the indexes of an array element, in
+        parentheses
+
+        :return: The source of the comma separated indexes
+
+        """
+        self.__consume(Token.LEFTPAREN)
+
+        indexes = [self.__expression(_ADDITIVE)[1]]
+        while self.__category() == Token.COMMA:
+            self.__index = self.__index + 1
+            indexes.append(self.__expression(_ADDITIVE)[1])
+
+        self.__consume(Token.RIGHTPAREN)
+
+        return ", ".join(indexes)
+
+    def __expression(self, precedence):
+        """Translates an expression, following the rules of
+        the parser's precedence climbing
+
+        The source is returned in two forms. The exact form gives
+        the value the parser's closure would. The plain form may
+        differ in type, reading a variable holding True as True where
+        the closure gives 1, so is only used where that makes no
+        difference, such as an operand of arithmetic. A variable held
+        in a slot that has not been assigned reads in the plain form
+        as a marker, which arithmetic rejects but which can be tested
+        and compared, so values that are tested or compared always
+        use the exact form.
+
+        :param precedence: The precedence of the most loosely
+        binding operators to accept
+
+        :return: A tuple of the exact and plain source
+
+        """
+        relational = precedence <= _RELATIONAL
+
+        if precedence <= _NOT and self.__category() == Token.NOT:
+            self.__index = self.__index + 1
+            operand = self.__expression(_RELATIONAL)[0]
+            left = "(not " + operand + ")"
+            left = (left, left)
+            relational = False
+
+        else:
+            left = self.__unary()
+
+        while True:
+            category = self.__category()
+            operator = _PRECEDENCE.get(category)
+            if operator == None or operator < precedence:
+                return left
+
+            if operator == _RELATIONAL:
+                if not relational:
+                    return left
+
+                relational = False
+
+            elif operator == _LOGICAL:
+                relational = False
+
+            self.__index = self.__index + 1
+            right = self.__expression(operator + 1)
+
+            if category == Token.OR:
+                source = "_or(" + left[0] + ", " + right[0] + ")"
+
+            elif category == Token.AND:
+                source = "_and(" + left[0] + ", " + right[0] + ")"
+
+            elif category == Token.MODULO:
+                # A string on the left formats the value on
+                # the right, so the exact value is needed
+                source = "(" + left[0] + " % " + right[0] + ")"
+
+            elif operator == _RELATIONAL:
+                source = (
+                    "(" + left[0] + " " + _OPERATORS[category] + " " + right[0] + ")"
+                )
+
+            else:
+                source = (
+                    "(" + left[1] + " " + _OPERATORS[category] + " " + right[1] + ")"
+                )
+
+            left = (source, source)
+
+    def __unary(self):
+        """Translates an operand with any unary signs before it
+
+        :return: A tuple of the exact and plain source
+
+        """
+        sign = 1
+        while self.__category() in (Token.PLUS, Token.MINUS):
+            if self.__category() == Token.MINUS:
+                sign = -sign
+
+            self.__index = self.__index + 1
+
+        category = self.__category()
+        if category == None:
+            raise _Untranslatable()
+
+        token = self.__tokens[self.__index]
+
+        if category == Token.UNSIGNEDINT or category == Token.UNSIGNEDFLOAT:
+            self.__index = self.__index + 1
+            source = repr(sign * token.value)
+            if sign == -1:
+                source = "(" + source + ")"
+
+            return source, source
+
+        elif category == Token.STRING:
+            self.__index = self.__index + 1
+            source = repr(token.lexeme)
+            return source, source
+
+        elif category == Token.NAME:
+            self.__index = self.__index + 1
+
+            if self.__category() == Token.LEFTPAREN:
+                plain = (
+                    "a[" + repr(token.lexeme) + "].get([" + self.__indexes() + "])"
+                )
+
+            else:
+                plain = "v[" + repr(self.__parser.variable_key(token.lexeme)) + "]"
+
+            exact = "(" + str(sign) + " * " + plain + ")"
+            if sign == -1:
+                return exact, exact
+
+            return exact, plain
+
+        elif category == Token.LEFTPAREN:
+            self.__index = self.__index + 1
+            inner = self.__expression(_LOGICAL)
+            self.__consume(Token.RIGHTPAREN)
+
+            if sign == -1:
+                source = "(-" + inner[1] + ")"
+                return source, source
+
+            return "(" + inner[0] + ")", "(" + inner[1] + ")"
+
+        elif category in Token.functions:
+            source = self.__call()
+            if sign == -1:
+                source = "(-" + source + ")"
+
+            return source, source
+
+        raise _Untranslatable()
+
+    def __call(self):
+        """Translates a call to a built in function into a call
+        to the closure the parser makes for it, so that it behaves
+        exactly as it would in a statement that is not translated
+
+        :return: The source of the call
+
+        """
+        start = self.__index
+        self.__index = self.__index + 1
+
+        if self.__category() == Token.LEFTPAREN:
+            # Find the matching parenthesis
+            depth = 0
+            while True:
+                category = self.__category()
+                if category == None:
+                    raise _Untranslatable()
+
+                self.__index = self.__index + 1
+
+                if category == Token.LEFTPAREN:
+                    depth = depth + 1
+
+                elif category == Token.RIGHTPAREN:
+                    depth = depth - 1
+                    if depth == 0:
+                        break
+
+        # A statement which fails is run again by its closure, so
+        # it must not call anything, such as RND, whose result
+        # would then differ from that of the first call
+        for token in self.__tokens[start : self.__index]:
+            if self.__parser.is_varying(token.category):
+                raise _Untranslatable()
+
+        try:
+            function = self.__parser.compile_expression(
+                self.__tokens[start : self.__index], self.__line_number
+            )
+
+        except Exception:
+            raise _Untranslatable()
+
+        name = "f" + str(len(self.__names))
+        self.__names[name] = function
+
+        return name + "()"
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
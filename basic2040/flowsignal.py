@@ -18,9 +18,14 @@ indicate the need for a control flow branch. The information within the
 object tells the Program the nature of the jump and therefore whether a
 return address need to be added to the return stack.
 
+Signals which carry no target are shared rather than built afresh for
+every statement, so that loops and subroutine calls do not allocate.
+
 >>> flowsignal = FlowSignal(ftype=FlowSignal.RETURN)
 >>> print(flowsignal.ftarget)
--1
+None
+>>> RETURN_SIGNAL.ftype == FlowSignal.RETURN
+True
 >>> flowsignal = FlowSignal(ftarget=100, ftype=FlowSignal.SIMPLE_JUMP)
 >>> print(flowsignal.ftarget)
 100
@@ -31,6 +36,10 @@ return address need to be added to the return stack.
 
 class FlowSignal:
 
+    # Signals are created for every branch taken, so keep
+    # them small and free of a per-instance dictionary
+    __slots__ = ("ftype", "ftarget")
+
     # Jump categories
 
     # Indicates a simple jump as the result
@@ -48,13 +57,14 @@ class FlowSignal:
 
     # Indicates the start of a FOR loop where loop
     # variable has not reached the end value, and therefore the loop
-    # must be repeated. There should be therefore be
-    # no ftarget value associated with it
+    # must be entered. The ftarget value should be the LoopFrame
+    # holding the state of the loop
     LOOP_BEGIN = 2
 
-    # An indication from a processed NEXT statement that the loop is to
-    # be repeated. Since the return address is already on the stack,
-    # there does not need to be an ftarget value associated with the signal.
+    # An indication from a processed NEXT statement that the loop variable
+    # is to be stepped and the loop possibly repeated. Since the loop frame
+    # is already on the stack, the ftarget value is only the name of the
+    # loop variable given in the NEXT statement, if any
     LOOP_REPEAT = 3
 
     # An indication from a FOR statement that the loop should be skipped because
@@ -71,43 +81,149 @@ class FlowSignal:
     # been processed. There should be therefore be no ftarget value specified
     STOP = 6
 
-    def __init__(self, ftarget=None, ftype=SIMPLE_JUMP):
+    # Indicates that a FREEZE statement has been processed, so that the
+    # program should save an image of its state before carrying on at the
+    # following statement. There should therefore be no ftarget value specified
+    FREEZE = 7
+
+    # Indicates a GOTO or conditional branch to a line given as a
+    # literal, which the program has already resolved. The ftarget
+    # value is the number of the first statement of the line,
+    # counting every statement of the program in turn
+    RESOLVED_JUMP = 8
+
+    # Indicates a subroutine call to a line given as a literal,
+    # which the program has already resolved. As for RESOLVED_JUMP,
+    # the ftarget value is the number of the first statement
+    RESOLVED_GOSUB = 9
+
+    def __init__(self, ftarget=None, ftype=SIMPLE_JUMP, check=True):
         """Creates a new FlowSignal for a branch. If the jump
         target is supplied, then the branch is assumed to be
         either a GOTO or conditional branch and the type is assigned as
         SIMPLE_JUMP. If no jump_target is supplied, then a jump_type must be
-        supplied, which must either be GOSUB, RETURN, LOOP_BEGIN,
-        LOOP_REPEAT, LOOP_SKIP or STOP. In the latter cases
-        the jump target is assigned an arbitrary value of None.
+        supplied, which must either be RETURN, LOOP_REPEAT, STOP or FREEZE. In
+        these cases the jump target is assigned an arbitrary value of None.
 
         :param ftarget: The associated value
         :param ftype: Either GOSUB, SIMPLE_JUMP, RETURN, LOOP_BEGIN,
-        LOOP_SKIP or STOP
+        LOOP_SKIP, STOP, FREEZE, RESOLVED_JUMP or RESOLVED_GOSUB
+        :param check: False to skip validation of the type and target,
+        for use by the parser at run time where both are already known
+        to be consistent
         """
 
-        if ftype not in [
-            self.GOSUB,
-            self.SIMPLE_JUMP,
-            self.LOOP_BEGIN,
-            self.LOOP_REPEAT,
-            self.RETURN,
-            self.LOOP_SKIP,
-            self.STOP,
-        ]:
-            raise TypeError("Invalid flow signal type supplied: " + str(ftype))
-
-        if ftarget == None and ftype in [self.SIMPLE_JUMP, self.GOSUB, self.LOOP_SKIP]:
-            raise TypeError(
-                "Invalid jump target supplied for flow signal type: " + str(ftarget)
-            )
-
-        if ftarget != None and ftype in [
-            self.RETURN,
-            self.LOOP_BEGIN,
-            self.LOOP_REPEAT,
-            self.STOP,
-        ]:
-            raise TypeError("Target wrongly supplied for flow signal " + str(ftype))
+        if check:
+            if ftype not in _FLOW_TYPES:
+                raise TypeError("Invalid flow signal type supplied: " + str(ftype))
+
+            if ftarget == None and ftype in _TARGET_REQUIRED:
+                raise TypeError(
+                    "Invalid jump target supplied for flow signal type: "
+                    + str(ftarget)
+                )
+
+            if ftarget != None and ftype in _TARGET_FORBIDDEN:
+                raise TypeError("Target wrongly supplied for flow signal " + str(ftype))
 
         self.ftype = ftype
         self.ftarget = ftarget
+
+
+# Signal types accepted by FlowSignal, and those which must
+# or must not be given a target. These are tuples so that
+# validating a signal does not build any temporary lists
+_FLOW_TYPES = (
+    FlowSignal.SIMPLE_JUMP,
+    FlowSignal.GOSUB,
+    FlowSignal.LOOP_BEGIN,
+    FlowSignal.LOOP_REPEAT,
+    FlowSignal.LOOP_SKIP,
+    FlowSignal.RETURN,
+    FlowSignal.STOP,
+    FlowSignal.FREEZE,
+    FlowSignal.RESOLVED_JUMP,
+    FlowSignal.RESOLVED_GOSUB,
+)
+_TARGET_REQUIRED = (
+    FlowSignal.SIMPLE_JUMP,
+    FlowSignal.GOSUB,
+    FlowSignal.LOOP_BEGIN,
+    FlowSignal.LOOP_SKIP,
+    FlowSignal.RESOLVED_JUMP,
+    FlowSignal.RESOLVED_GOSUB,
+)
+_TARGET_FORBIDDEN = (FlowSignal.RETURN, FlowSignal.STOP, FlowSignal.FREEZE)
+
+# Shared signals for statements which carry no target. The
+# Program only ever reads a FlowSignal, so these instances
+# are never modified and can be returned by every RETURN,
+# STOP, FREEZE and NEXT statement (without a loop variable) alike
+RETURN_SIGNAL = FlowSignal(ftype=FlowSignal.RETURN)
+STOP_SIGNAL = FlowSignal(ftype=FlowSignal.STOP)
+NEXT_SIGNAL = FlowSignal(ftype=FlowSignal.LOOP_REPEAT)
+FREEZE_SIGNAL = FlowSignal(ftype=FlowSignal.FREEZE)
+
+
+class LoopFrame:
+    """Holds the state of an active FOR loop. The frame is created
+    when the FOR statement is executed, with the end and step values
+    already evaluated, and is kept on the program's return stack
+    until the loop completes, so that each NEXT can step the loop
+    variable and test it without executing the FOR statement again.
+
+    >>> variables = {"I": 1}
+    >>> frame = LoopFrame("I", 2, 1, variables)
+    >>> frame.next()
+    True
+    >>> frame.next()
+    False
+    >>> print(variables["I"])
+    3
+    >>> values = [5, 1]
+    >>> frame = LoopFrame("I", 3, 2, values, 1)
+    >>> frame.next()
+    True
+    >>> print(values)
+    [5, 3]
+    """
+
+    __slots__ = ("variable", "end", "step", "symbol_table", "key", "body")
+
+    def __init__(self, variable, end, step, symbol_table, key=None):
+        """Creates the frame for a loop
+
+        :param variable: The name of the loop variable
+        :param end: The value the loop variable runs to
+        :param step: The amount added to the loop variable by each NEXT
+        :param symbol_table: The symbol table holding the loop variable
+        :param key: The key of the loop variable in the symbol table,
+        such as its slot when variables are held in slots, or None if
+        the key is the name of the variable
+        """
+        self.variable = variable
+        self.end = end
+        self.step = step
+        self.symbol_table = symbol_table
+        self.key = variable
+        if key != None:
+            self.key = key
+
+        # Number of the first statement of the loop body, counting
+        # every statement of the program in turn, filled in by the
+        # program when the loop is entered
+        self.body = None
+
+    def next(self):
+        """Steps the loop variable
+
+        :return: True if the loop body is to be repeated, False
+        if the loop variable has passed the end value
+        """
+        value = self.symbol_table[self.key] + self.step
+        self.symbol_table[self.key] = value
+
+        if self.step < 0:
+            return value >= self.end
+
+        return value <= self.end
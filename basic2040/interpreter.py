@@ -36,16 +36,23 @@ class Interpreter:
     lines
     """
 
-    def __init__(self, terminal=None, debug=False):
+    def __init__(self, terminal=None, debug=False, slots=False, codegen=False):
         """
         Terminal must be a compatible class, see term.py for reference
         implementation
 
         If debug is True, the main exception handler is bypassed so
         full tracebacks can propigate
+
+        If slots is True, programs hold their variables in slots
+        resolved as each statement is compiled, which is quicker
+        for programs spending most of their time in loops
+
+        If codegen is True, assignments and IF statements are
+        translated into Python and compiled, which is quicker again
+        but takes more memory, and needs a Python with compile()
         """
 
-        self.lexer = Lexer()
         if not terminal:
             from .term import SimpleTerm
 
@@ -55,9 +62,22 @@ class Interpreter:
 
         # Garbage collect
         collect()
-        self.program = Program(self._terminal)
+        self.slots = slots
+        self.codegen = codegen
+        self.program = Program(self._terminal, slots, codegen)
         self.debug = debug
 
+        # The lexer knows any keywords registered with the program
+        self.lexer = Lexer(self.program.keywords())
+
+        # Functions and statements implemented in Python, kept so
+        # that they can be registered again with a new program
+        self._natives = []
+
+        # Number of lines LIST shows before calling _list_page_break,
+        # or zero to list without pausing
+        self.list_page_size = 0
+
     def main(self):
         """
         Primary entry point for the interpretation
@@ -78,20 +98,157 @@ class Interpreter:
         Handles textual listing of a program to the screen.
         can be overwritten to implement pagination or other
         hardware or use case specific behavior
-        """
-        line_numbers = self.program.line_numbers()
-        if len(line_numbers) == 0:
-            return
 
+        Each line is written as soon as it is converted to text.
+        If list_page_size is set, _list_page_break is called after
+        each page, and the listing can be stopped with escape
+
+        >>> from .term import SimpleTerm
+        >>> class KeyTerm(SimpleTerm):
+        ...     keys = [13, ord("q")]
+        ...     def get_char(self):
+        ...         return self.keys.pop(0)
+        >>> interpreter = Interpreter(KeyTerm())
+        >>> for line_number in (10, 20, 30, 40, 50, 60, 70):
+        ...     interpreter.program.add_stmt(
+        ...         interpreter.lexer.tokenize(str(line_number) + " PRINT 1")
+        ...     )
+        >>> interpreter._list(20, 40)  # doctest: +NORMALIZE_WHITESPACE
+        20 PRINT 1
+        30 PRINT 1
+        40 PRINT 1
+        >>> interpreter.list_page_size = 2
+        >>> interpreter._list()  # doctest: +NORMALIZE_WHITESPACE
+        10 PRINT 1
+        20 PRINT 1
+        -- More --
+        30 PRINT 1
+        40 PRINT 1
+        -- More --
+        """
         if not start_line:
-            start_line = int(line_numbers[0])
+            start_line = None
 
         if not end_line:
-            end_line = int(line_numbers[-1])
+            end_line = None
+
+        count = 0
+        for line_text in self.program.list_statements(start_line, end_line):
+            # Pause only once there is another page to show
+            if self.list_page_size and count > 0:
+                if count % self.list_page_size == 0:
+                    if not self._list_page_break():
+                        break
+
+            self._terminal.print(line_text)
+            count = count + 1
+
+            if self._terminal.is_esc():
+                break
+
+    def _list_page_break(self):
+        """
+        Pauses a listing after each page of list_page_size lines
+        until a key is pressed. Can be overwritten to implement
+        a pause suited to the hardware, such as a button press
+
+        :return: False if the listing should stop, which it
+        does if escape or Q is pressed
+        """
+        self._terminal.write("-- More --")
+        key = self._terminal.get_char()
+        self._terminal.enter()
+
+        return key != 27 and key != ord("Q") and key != ord("q")
+
+    def register_function(self, name, function, types=""):
+        """
+        Adds a function implemented in Python to the language,
+        such as one reading a pin or sensor. See
+        Program.register_function for details
+
+        :param name: The name of the function, ending in $ if it
+        returns a string
+        :param function: The Python callable, passed the value of
+        each argument in turn
+        :param types: A string with a character for each argument,
+        N for a number or S for a string
+        """
+        self._natives.append((False, name, function, types))
+        self.program.register_function(name, function, types)
+
+    def register_statement(self, name, function, types=""):
+        """
+        Adds a statement implemented in Python to the language,
+        such as one setting a pin. See Program.register_statement
+        for details
+
+        :param name: The keyword of the statement
+        :param function: The Python callable, passed the value of
+        each argument in turn
+        :param types: A string with a character for each argument,
+        N for a number or S for a string
+        """
+        self._natives.append((True, name, function, types))
+        self.program.register_statement(name, function, types)
 
-        for line_number in line_numbers:
-            if int(line_number) >= start_line and int(line_number) <= end_line:
-                self._terminal.print(str(self.program.str_statement(line_number)))
+    def _register_natives(self):
+        """
+        Registers every function and statement implemented in
+        Python with the current program, after NEW replaces it
+        """
+        for statement, name, function, types in self._natives:
+            if statement:
+                self.program.register_statement(name, function, types)
+            else:
+                self.program.register_function(name, function, types)
+
+    def _warn(self):
+        """
+        Shows a warning for each problem found in the program
+        without running it, such as a GOTO to a line which does
+        not exist, so that it is known before the run starts
+        rather than only when the branch is taken
+        """
+        for message in self.program.diagnostics():
+            self._terminal.print("Warning: " + message)
+
+    def _vars(self):
+        """
+        Lists the variables left by the last run of the program,
+        with their values, followed by the bounds of each array.
+        A variable which was never assigned is not listed, even
+        when it has been given a slot, such as U below
+
+        >>> for slots in (False, True):
+        ...     interpreter = Interpreter(slots=slots)
+        ...     for line in (
+        ...         '10 LET A = 1 : B$ = "X" : DIM C(3, 4)',
+        ...         "20 GOTO 30 : LET U = 2",
+        ...         "30 STOP",
+        ...     ):
+        ...         interpreter.program.add_stmt(interpreter.lexer.tokenize(line))
+        ...     interpreter.program.execute()
+        ...     interpreter._vars()
+        A = 1
+        B$ = "X"
+        C(3,4)
+        A = 1
+        B$ = "X"
+        C(3,4)
+        """
+        variables = self.program.variables()
+        for name in sorted(variables):
+            value = variables[name]
+            if isinstance(value, str):
+                value = '"' + value + '"'
+
+            self._terminal.print(name + " = " + str(value))
+
+        arrays = self.program.arrays()
+        for name in sorted(arrays):
+            bounds = [str(size - 1) for size in arrays[name].sizes]
+            self._terminal.print(name + "(" + ",".join(bounds) + ")")
 
     def _interpreter(self, prompt="> "):
 
@@ -131,12 +288,31 @@ class Interpreter:
 
                     # Execute the program
                     elif tokenlist[0].category == Token.RUN:
+                        self._warn()
                         try:
                             self.program.execute()
 
                         except KeyboardInterrupt:
                             self._terminal.print("Program terminated")
 
+                    # Show the variables
+                    elif tokenlist[0].category == Token.VARS:
+                        self._vars()
+
+                    # Resume the program from its frozen image
+                    elif tokenlist[0].category == Token.THAW:
+                        if not self.program.has_frozen_image():
+                            self._terminal.print(
+                                "No frozen image, running from the start"
+                            )
+
+                        self._warn()
+                        try:
+                            self.program.execute(thaw=True)
+
+                        except KeyboardInterrupt:
+                            self._terminal.print("Program terminated")
+
                     # List the program
                     elif tokenlist[0].category == Token.LIST:
                         if len(tokenlist) == 2:
@@ -176,8 +352,11 @@ class Interpreter:
                         filepath = tokenlist[1].lexeme
                         if "/" not in filepath:
                             filepath = "BAS/" + filepath
-                        self.program.load(filepath)
-                        self._terminal.print("Program read from file")
+                        count, elapsed = self.program.load(filepath)
+                        self._terminal.print(
+                            "Program read from file (%d lines in %d ms)"
+                            % (count, elapsed * 1000)
+                        )
 
                     # Delete the program from memory
                     elif tokenlist[0].category == Token.NEW:
@@ -185,7 +364,11 @@ class Interpreter:
                         self.program = None
                         # Opportunity for GC here
                         collect()
-                        self.program = Program(self._terminal)
+                        self.program = Program(
+                            self._terminal, self.slots, self.codegen
+                        )
+                        self.lexer = Lexer(self.program.keywords())
+                        self._register_natives()
 
                     elif tokenlist[0].category == Token.CLEAR:
                         self._terminal.clear()
@@ -203,3 +386,9 @@ class Interpreter:
                     raise (e)
                 else:
                     self._terminal.print(str(e))
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
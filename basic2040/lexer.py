@@ -27,6 +27,8 @@ Column: 9 Category: NOTEQUAL Lexeme: <>
 >>> tokenlist = lexer.tokenize('100 LET I = 3.45')
 >>> tokenlist[4].pretty_print()
 Column: 12 Category: UNSIGNEDFLOAT Lexeme: 3.45
+>>> tokenlist[4].value
+3.45
 >>> tokenlist = lexer.tokenize('100 LET I = "HELLO"')
 >>> tokenlist[4].pretty_print()
 Column: 12 Category: STRING Lexeme: HELLO
@@ -36,16 +38,33 @@ from .basictoken import BASICToken as Token
 
 
 class Lexer:
-    def __init__(self):
+    def __init__(self, keywords=None):
+        """Creates a lexical analyser
+
+        :param keywords: A dictionary mapping any keywords added
+        to the language, such as the names of statements and
+        functions registered with a program, to their token
+        categories, or None if there are none
+
+        """
 
         self.__column = 0  # Current column number
         self.__stmt = ""  # Statement string being processed
 
+        # Keywords added to the language, looked up for any
+        # lexeme that is not a built in keyword
+        self.__keywords = keywords
+
     def tokenize(self, stmt):
         """Returns a list of tokens obtained by
         lexical analysis of the specified
         statement.
 
+        The statement is scanned by index, and each
+        lexeme is taken as a single slice of the
+        statement once its extent is known, rather
+        than being built up a character at a time.
+
         """
         self.__stmt = stmt
         self.__column = 0
@@ -54,141 +73,126 @@ class Lexer:
         # derived from the statement
         tokenlist = []
 
+        length = len(stmt)
+        smalltokens = Token.smalltokens
+        keywords = Token.keywords
+        added = self.__keywords
+
         # Process every character until we
         # reach the end of the statement string
-        c = self.__get_next_char()
-        while c != "":
+        column = 0
+        while column < length:
+            c = stmt[column]
 
             # Skip any preceding whitespace
-            while c.isspace():
-                c = self.__get_next_char()
+            if c.isspace():
+                column = column + 1
+
+                # Whitespace at the very end of the statement
+                # has always produced an empty, uncategorised
+                # token, which the parser relies upon (PRINT
+                # treats it as suppressing the newline)
+                if column == length:
+                    tokenlist.append(Token(column - 1, None, ""))
+
+                continue
 
-            # Construct a token, column count already
-            # incremented
-            token = Token(self.__column - 1, None, "")
+            # Start of the token
+            start = column
 
             # Process strings
             if c == '"':
-                token.category = Token.STRING
-
                 # Consume all of the characters
                 # until we reach the terminating
                 # quote. Do not store the quotes
-                # in the lexeme
-                c = self.__get_next_char()  # Advance past opening quote
-
-                # We explicitly support empty strings
-                if c == '"':
-                    # String is empty, leave lexeme as ''
-                    # and advance past terminating quote
-                    c = self.__get_next_char()
-
-                else:
-                    while True:
-                        token.lexeme += c  # Append the current char to the lexeme
-                        c = self.__get_next_char()
+                # in the lexeme. We explicitly
+                # support empty strings
+                end = stmt.find('"', start + 1)
+                if end == -1:
+                    raise SyntaxError("Mismatched quotes")
 
-                        if c == "":
-                            raise SyntaxError("Mismatched quotes")
-
-                        if c == '"':
-                            c = self.__get_next_char()  # Advance past terminating quote
-                            break
+                token = Token(start, Token.STRING, stmt[start + 1 : end])
+                column = end + 1  # Advance past terminating quote
 
             # Process numbers
             elif c.isdigit():
-                token.category = Token.UNSIGNEDINT
-                found_point = False
-
-                # Consume all of the digits, including any decimal point
-                while True:
-                    token.lexeme += c  # Append the current char to the lexeme
-                    c = self.__get_next_char()
+                category = Token.UNSIGNEDINT
 
-                    # Break if next character is not a digit
-                    # and this is not the first decimal point
+                # Consume all of the digits, including
+                # the first decimal point
+                column = column + 1
+                while column < length:
+                    c = stmt[column]
                     if not c.isdigit():
-                        if c == ".":
-                            if not found_point:
-                                found_point = True
-                                token.category = Token.UNSIGNEDFLOAT
-
-                            else:
-                                # Another decimal point found
-                                break
+                        if c == "." and category == Token.UNSIGNEDINT:
+                            category = Token.UNSIGNEDFLOAT
 
                         else:
                             break
 
+                    column = column + 1
+
+                # Convert the number once here, so that neither the
+                # parser nor the DATA reader has to do so again
+                lexeme = stmt[start:column]
+                if category == Token.UNSIGNEDFLOAT:
+                    token = Token(start, category, lexeme, float(lexeme))
+
+                else:
+                    token = Token(start, category, lexeme, int(lexeme))
+
             # Process keywords and names
             elif c.isalpha():
-                # Consume all of the letters
-                while True:
-                    token.lexeme += c  # append the current char to the lexeme
-                    c = self.__get_next_char()
-
-                    # Break if not a letter or a dollar symbol
-                    # (the latter is used for string variable names)
-                    if not ((c.isalpha() or c.isdigit()) or c == "_" or c == "$"):
+                # Consume all of the letters, digits, underscores
+                # and dollar symbols (the latter is used for string
+                # variable names)
+                column = column + 1
+                while column < length:
+                    c = stmt[column]
+                    if not (c.isalpha() or c.isdigit() or c == "_" or c == "$"):
                         break
 
+                    column = column + 1
+
                 # Normalise keywords and names to upper case
-                token.lexeme = token.lexeme.upper()
+                lexeme = stmt[start:column].upper()
 
                 # Determine if the lexeme is a variable name or a
                 # reserved word
-                if token.lexeme in Token.keywords:
-                    token.category = Token.keywords[token.lexeme]
-
-                else:
-                    token.category = Token.NAME
+                category = keywords.get(lexeme, Token.NAME)
+                if category == Token.NAME and added:
+                    category = added.get(lexeme, Token.NAME)
 
                 # Remark Statments - process rest of statement without checks
-                if token.lexeme == "REM":
-                    while c != "":
-                        token.lexeme += c  # Append the current char to the lexeme
-                        c = self.__get_next_char()
+                if lexeme == "REM":
+                    lexeme = lexeme + stmt[column:]
+                    column = length
+
+                token = Token(start, category, lexeme)
 
             # Process operator symbols
-            elif c in Token.smalltokens:
-                save = c
-                c = self.__get_next_char()  # c might be '' (end of stmt)
-                twochar = save + c
+            elif c in smalltokens:
+                twochar = stmt[start : start + 2]
 
-                if twochar in Token.smalltokens:
-                    token.category = Token.smalltokens[twochar]
-                    token.lexeme = twochar
-                    c = self.__get_next_char()  # Move past end of token
+                if len(twochar) == 2 and twochar in smalltokens:
+                    token = Token(start, smalltokens[twochar], twochar)
+                    column = column + 2
 
                 else:
                     # One char token
-                    token.category = Token.smalltokens[save]
-                    token.lexeme = save
+                    token = Token(start, smalltokens[c], c)
+                    column = column + 1
 
             # We do not recognise this token
-            elif c != "":
+            else:
                 raise SyntaxError("Syntax error")
 
             # Append the new token to the list
             tokenlist.append(token)
 
-        return tokenlist
-
-    def __get_next_char(self):
-        """Returns the next character in the
-        statement, unless the last character has already
-        been processed, in which case, the empty string is
-        returned.
+        self.__column = column
 
-        """
-        if self.__column < len(self.__stmt):
-            next_char = self.__stmt[self.__column]
-            self.__column = self.__column + 1
-
-            return next_char
-
-        else:
-            return ""
+        return tokenlist
 
 
 if __name__ == "__main__":
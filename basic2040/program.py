@@ -20,9 +20,175 @@ line number.
 """
 
 from .basictoken import BASICToken as Token
-from .basicparser import BASICParser
-from .flowsignal import FlowSignal
+from .basicparser import BASICParser, native_parse, split_statements
+from .flowsignal import FlowSignal, LoopFrame
 from .lexer import Lexer
+from .tokenfile import read_tokens, source_stamp, write_tokens
+from array import array
+from binascii import crc32
+from json import dumps, loads
+from os import stat
+from time import monotonic
+
+try:
+    from bisect import bisect_left, bisect_right
+
+except ImportError:
+    # Not every MicroPython port provides bisect
+
+    def bisect_left(values, value):
+        """Returns the position at which to insert the value
+        into the sorted list, before any equal values"""
+        low = 0
+        high = len(values)
+        while low < high:
+            middle = (low + high) // 2
+            if values[middle] < value:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def bisect_right(values, value):
+        """Returns the position at which to insert the value
+        into the sorted list, after any equal values"""
+        low = 0
+        high = len(values)
+        while low < high:
+            middle = (low + high) // 2
+            if value < values[middle]:
+                high = middle
+            else:
+                low = middle + 1
+
+        return low
+
+
+# Extension of programs saved in tokenized form, either explicitly
+# or as the cache kept alongside a program's text
+TOKENIZED_EXTENSION = ".tok"
+
+# Extension of the frozen image kept alongside a program
+# file, and the version of the image's layout
+FROZEN_EXTENSION = ".frz"
+FROZEN_VERSION = 4
+
+# Categories of the statements which may branch, and so end
+# a basic block
+_BRANCHES = (
+    Token.GOTO,
+    Token.GOSUB,
+    Token.IF,
+    Token.ON,
+    Token.OPEN,
+    Token.RETURN,
+    Token.FOR,
+    Token.NEXT,
+    Token.STOP,
+    Token.FREEZE,
+)
+
+# Signal returned in place of a statement which has not yet
+# been compiled, asking the executor to compile its line
+_COMPILE_SIGNAL = FlowSignal(None, -1, False)
+
+
+def _uncompiled():
+    """Stands in for each statement of a line which has
+    not yet been compiled"""
+    return _COMPILE_SIGNAL
+
+
+def _literal_target(tokens):
+    """Returns the line number a branch target names, if it
+    is given as a literal rather than computed
+
+    :param tokens: The tokens of the target, which may start
+    with an optional GOTO
+
+    :return: The line number, or None if it is computed
+
+    >>> from .lexer import Lexer
+    >>> _literal_target(Lexer().tokenize('10 GOTO 100 ')[2:])
+    100
+    >>> print(_literal_target(Lexer().tokenize('10 GOTO 100 + X')[2:]))
+    None
+    """
+    # Ignore tokens without a category, such as the empty
+    # token following a line typed with trailing whitespace
+    tokens = [token for token in tokens if token.category != None]
+
+    if len(tokens) > 0 and tokens[0].category == Token.GOTO:
+        tokens = tokens[1:]
+
+    if len(tokens) == 1 and tokens[0].category == Token.UNSIGNEDINT:
+        return tokens[0].value
+
+    return None
+
+
+def _branch_targets(statement):
+    """Finds the line numbers a statement may branch to which
+    are given as literals, such as the target of GOTO 100 or
+    each of the targets of ON X GOSUB 100, 200. Computed
+    targets, such as GOTO 100 + X, can only be found at run time.
+
+    :param statement: The tokens of the statement
+
+    :return: A list of the line numbers
+    """
+    category = statement[0].category
+    groups = []
+
+    if category == Token.GOTO or category == Token.GOSUB:
+        groups.append(statement[1:])
+
+    elif category == Token.IF or category == Token.OPEN:
+        # Targets follow THEN and ELSE, and run to the
+        # next of these or the end of the statement
+        start = None
+        for position in range(len(statement)):
+            if statement[position].category in (Token.THEN, Token.ELSE):
+                if start != None:
+                    groups.append(statement[start:position])
+
+                start = position + 1
+
+        if start != None:
+            groups.append(statement[start:])
+
+    elif category == Token.ON:
+        # Targets follow the GOTO or GOSUB, separated by commas
+        # outside of any brackets
+        start = None
+        depth = 0
+        for position in range(len(statement)):
+            token_category = statement[position].category
+            if start == None:
+                if token_category == Token.GOTO or token_category == Token.GOSUB:
+                    start = position + 1
+
+            elif token_category == Token.LEFTPAREN:
+                depth = depth + 1
+
+            elif token_category == Token.RIGHTPAREN:
+                depth = depth - 1
+
+            elif token_category == Token.COMMA and depth == 0:
+                groups.append(statement[start:position])
+                start = position + 1
+
+        if start != None:
+            groups.append(statement[start:])
+
+    targets = []
+    for group in groups:
+        target = _literal_target(group)
+        if target != None:
+            targets.append(target)
+
+    return targets
 
 
 class BASICData:
@@ -30,16 +196,26 @@ class BASICData:
         # array of line numbers to represent data statements
         self.__datastmts = {}
 
-        # Data pointer
+        # Values of every DATA statement, in line number order,
+        # with a dictionary mapping the line number of each DATA
+        # statement to the position of its first value. These
+        # are rebuilt on the next READ or RESTORE after the DATA
+        # statements have been changed
+        self.__values = None
+        self.__starts = None
+
+        # Data pointer, the position of the next value to be read
         self.__next_data = 0
 
     def delete(self):
         self.__datastmts.clear()
+        self.__values = None
         self.__next_data = 0
 
     def delData(self, line_number):
         if self.__datastmts.get(line_number) != None:
             del self.__datastmts[line_number]
+            self.__values = None
 
     def addData(self, line_number, tokenlist):
         """
@@ -54,6 +230,7 @@ class BASICData:
 
         try:
             self.__datastmts[line_number] = tokenlist
+            self.__values = None
 
         except TypeError as err:
             raise TypeError("Invalid line number: " + str(err))
@@ -68,69 +245,91 @@ class BASICData:
 
         return self.__datastmts.get(line_number)
 
-    def readData(self, read_line_number):
+    def __index_values(self):
+        """
+        Gathers the values of every DATA statement into a
+        single list in line number order, recording where the
+        values of each statement start, if the DATA statements
+        have changed since this was last done
 
-        if len(self.__datastmts) == 0:
-            raise RuntimeError(
-                "No DATA statements available to READ "
-                + "in line "
-                + str(read_line_number)
-            )
+        """
+        if self.__values != None:
+            return
 
-        data_values = []
+        self.__values = []
+        self.__starts = {}
 
         line_numbers = list(self.__datastmts.keys())
         line_numbers.sort()
 
-        if self.__next_data == 0:
-            self.__next_data = line_numbers[0]
-        elif line_numbers.index(self.__next_data) < len(line_numbers) - 1:
-            self.__next_data = line_numbers[line_numbers.index(self.__next_data) + 1]
-        else:
+        for line_number in line_numbers:
+            self.__starts[line_number] = len(self.__values)
+
+            sign = 1
+            for token in self.__datastmts[line_number][1:]:
+                if token.category != Token.COMMA:
+                    if token.category == Token.STRING:
+                        self.__values.append(token.lexeme)
+                    elif (
+                        token.category == Token.UNSIGNEDINT
+                        or token.category == Token.UNSIGNEDFLOAT
+                    ):
+                        self.__values.append(sign * token.value)
+                    elif token.category == Token.MINUS:
+                        sign = -1
+                else:
+                    sign = 1
+
+    def readValue(self, read_line_number):
+        """
+        Returns the next value from the program's DATA
+        statements, and advances past it
+
+        read_line_number: Basic program line number of the READ
+
+        """
+        self.__index_values()
+
+        if self.__next_data >= len(self.__values):
             raise RuntimeError(
                 "No DATA statements available to READ "
                 + "in line "
                 + str(read_line_number)
             )
 
-        tokenlist = self.__datastmts[self.__next_data]
-
-        sign = 1
-        for token in tokenlist[1:]:
-            if token.category != Token.COMMA:
-                # data_values.append(token.lexeme)
-
-                if token.category == Token.STRING:
-                    data_values.append(token.lexeme)
-                elif token.category == Token.UNSIGNEDINT:
-                    data_values.append(sign * int(token.lexeme))
-                elif token.category == Token.UNSIGNEDFLOAT:
-                    data_values.append(sign * eval(token.lexeme))
-                elif token.category == Token.MINUS:
-                    sign = -1
-                # else:
-                # data_values.append(token.lexeme)
-            else:
-                sign = 1
+        value = self.__values[self.__next_data]
+        self.__next_data = self.__next_data + 1
 
-        return data_values
+        return value
 
-    def restore(self, restoreLineNo):
-        if restoreLineNo == 0 or restoreLineNo in self.__datastmts:
+    def getPointer(self):
+        """
+        Returns the position of the next value to be read,
+        counting from the first value of the first DATA statement
 
-            if restoreLineNo == 0:
-                self.__next_data = restoreLineNo
-            else:
+        """
+        return self.__next_data
+
+    def setPointer(self, pointer):
+        """
+        Sets the position of the next value to be read, as
+        returned by getPointer()
 
-                line_numbers = list(self.__datastmts.keys())
-                line_numbers.sort()
+        pointer: The position of the value
 
-                indexln = line_numbers.index(restoreLineNo)
+        """
+        self.__index_values()
+        self.__next_data = pointer
+
+    def restore(self, restoreLineNo):
+        self.__index_values()
+
+        if restoreLineNo == 0:
+            self.__next_data = 0
+
+        elif restoreLineNo in self.__starts:
+            self.__next_data = self.__starts[restoreLineNo]
 
-                if indexln == 0:
-                    self.__next_data = 0
-                else:
-                    self.__next_data = line_numbers[indexln - 1]
         else:
             raise RuntimeError(
                 "Attempt to RESTORE but no DATA "
@@ -140,84 +339,372 @@ class BASICData:
 
 
 class Program:
-    def __init__(self, terminal):
+    def __init__(self, terminal, slots=False, codegen=False):
+        """Initialises an empty program
+
+        :param terminal: The terminal used for input and output
+        :param slots: True to hold the program's variables in slots
+        resolved when each statement is compiled, rather than looking
+        each one up by name as it is used
+        :param codegen: True to translate statements into Python
+        source compiled with compile(), which runs faster but takes
+        more memory, and is not available on every port of MicroPython
+
+        """
         # Dictionary to represent program
-        # statements, keyed by line number
+        # statements, keyed by line number. Each line is
+        # held already split into its colon separated
+        # statements, as a tuple of token tuples
         self.__program = {}
 
-        # Program counter
+        # Dictionary of compiled statements, keyed by line
+        # number, each a tuple of closures for the statements
+        # of the line. Statements are compiled the first time
+        # they are executed and discarded when the line is edited
+        self.__compiled = {}
+
+        # Sorted list of line numbers, kept in order as lines
+        # are added and deleted
+        self.__sorted_lines = []
+
+        # The control flow graph of the program. Every statement
+        # of the program is numbered in turn, in line number order,
+        # and the executor counts through these numbers rather than
+        # through lines. Since the numbers shift as lines are added
+        # and deleted, the graph is rebuilt on the next run after
+        # the program has been edited.
+        #
+        # The line index is a dictionary mapping each line number
+        # to the number of its first statement, used to resolve
+        # branch targets
+        self.__line_index = None
+
+        # List of the compiled statements in number order, holding
+        # a placeholder for each statement of a line not yet compiled
+        self.__code = None
+
+        # Array holding, for each statement, the position of its
+        # line in the sorted list of line numbers
+        self.__statement_lines = None
+
+        # Array holding, for each statement, the number of the
+        # statement ending its basic block. A block is a run of
+        # statements which is only ever entered at its first
+        # statement and only ever branches at its last, so the
+        # executor runs its statements back to back
+        self.__block_ends = None
+
+        # List of messages describing branches to lines which
+        # do not exist, found as the graph is built
+        self.__diagnostics = None
+
+        # Dictionary mapping each FOR statement, keyed by its
+        # number and its loop variable, to the number of the
+        # statement following its matching NEXT
+        self.__loop_exits = None
+
+        # Dictionary of the FlowSignals returned by branches to
+        # lines given as literals, keyed by the line number and the
+        # type of branch, SIMPLE_JUMP or GOSUB. Every such branch to
+        # the same line shares a signal, which is resolved to the
+        # number of the line's first statement as the graph is built
+        self.__branches = {}
+
+        # Program counter, the line number of the next statement to
+        # be executed. During a run this is found on demand from the
+        # number of the statement being executed, which is None
+        # outside of a run
         self.__next_stmt = 0
+        self.__number = None
 
         # Initialise return stack for subroutine returns
-        # and loop returns
+        # and loop returns. Subroutine calls push the number
+        # of the statement to return to, loops push their
+        # LoopFrame
         self.__return_stack = []
         self.__terminal = terminal
 
         # Setup DATA object
         self.__data = BASICData()
 
-    def __str__(self):
-
-        program_text = ""
-        line_numbers = self.line_numbers()
+        # The parser is kept for the life of the program, as the
+        # compiled statements are bound to its symbol table
+        self.__parser = BASICParser(self.__data, self.__terminal, slots)
+        self.__parser.set_branch_resolver(self.__branch_signal)
+
+        # Dictionary mapping the keywords added to the language by
+        # registering statements and functions with this program to
+        # their token categories, used by the program's lexers
+        self.__keywords = {}
+
+        # Translates statements into Python, if asked for. The
+        # module is only imported when used, to save memory
+        self.__generator = None
+        if codegen:
+            from .codegen import CodeGenerator
+
+            self.__generator = CodeGenerator(self.__parser)
+
+        # The file the program was loaded from, alongside which
+        # its frozen image is kept, and the image made by the last
+        # FREEZE statement executed
+        self.__file = None
+        self.__image = None
+
+        # Whether the image has been made since it was last written
+        # to the file system, and the text last written, so that a
+        # FREEZE within a loop or a run making the same image again
+        # does not keep rewriting the file
+        self.__image_changed = False
+        self.__image_text = None
 
-        for line_number in line_numbers:
-            program_text += self.str_statement(line_number) + "\n"
+    def __str__(self):
 
-        return program_text
+        return "".join([line_text + "\n" for line_text in self.list_statements()])
 
     def str_statement(self, line_number):
-        line_text = str(line_number) + " "
+        parts = [str(line_number)]
 
-        statement = self.__program[line_number]
-        if statement[0].category == Token.DATA:
-            statement = self.__data.getTokens(line_number)
-        for token in statement:
+        for token in self.__tokens(line_number):
             # Add in quotes for strings
             if token.category == Token.STRING:
-                line_text += '"' + token.lexeme + '" '
+                parts.append('"' + token.lexeme + '"')
 
             else:
-                line_text += token.lexeme + " "
-        return line_text
+                parts.append(token.lexeme)
+
+        parts.append("")
+        return " ".join(parts)
+
+    def list_statements(self, start_line=None, end_line=None):
+        """Generates the text of each statement in the program,
+        in line number order, optionally limited to a range. The
+        first line in the range is found by bisecting the sorted
+        line numbers, and each statement is only converted to text
+        as it is requested, so that a listing can be written out
+        as it goes rather than built up in full first
+
+        :param start_line: The lowest line number to
+        include, or None to start at the first line
+        :param end_line: The highest line number to
+        include, or None to finish at the last line
+
+        :return: A generator of statement text, without line endings
+
+        >>> from .lexer import Lexer
+        >>> from .term import SimpleTerm
+        >>> lexer = Lexer()
+        >>> program = Program(SimpleTerm())
+        >>> for line_number in (10, 20, 30, 40):
+        ...     program.add_stmt(lexer.tokenize(str(line_number) + ' PRINT 1'))
+        >>> list(program.list_statements(15, 30))
+        ['20 PRINT 1 ', '30 PRINT 1 ']
+        >>> list(program.list_statements(None, 10))
+        ['10 PRINT 1 ']
+        >>> list(program.list_statements(40))
+        ['40 PRINT 1 ']
+        >>> list(program.list_statements(50))
+        []
+        """
+        lines = self.__sorted_lines
+
+        position = 0
+        if start_line != None:
+            position = bisect_left(lines, start_line)
+
+        end = len(lines)
+        if end_line != None:
+            end = bisect_right(lines, end_line)
+
+        while position < end:
+            yield self.str_statement(lines[position])
+            position = position + 1
 
     def save(self, file):
-        """Save the program
+        """Save the program. If the file name ends in .tok the
+        program is saved in tokenized form, otherwise it is saved
+        as text
 
         :param file: The name and path of the save file, .bas is
-                     appended
+                     appended unless saving in tokenized form
 
         """
+        if file.lower().endswith(TOKENIZED_EXTENSION):
+            data = write_tokens(self.__tokenlists())
+            try:
+                with open(file, "wb") as outfile:
+                    outfile.write(data)
+            except OSError:
+                raise OSError("Could not save to file")
+
+            return
+
         if not file.lower().endswith(".bas"):
             file += ".bas"
         try:
             with open(file, "w") as outfile:
-                outfile.write(str(self))
+                for line_text in self.list_statements():
+                    outfile.write(line_text + "\n")
         except OSError:
             raise OSError("Could not save to file")
 
     def load(self, file):
-        """Load the program
+        """Load the program. The statements are stored directly,
+        with the line index built once at the end, rather than
+        adding and invalidating one statement at a time.
+
+        A file whose name ends in .tok is read in tokenized form.
+        Otherwise the text is read, and the tokenized cache kept
+        alongside it is used if its CRC32 shows it was made from
+        the text as it is now. If not, the whole text is tokenized
+        in a single pass, ignoring blank lines, and the cache is
+        written afresh where the file system allows.
 
         :param file: The name and path of the file to be loaded, .bas is
-                     appended
+                     appended unless loading the tokenized form
+
+        :return: A tuple of the number of lines loaded and the time
+        taken to load them, in seconds
 
         """
 
         # New out the program
         self.delete()
-        if not file.lower().endswith(".bas"):
-            file += ".bas"
+        start = monotonic()
+
+        if file.lower().endswith(TOKENIZED_EXTENSION):
+            tokenlists = self.__read_tokenized(file, None)
+            if tokenlists == None:
+                raise OSError("Could not read file")
+
+        else:
+            if not file.lower().endswith(".bas"):
+                file += ".bas"
+
+            try:
+                with open(file, "rb") as infile:
+                    source = infile.read()
+
+            except OSError:
+                raise OSError("Could not read file")
+
+            # The cache must have been made from exactly this text,
+            # which a modification time, kept only to the second,
+            # cannot tell for a file edited again within the second
+            stamp = (len(source), crc32(source))
+            cache = file[:-4] + TOKENIZED_EXTENSION
+            tokenlists = self.__read_tokenized(cache, stamp)
+
+            if tokenlists == None:
+                tokenlists = self.__tokenize_text(str(source, "utf-8"))
+
+                try:
+                    with open(cache, "wb") as outfile:
+                        outfile.write(write_tokens(tokenlists, stamp[0], stamp[1]))
+
+                except OSError:
+                    # The cache is only an optimisation, and the
+                    # file system may well be read only
+                    pass
+
+        for tokenlist in tokenlists:
+            self.__store_stmt(tokenlist)
+
+        count = len(tokenlists)
+
+        # Free the token lists before building the index
+        tokenlists = None
+        self.__index_lines()
+        self.__file = file
+
+        return count, monotonic() - start
+
+    def __tokenize_text(self, text):
+        """Tokenizes the text of a program, the whole
+        text in a single pass
+
+        :param text: The text of the program
+
+        :return: A list of token lists, one for each line
+
+        """
+        lexer = Lexer(self.__keywords)
+        tokenlists = []
+        for line in text.replace("\r", "").split("\n"):
+            line = line.strip()
+            if line != "":
+                tokenlists.append(lexer.tokenize(line))
+
+        return tokenlists
+
+    def __read_tokenized(self, file, stamp):
+        """Reads a program in tokenized form
+
+        :param file: The name and path of the file to be read
+        :param stamp: The size and CRC32 of the text the tokens
+        must have been made from, or None to accept any
+        tokenized program
+
+        :return: A list of token lists, one for each line, or None
+        if the file cannot be read or does not match the stamp
+
+        """
         try:
-            lexer = Lexer()
-            with open(file, "r") as infile:
-                for line in infile:
-                    line = line.replace("\r", "").replace("\n", "").strip()
-                    tokenlist = lexer.tokenize(line)
-                    self.add_stmt(tokenlist)
+            with open(file, "rb") as infile:
+                data = infile.read()
 
         except OSError:
-            raise OSError("Could not read file")
+            return None
+
+        found = source_stamp(data)
+        if found == None or (stamp != None and found != stamp):
+            return None
+
+        return read_tokens(data, self.__keywords)
+
+    def __tokenlists(self):
+        """Returns the token lists of the program in line
+        number order, each starting with its line number, as
+        they would be read back from the program text
+
+        :return: A list of token lists
+
+        """
+        tokenlists = []
+        for line_number in self.line_numbers():
+            tokenlists.append(
+                [Token(0, Token.UNSIGNEDINT, str(line_number), line_number)]
+                + self.__tokens(line_number)
+            )
+
+        return tokenlists
+
+    def __tokens(self, line_number):
+        """Returns the tokens of a line, joining its statements
+        back together with colons
+
+        :param line_number: The line number
+
+        :return: A list of the tokens of the line, without
+        its line number
+
+        """
+        statements = self.__program[line_number]
+        if len(statements[0]) > 0 and statements[0][0].category == Token.DATA:
+            return self.__data.getTokens(line_number)
+
+        tokens = list(statements[0])
+        for statement in statements[1:]:
+            # Place the colon just before the statement it
+            # separates, as the lexer would have found it
+            column = 0
+            if len(statement) > 0:
+                column = max(statement[0].column - 2, 0)
+
+            tokens.append(Token(column, Token.COLON, ":"))
+            tokens.extend(statement)
+
+        return tokens
 
     def add_stmt(self, tokenlist):
         """
@@ -230,231 +717,798 @@ class Program:
         :param tokenlist: List of BTokens representing a
         numbered program statement
 
+        """
+        line_number = self.__store_stmt(tokenlist)
+        self.__compiled.pop(line_number, None)
+        self.__line_index = None
+
+    def __store_stmt(self, tokenlist):
+        """Stores the supplied token list in the program,
+        without invalidating any compiled statements or the
+        line index
+
+        :param tokenlist: List of BTokens representing a
+        numbered program statement
+
+        :return: The line number of the statement
+
         """
         try:
             line_number = int(tokenlist[0].lexeme)
+            is_new = line_number not in self.__program
             if tokenlist[1].lexeme == "DATA":
                 self.__data.addData(line_number, tokenlist[1:])
-                self.__program[line_number] = [
-                    tokenlist[1],
-                ]
+                self.__program[line_number] = ((tokenlist[1],),)
             else:
-                self.__program[line_number] = tokenlist[1:]
+                self.__program[line_number] = split_statements(tokenlist[1:])
+
+            if is_new:
+                lines = self.__sorted_lines
+                lines.insert(bisect_left(lines, line_number), line_number)
+
+            return line_number
 
         except TypeError as err:
             raise TypeError("Invalid line number: " + str(err))
 
-    def line_numbers(self):
-        """Returns a list of all the
-        line numbers for the program,
-        sorted
+    def line_numbers(self, start_line=None, end_line=None):
+        """Returns a list of the line numbers
+        for the program, sorted, optionally
+        limited to a range. Only the line
+        numbers within the range are copied
+
+        :param start_line: The lowest line number to
+        include, or None to start at the first line
+        :param end_line: The highest line number to
+        include, or None to finish at the last line
 
         :return: A sorted list of
         program line numbers
         """
-        line_numbers = list(self.__program.keys())
-        line_numbers.sort()
+        lines = self.__sorted_lines
+
+        start = 0
+        if start_line != None:
+            start = bisect_left(lines, start_line)
+
+        end = len(lines)
+        if end_line != None:
+            end = bisect_right(lines, end_line)
+
+        return lines[start:end]
+
+    def __index_lines(self):
+        """Builds the control flow graph of the program, if the
+        program has changed since it was last built. Every
+        statement is numbered, the statements already compiled
+        are gathered in number order, and the program is divided
+        into basic blocks.
+
+        """
+        if self.__line_index != None:
+            return
+
+        line_index = {}
+        code = []
+        statement_lines = array("i")
+
+        lines = self.__sorted_lines
+        for position in range(len(lines)):
+            line_number = lines[position]
+            line_index[line_number] = len(code)
+
+            count = len(self.__program[line_number])
+            compiled = self.__compiled.get(line_number)
+            if compiled == None:
+                compiled = (_uncompiled,) * count
+
+            code.extend(compiled)
+            for statement in range(count):
+                statement_lines.append(position)
+
+        self.__line_index = line_index
+        self.__code = code
+        self.__statement_lines = statement_lines
+
+        self.__find_blocks()
+        self.__pair_loops()
 
-        return line_numbers
+        for key in self.__branches:
+            self.__resolve(key)
 
-    def __execute(self, line_number):
-        """Execute the statement with the
-        specified line number
+    def __branch_signal(self, line_number, ftype):
+        """Returns the FlowSignal for a branch to a line given as
+        a literal, shared by every branch of the same type to the
+        same line
+
+        :param line_number: The line number branched to
+        :param ftype: The type of the branch, SIMPLE_JUMP or GOSUB
+
+        :return: The FlowSignal
+
+        """
+        key = (line_number, ftype)
+        if key not in self.__branches:
+            self.__branches[key] = FlowSignal(line_number, ftype, False)
+
+            if self.__line_index != None:
+                self.__resolve(key)
+
+        return self.__branches[key]
+
+    def __resolve(self, key):
+        """Resolves the shared signal for a branch to a line given
+        as a literal to the number of the line's first statement, so
+        that the executor need not look the line up. A branch to a
+        line which does not exist is left to fail as it is taken.
+
+        :param key: The key of the signal, a tuple of the line
+        number and the type of the branch
+
+        """
+        line_number, ftype = key
+        signal = self.__branches[key]
+        number = self.__line_index.get(line_number)
+
+        if number == None:
+            signal.ftype = ftype
+            signal.ftarget = line_number
+
+        elif ftype == FlowSignal.GOSUB:
+            signal.ftype = FlowSignal.RESOLVED_GOSUB
+            signal.ftarget = number
+
+        else:
+            signal.ftype = FlowSignal.RESOLVED_JUMP
+            signal.ftarget = number
+
+    def __find_blocks(self):
+        """Divides the program into basic blocks. A block starts
+        at the first statement of the program, at the first
+        statement of each line named as a branch target, and after
+        each statement which may branch, such as GOTO, IF, FOR
+        and NEXT. Branches to lines which do not exist are
+        noted as they are found.
+
+        Computed branch targets, such as GOTO 100 + X, may enter a
+        block part way through. The executor then runs the rest of
+        the block as usual, so the blocks only need to be found
+        for the branches which are written as line numbers.
+
+        """
+        line_index = self.__line_index
+        count = len(self.__code)
+        self.__diagnostics = []
+
+        # One flag for each statement, and one for the end of
+        # the program, set if a block starts there
+        starts = bytearray(count + 1)
+        starts[0] = 1
+        starts[count] = 1
+
+        number = 0
+        for line_number in self.__sorted_lines:
+            for statement in self.__program[line_number]:
+                number = number + 1
+                if len(statement) == 0 or statement[0].category not in _BRANCHES:
+                    continue
+
+                # The statement after one which may branch starts
+                # a block, as does the first statement of each target
+                starts[number] = 1
+
+                for target in _branch_targets(statement):
+                    if target in line_index:
+                        starts[line_index[target]] = 1
+
+                    else:
+                        self.__diagnostics.append(
+                            statement[0].lexeme
+                            + " to missing line "
+                            + str(target)
+                            + " in line "
+                            + str(line_number)
+                        )
+
+        # Work back from the end of the program, so that each
+        # statement takes the end of the block it is in
+        ends = [count] * count
+        end = count
+        for number in range(count - 1, -1, -1):
+            if starts[number + 1]:
+                end = number + 1
+
+            ends[number] = end
+
+        self.__block_ends = array("i", ends)
+
+    def basic_blocks(self):
+        """Returns the basic blocks of the program, the runs of
+        statements which the executor runs back to back
+
+        :return: A list of tuples of the line numbers of the
+        first and last statements of each block
+        """
+        self.__index_lines()
+        lines = self.__sorted_lines
+        statement_lines = self.__statement_lines
+
+        blocks = []
+        number = 0
+        while number < len(self.__code):
+            end = self.__block_ends[number]
+            blocks.append(
+                (lines[statement_lines[number]], lines[statement_lines[end - 1]])
+            )
+            number = end
+
+        return blocks
+
+    def diagnostics(self):
+        """Checks the program for problems which can be found
+        without running it, such as a GOTO to a line which does
+        not exist
+
+        :return: A list of messages, one for each problem found
+        """
+        self.__index_lines()
+
+        return list(self.__diagnostics)
+
+    def __pair_loops(self):
+        """Pairs each FOR statement with the NEXT statement that
+        ends its loop, so that a loop which is not entered can be
+        skipped without searching for its NEXT.
+
+        A NEXT naming a variable ends every open loop on that
+        variable. A NEXT without a variable ends the innermost
+        open loop.
+
+        """
+        self.__loop_exits = {}
+
+        # Stack of open loops, as (statement number, variable) tuples
+        open_loops = []
+
+        number = 0
+        for line_number in self.__sorted_lines:
+            for statement in self.__program[line_number]:
+                number = number + 1
+                if len(statement) == 0:
+                    continue
+
+                variable = None
+                if len(statement) > 1 and statement[1].category == Token.NAME:
+                    variable = statement[1].lexeme
+
+                if statement[0].category == Token.FOR:
+                    if variable != None:
+                        open_loops.append((number - 1, variable))
+
+                elif statement[0].category == Token.NEXT:
+                    # The loop carries on from the statement after
+                    # the NEXT, which may be on the following line
+                    if variable == None:
+                        if len(open_loops) > 0:
+                            self.__loop_exits[open_loops.pop()] = number
+
+                    else:
+                        for loop in open_loops:
+                            if loop[1] == variable:
+                                self.__loop_exits[loop] = number
+
+                        open_loops = [
+                            loop for loop in open_loops if loop[1] != variable
+                        ]
+
+    def __compile(self, line_number):
+        """Returns the compiled statements of the line with the
+        specified line number, compiling them on first use
 
         :param line_number: The line number
 
-        :return: The FlowSignal to indicate to the program
-        how to branch if necessary, None otherwise
+        :return: A tuple of closures, one for each statement
+        of the line
 
         """
-        if line_number not in self.__program.keys():
-            raise RuntimeError("Line number " + line_number + " does not exist")
+        compiled = self.__compiled.get(line_number)
+
+        if compiled == None:
+            if line_number not in self.__program.keys():
+                raise RuntimeError(
+                    "Line number " + str(line_number) + " does not exist"
+                )
 
-        statement = self.__program[line_number]
+            # First execution of this line, so compile it
+            # and keep the result for subsequent executions
+            statements = self.__program[line_number]
+            compiled = self.__parser.compile_statements(statements, line_number)
+            if self.__generator != None:
+                compiled = self.__generator.generate(statements, line_number, compiled)
 
+            self.__compiled[line_number] = compiled
+
+        return compiled
+
+    def execute(self, thaw=False):
+        """Execute the program. The statements of each basic block
+        are run back to back, with the program only stepping in to
+        follow a branch or to check for escape between blocks
+
+        :param thaw: True to resume the run from the program's
+        frozen image, if it has a valid one, rather than start
+        from the beginning
+
+        """
         try:
-            return self.__parser.parse(statement, line_number)
+            self.__run(thaw)
 
-        except RuntimeError as err:
-            raise RuntimeError(str(err))
+        finally:
+            if self.__image_changed:
+                self.__write_image()
 
-    def execute(self):
-        """Execute the program"""
+            # Keep the line number reached, as the statement
+            # numbers change once the program is edited
+            if self.__number != None:
+                self.__next_stmt = self.get_next_line_number()
+                self.__number = None
 
-        self.__parser = BASICParser(self.__data, self.__terminal)
+    def __run(self, thaw):
+        """Runs the program, as described for execute()
+
+        :param thaw: True to resume the run from the frozen image
+
+        """
+
+        self.__parser.reset()
         self.__data.restore(0)  # reset data pointer
+        self.__return_stack.clear()
 
-        line_numbers = self.line_numbers()
+        self.__index_lines()
+        line_numbers = self.__sorted_lines
+        line_index = self.__line_index
+        code = self.__code
+        statement_lines = self.__statement_lines
+        block_ends = self.__block_ends
+        count = len(code)
 
         if len(line_numbers) > 0:
-            # Set up an index into the ordered list
-            # of line numbers that can be used for
-            # sequential statement execution. The index
-            # will be incremented by one, unless modified by
-            # a jump
-            index = 0
-            self.set_next_line_number(line_numbers[index])
+            # The number of the next statement to execute, which
+            # will be incremented by one after each statement,
+            # unless modified by a branch
+            number = 0
+            if thaw:
+                number = self.__thaw()
 
             # Run through the program until the
-            # has line number has been reached
-            while True:
+            # end has been reached
+            while number < count:
                 if self.__terminal.is_esc():
                     raise KeyboardInterrupt
-                flowsignal = self.__execute(self.get_next_line_number())
-                self.__parser.last_flowsignal = flowsignal
 
-                if flowsignal:
-                    if flowsignal.ftype == FlowSignal.SIMPLE_JUMP:
-                        # GOTO or conditional branch encountered
-                        try:
-                            index = line_numbers.index(flowsignal.ftarget)
+                # Execute the statements of the block in turn,
+                # stopping at the first one requiring a branch
+                end = block_ends[number]
+                flowsignal = None
+                try:
+                    while number < end:
+                        self.__number = number
+                        flowsignal = code[number]()
+                        if flowsignal:
+                            break
 
-                        except ValueError:
-                            raise RuntimeError(
-                                "Invalid line number supplied in GOTO or conditional branch: "
-                                + str(flowsignal.ftarget)
-                            )
+                        number = number + 1
 
-                        self.set_next_line_number(flowsignal.ftarget)
+                except RuntimeError as err:
+                    raise RuntimeError(str(err))
 
-                    elif flowsignal.ftype == FlowSignal.GOSUB:
-                        # Subroutine call encountered
-                        # Add line number of next instruction to
-                        # the return stack
-                        if index + 1 < len(line_numbers):
-                            self.__return_stack.append(line_numbers[index + 1])
+                if not flowsignal:
+                    # Carry on with the following block
+                    continue
 
-                        else:
-                            raise RuntimeError(
-                                "GOSUB at end of program, nowhere to return"
-                            )
+                if flowsignal.ftype == FlowSignal.RESOLVED_JUMP:
+                    # GOTO or conditional branch to a line given as
+                    # a literal, already resolved
+                    number = flowsignal.ftarget
+
+                elif flowsignal.ftype == FlowSignal.SIMPLE_JUMP:
+                    # GOTO or conditional branch to a computed line
+                    try:
+                        number = line_index[flowsignal.ftarget]
+
+                    except KeyError:
+                        raise RuntimeError(
+                            "Invalid line number supplied in GOTO or conditional branch: "
+                            + str(flowsignal.ftarget)
+                        )
+
+                elif (
+                    flowsignal.ftype == FlowSignal.RESOLVED_GOSUB
+                    or flowsignal.ftype == FlowSignal.GOSUB
+                ):
+                    # Subroutine call encountered
+                    # Add the number of the next statement, which
+                    # may be on the same line, to the return stack
+                    if number + 1 >= count:
+                        raise RuntimeError("GOSUB at end of program, nowhere to return")
 
-                        # Set the index to be the subroutine start line
-                        # number
+                    self.__return_stack.append(number + 1)
+
+                    # Set the number to be that of the first statement
+                    # of the subroutine
+                    if flowsignal.ftype == FlowSignal.RESOLVED_GOSUB:
+                        number = flowsignal.ftarget
+
+                    else:
                         try:
-                            index = line_numbers.index(flowsignal.ftarget)
+                            number = line_index[flowsignal.ftarget]
 
-                        except ValueError:
+                        except KeyError:
                             raise RuntimeError(
                                 "Invalid line number supplied in subroutine call: "
                                 + str(flowsignal.ftarget)
                             )
 
-                        self.set_next_line_number(flowsignal.ftarget)
+                elif flowsignal.ftype == FlowSignal.RETURN:
+                    # Subroutine return encountered
+                    # Discard any loops left active within the
+                    # subroutine, then pop return address from the stack
+                    while len(self.__return_stack) > 0 and isinstance(
+                        self.__return_stack[-1], LoopFrame
+                    ):
+                        self.__return_stack.pop()
+
+                    try:
+                        number = self.__return_stack.pop()
+
+                    except IndexError:
+                        raise RuntimeError(
+                            "RETURN encountered without corresponding "
+                            + "subroutine call in line "
+                            + str(line_numbers[statement_lines[number]])
+                        )
+
+                elif flowsignal.ftype == FlowSignal.STOP:
+                    break
+
+                elif flowsignal.ftype == FlowSignal.FREEZE:
+                    # Save the state of the run, then carry on
+                    # at the next statement
+                    self.__freeze(number)
+                    number = number + 1
+
+                elif flowsignal.ftype == FlowSignal.LOOP_BEGIN:
+                    # Loop start encountered
+                    # A loop already running on the same variable
+                    # is replaced by this one
+                    frame = flowsignal.ftarget
+                    self.__end_loop(frame.variable)
+
+                    # Continue to the next statement in the loop
+                    number = number + 1
+
+                    if number >= count:
+                        # Reached end of program
+                        raise RuntimeError("Program terminated within a loop")
+
+                    # Put loop frame on the stack so that NEXT can
+                    # return to the loop body
+                    frame.body = number
+                    self.__return_stack.append(frame)
+
+                elif flowsignal.ftype == FlowSignal.LOOP_SKIP:
+                    # Loop variable has reached end value, so ignore
+                    # all statements within loop and move past the
+                    # corresponding NEXT statement. A loop without
+                    # a NEXT runs to the end of the program
+                    self.__end_loop(flowsignal.ftarget)
+                    number = self.__loop_exits.get((number, flowsignal.ftarget), count)
+
+                elif flowsignal.ftype == FlowSignal.LOOP_REPEAT:
+                    # Loop repeat encountered
+                    # Find the loop frame on the stack, discarding
+                    # any inner loops that were left by a jump
+                    frame = self.__find_loop(flowsignal.ftarget)
+
+                    if frame == None:
+                        raise RuntimeError(
+                            "NEXT encountered without corresponding "
+                            + "FOR loop in line "
+                            + str(line_numbers[statement_lines[number]])
+                        )
+
+                    if frame.next():
+                        # Return to the start of the loop body
+                        number = frame.body
 
-                    elif flowsignal.ftype == FlowSignal.RETURN:
-                        # Subroutine return encountered
-                        # Pop return address from the stack
-                        try:
-                            index = line_numbers.index(self.__return_stack.pop())
+                    else:
+                        # Loop complete, continue after the NEXT
+                        self.__return_stack.pop()
+                        number = number + 1
 
-                        except ValueError:
-                            raise RuntimeError(
-                                "Invalid subroutine return in line "
-                                + str(self.get_next_line_number())
-                            )
+                elif flowsignal is _COMPILE_SIGNAL:
+                    # First execution of this line, so compile it
+                    # and put its statements in place of the
+                    # placeholders, then carry on where it left off
+                    line_number = line_numbers[statement_lines[number]]
+                    start = line_index[line_number]
+                    compiled = self.__compile(line_number)
 
-                        except IndexError:
-                            raise RuntimeError(
-                                "RETURN encountered without corresponding "
-                                + "subroutine call in line "
-                                + str(self.get_next_line_number())
-                            )
+                    for position in range(len(compiled)):
+                        code[start + position] = compiled[position]
 
-                        self.set_next_line_number(line_numbers[index])
-
-                    elif flowsignal.ftype == FlowSignal.STOP:
-                        break
-
-                    elif flowsignal.ftype == FlowSignal.LOOP_BEGIN:
-                        # Loop start encountered
-                        # Put loop line number on the stack so
-                        # that it can be returned to when the loop
-                        # repeats
-                        # self.__return_stack.append(self.get_next_line_number())
-                        self.__return_stack.append(line_numbers[index])
-
-                        # Continue to the next statement in the loop
-                        index = index + 1
-
-                        if index < len(line_numbers):
-                            self.set_next_line_number(line_numbers[index])
-
-                        else:
-                            # Reached end of program
-                            raise RuntimeError("Program terminated within a loop")
-
-                    elif flowsignal.ftype == FlowSignal.LOOP_SKIP:
-                        # Loop variable has reached end value, so ignore
-                        # all statements within loop and move past the corresponding
-                        # NEXT statement
-                        index = index + 1
-                        while index < len(line_numbers):
-                            next_line_number = line_numbers[index]
-                            temp_tokenlist = self.__program[next_line_number]
-
-                            if (
-                                temp_tokenlist[0].category == Token.NEXT
-                                and len(temp_tokenlist) > 1
-                            ):
-                                # Check the loop variable to ensure we have not found
-                                # the NEXT statement for a nested loop
-                                if temp_tokenlist[1].lexeme == flowsignal.ftarget:
-                                    # Move the statement after this NEXT, if there
-                                    # is one
-                                    index = index + 1
-                                    if index < len(line_numbers):
-                                        next_line_number = line_numbers[
-                                            index
-                                        ]  # Statement after the NEXT
-                                        self.set_next_line_number(next_line_number)
-                                        break
-
-                            index = index + 1
-
-                        # Check we have not reached end of program
-                        if index >= len(line_numbers):
-                            # Terminate the program
-                            break
+        else:
+            raise RuntimeError("No statements to execute")
 
-                    elif flowsignal.ftype == FlowSignal.LOOP_REPEAT:
-                        # Loop repeat encountered
-                        # Pop the loop start address from the stack
-                        try:
-                            index = line_numbers.index(self.__return_stack.pop())
+    def __address(self, number):
+        """Returns the address of a statement as it is kept in a
+        frozen image, which unlike the statement number does not
+        change as other lines are edited
 
-                        except ValueError:
-                            raise RuntimeError(
-                                "Invalid loop exit in line "
-                                + str(self.get_next_line_number())
-                            )
+        :param number: The number of the statement
 
-                        except IndexError:
-                            raise RuntimeError(
-                                "NEXT encountered without corresponding "
-                                + "FOR loop in line "
-                                + str(self.get_next_line_number())
-                            )
+        :return: A list of the line number of the statement and
+        its position within the line
 
-                        self.set_next_line_number(line_numbers[index])
+        """
+        line_number = self.__sorted_lines[self.__statement_lines[number]]
 
-                else:
-                    index = index + 1
+        return [line_number, number - self.__line_index[line_number]]
 
-                    if index < len(line_numbers):
-                        self.set_next_line_number(line_numbers[index])
+    def __freeze(self, number):
+        """Makes an image of the state of the run at a FREEZE
+        statement: the variables, open input files, DATA pointer
+        and return stack, together with a checksum of the program
+        text and the size and modification time of every file read
+        so far. The image is kept with the program and, if it was
+        loaded from a file, written alongside that file once the
+        run ends, so that only the last image of the run is written.
 
-                    else:
-                        # Reached end of program
-                        break
+        :param number: The number of the FREEZE statement
 
-        else:
-            raise RuntimeError("No statements to execute")
+        """
+        line_number, position = self.__address(number)
+        image = self.__parser.freeze(line_number)
+        image["version"] = FROZEN_VERSION
+        image["program"] = self.__checksum()
+        image["line"] = line_number
+        image["statement"] = position
+        image["data"] = self.__data.getPointer()
+        image["read"] = [[name, self.__file_stamp(name)] for name in image["read"]]
+
+        # Return addresses are kept as their line number and
+        # statement position, and loops as their variable, end and
+        # step values and the line number and statement position
+        # of the start of their body
+        stack = []
+        for entry in self.__return_stack:
+            if isinstance(entry, LoopFrame):
+                entry = [entry.variable, entry.end, entry.step] + self.__address(
+                    entry.body
+                )
+
+            else:
+                entry = self.__address(entry)
+
+            stack.append(entry)
+
+        image["stack"] = stack
+        self.__image = image
+        self.__image_changed = True
+
+    def __write_image(self):
+        """Writes the frozen image alongside the file the program
+        was loaded from, unless it is the same as the image this
+        session last wrote, to spare the file system needless writes
+
+        """
+        self.__image_changed = False
+        if self.__file == None:
+            return
+
+        text = dumps(self.__image)
+        if text == self.__image_text:
+            return
+
+        try:
+            with open(self.__image_file(), "w") as outfile:
+                outfile.write(text)
+
+            self.__image_text = text
+
+        except OSError:
+            # The image is still kept in memory for this session
+            pass
+
+    def __thaw(self):
+        """Restores the state of the run from the program's frozen
+        image. The run time state must already have been reset.
+
+        :return: The number of the statement following the FREEZE
+        statement, or zero to start from the beginning if there is
+        no valid image
+
+        """
+        image = self.__valid_image()
+        if image == None:
+            return 0
+
+        self.__parser.thaw(image)
+        self.__data.setPointer(image["data"])
+
+        line_index = self.__line_index
+        for entry in image["stack"]:
+            if len(entry) == 2:
+                entry = line_index[entry[0]] + entry[1]
+
+            else:
+                frame = self.__parser.loop_frame(entry[0], entry[1], entry[2])
+                frame.body = line_index[entry[3]] + entry[4]
+                entry = frame
+
+            self.__return_stack.append(entry)
+
+        return line_index[image["line"]] + image["statement"] + 1
+
+    def has_frozen_image(self):
+        """Checks whether a run of the program can be resumed
+        from its frozen image
+
+        :return: True if there is an image made by the program
+        as it is now, from input files which have not changed
+        since, otherwise False
+
+        >>> from .lexer import Lexer
+        >>> from .term import SimpleTerm
+        >>> lexer = Lexer()
+        >>> program = Program(SimpleTerm())
+        >>> program.add_stmt(lexer.tokenize('10 PRINT "SETUP"'))
+        >>> program.add_stmt(lexer.tokenize('20 LET T = 0'))
+        >>> program.add_stmt(lexer.tokenize('30 FOR I = 1 TO 3'))
+        >>> program.add_stmt(lexer.tokenize('40 LET T = T + I : FREEZE'))
+        >>> program.add_stmt(lexer.tokenize('50 NEXT I : PRINT T'))
+        >>> program.execute()
+        SETUP
+        6
+        >>> program.has_frozen_image()
+        True
+        >>> program.execute(thaw=True)
+        6
+        >>> program.add_stmt(lexer.tokenize('10 PRINT "AGAIN"'))
+        >>> program.has_frozen_image()
+        False
+        >>> program.execute(thaw=True)
+        AGAIN
+        6
+        """
+        return self.__valid_image() != None
+
+    def __valid_image(self):
+        """Returns the frozen image of the program, read from
+        alongside the program file if it was not made in this
+        session, provided it is still valid. An image is no longer
+        valid once the program text, or any file read before the
+        FREEZE statement, has changed.
+
+        :return: The image, or None if there is no valid image
+
+        """
+        image = self.__image
+        if image == None:
+            if self.__file == None:
+                return None
+
+            try:
+                with open(self.__image_file(), "r") as infile:
+                    image = loads(infile.read())
+
+            except (OSError, ValueError):
+                return None
+
+        if (
+            image.get("version") != FROZEN_VERSION
+            or image["program"] != self.__checksum()
+        ):
+            return None
+
+        for name, stamp in image["read"]:
+            if self.__file_stamp(name) != stamp:
+                return None
+
+        self.__index_lines()
+        if image["line"] not in self.__line_index:
+            return None
+
+        return image
+
+    def __image_file(self):
+        """Returns the name and path of the frozen image kept
+        alongside the file the program was loaded from
+
+        """
+        return self.__file[: self.__file.rfind(".")] + FROZEN_EXTENSION
+
+    def __checksum(self):
+        """Returns a checksum of the program text, which
+        changes whenever any line of the program is edited
+
+        """
+        return crc32(str(self).encode("utf-8"))
+
+    def __file_stamp(self, file):
+        """Returns the size and modification time of a file
+
+        :param file: The name and path of the file
+
+        :return: A list of the size and modification time,
+        or None if the file does not exist
+
+        """
+        try:
+            status = stat(file)
+            return [status[6], status[8]]
+
+        except OSError:
+            return None
+
+    def __find_loop(self, variable):
+        """Finds the innermost active loop on the return stack
+        for the specified variable. Any loops above it on the
+        stack, left active by jumping out of them, are discarded.
+        The search does not extend past a subroutine return
+        address.
+
+        :param variable: The name of the loop variable, or None
+        to find the innermost loop
+
+        :return: The LoopFrame, or None if there is no such loop
+
+        """
+        position = len(self.__return_stack) - 1
+
+        while position >= 0 and isinstance(self.__return_stack[position], LoopFrame):
+            frame = self.__return_stack[position]
+
+            if variable == None or frame.variable == variable:
+                del self.__return_stack[position + 1 :]
+                return frame
+
+            position = position - 1
+
+        return None
+
+    def __end_loop(self, variable):
+        """Removes any active loop for the specified variable from
+        the return stack, so that a FOR statement re-entering the
+        loop does not leave a stale frame behind. Loops above it
+        are left in place, as programs commonly jump out of an
+        inner loop and then start a new loop over the same
+        variable from within an enclosing one.
+
+        :param variable: The name of the loop variable
+
+        """
+        position = len(self.__return_stack) - 1
+
+        while position >= 0 and isinstance(self.__return_stack[position], LoopFrame):
+            if self.__return_stack[position].variable == variable:
+                del self.__return_stack[position]
+                return
+
+            position = position - 1
 
     def delete(self):
         """Deletes the program by emptying the dictionary"""
         self.__program.clear()
+        self.__compiled.clear()
+        self.__branches.clear()
+        self.__sorted_lines.clear()
+        self.__line_index = None
         self.__data.delete()
+        self.__file = None
+        self.__image = None
+        self.__image_changed = False
+        self.__image_text = None
 
     def delete_statement(self, line_number):
         """Deletes a statement from the program with
@@ -464,12 +1518,111 @@ class Program:
 
         """
         self.__data.delData(line_number)
+        self.__compiled.pop(line_number, None)
+        self.__line_index = None
         try:
             del self.__program[line_number]
 
         except KeyError:
             raise KeyError("Line number does not exist")
 
+        del self.__sorted_lines[bisect_left(self.__sorted_lines, line_number)]
+
+    def register_function(self, name, function, types=""):
+        """Adds a function implemented in Python to the language,
+        such as one reading a pin or sensor, which programs then
+        call like any built in function, e.g. ADC(0). Functions
+        should be registered before the program is entered or
+        loaded, as lines already tokenized treat the name as a
+        variable.
+
+        :param name: The name of the function, ending in $ if it
+        returns a string
+        :param function: The Python callable, passed the value of
+        each argument in turn
+        :param types: A string with a character for each argument,
+        N for a number or S for a string
+
+        """
+        self.__register(name, function, types, False)
+
+    def register_statement(self, name, function, types=""):
+        """Adds a statement implemented in Python to the language,
+        such as one setting a pin, which programs then use like any
+        built in statement, with its arguments following the keyword,
+        e.g. LED 1, 0. Statements should be registered before the
+        program is entered or loaded.
+
+        :param name: The keyword of the statement
+        :param function: The Python callable, passed the value of
+        each argument in turn
+        :param types: A string with a character for each argument,
+        N for a number or S for a string
+
+        """
+        self.__register(name, function, types, True)
+
+    def __register(self, name, function, types, statement):
+        """Registers a function or statement implemented in Python
+        with the parser, making its name a keyword if it is not one
+        already
+
+        :param name: The keyword
+        :param function: The Python callable
+        :param types: The type of each argument, N or S
+        :param statement: True for a statement, False for a function
+
+        """
+        name = name.upper()
+        category = Token.keywords.get(name)
+        if category == None:
+            category = self.__keywords.get(name)
+
+        if category == None:
+            # Give the keyword the next token category free in
+            # this program. Other programs may give the same
+            # category to keywords of their own
+            category = len(Token.catnames) + len(self.__keywords)
+            self.__keywords[name] = category
+
+        parse = native_parse(name, function, types, statement)
+        if statement:
+            self.__parser.register_statement(category, parse)
+        else:
+            self.__parser.register_function(category, parse)
+
+        # Compiled statements may have used the keyword
+        # before it was registered
+        self.__compiled.clear()
+        self.__line_index = None
+
+    def keywords(self):
+        """Returns the keywords added to the language by registering
+        statements and functions with the program, to be passed to
+        a Lexer tokenizing lines for the program. The dictionary is
+        updated as further statements and functions are registered.
+
+        :return: A dictionary mapping each keyword to its token category
+
+        """
+        return self.__keywords
+
+    def variables(self):
+        """Returns the variables left by the last run of the program
+
+        :return: A dictionary mapping each variable name to its value
+
+        """
+        return self.__parser.variables()
+
+    def arrays(self):
+        """Returns the arrays left by the last run of the program
+
+        :return: A dictionary mapping each array name to its BASICArray
+
+        """
+        return self.__parser.arrays()
+
     def get_next_line_number(self):
         """Returns the line number of the next statement
         to be executed
@@ -477,6 +1630,8 @@ class Program:
         :return: The line number
 
         """
+        if self.__number != None:
+            return self.__sorted_lines[self.__statement_lines[self.__number]]
 
         return self.__next_stmt
 
@@ -488,3 +1643,10 @@ class Program:
 
         """
         self.__next_stmt = line_number
+        self.__number = None
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
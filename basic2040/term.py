@@ -89,9 +89,15 @@ class SimpleTerm:
         Block until recieved, does not echo
 
         Not implemented well here as it requires more
-        OS specific code or curses
+        OS specific code or curses, so a line is read and
+        its first character returned.  An empty line is
+        taken as the enter key, returning a carriage return
         """
-        return ord(input()[0])
+        line = input()
+        if line == "":
+            return 13
+
+        return ord(line[0])
 
     def poll_char(self):
         """
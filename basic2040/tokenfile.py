@@ -0,0 +1,306 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Functions to write the token lists of a program to a compact
+binary form, and to read them back, so that a program can be
+loaded without running the lexer over its text again.
+
+The binary form consists of a header, a table holding each
+distinct pairing of category and lexeme once, and then each
+statement in turn:
+
+header      Magic bytes, format version, and the size and
+            CRC32 of the text the tokens were made from (both
+            zero if there was none)
+entries     Count, then for each its category, the length and
+            UTF-8 bytes of its lexeme and, for a number, its
+            value, so that numbers need not be converted again
+statements  Count, then for each statement its line number and
+            the count of the tokens that follow it
+
+Keywords added to the language by registering statements and
+functions are given categories in the order they are registered,
+which may differ from one run to the next. Their categories are
+not written, and the category of every name and added keyword is
+found again from the keywords added when the tokens are read, just
+as the lexer would find it.
+
+The line number is written as a number rather than as a token,
+and is read back as a token with the number as its lexeme.
+Each other token is a single number, combining the position of its
+entry in the table with the gap between the end of the
+previous token and its own column. Gaps of up to two
+characters, by far the most common, take no further space.
+Numbers in the file are held seven bits to a byte, with the
+top bit set on every byte but the last, so most tokens take
+only one or two bytes.
+
+>>> from .lexer import Lexer
+>>> lexer = Lexer()
+>>> data = write_tokens([lexer.tokenize('10 LET I =  3.45')])
+>>> for tokenlist in read_tokens(data):
+...     for token in tokenlist:
+...         token.pretty_print()
+Column: 0 Category: UNSIGNEDINT Lexeme: 10
+Column: 3 Category: LET Lexeme: LET
+Column: 7 Category: NAME Lexeme: I
+Column: 9 Category: ASSIGNOP Lexeme: =
+Column: 12 Category: UNSIGNEDFLOAT Lexeme: 3.45
+>>> source_stamp(data)
+(0, 0)
+"""
+
+from struct import pack, unpack_from
+
+from .basictoken import BASICToken as Token
+
+# Identifies a tokenized program, and the version of its layout
+MAGIC = b"B2KT"
+VERSION = 3
+
+# Magic, version, source size and source CRC32
+_HEADER = "<4sBII"
+_HEADER_SIZE = 13
+
+# Category byte written for a token without a category
+_NO_CATEGORY = 0xFF
+
+# Category byte written for a keyword added to the language
+_ADDED_KEYWORD = 0xFE
+
+# The gap field of a token indicating that the gap follows
+_LONG_GAP = 3
+
+
+def _number(value):
+    """Encodes a non-negative number seven bits to a byte
+
+    :param value: The number
+
+    :return: The encoded number, as bytes
+    """
+    encoded = bytearray()
+    while value >= 0x80:
+        encoded.append(0x80 | (value & 0x7F))
+        value = value >> 7
+
+    encoded.append(value)
+
+    return bytes(encoded)
+
+
+def _read_number(data, offset):
+    """Decodes a number held seven bits to a byte
+
+    :param data: The binary form
+    :param offset: The position of the number within it
+
+    :return: A tuple of the number and the position following it
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset = offset + 1
+        value = value | ((byte & 0x7F) << shift)
+        if byte < 0x80:
+            return value, offset
+
+        shift = shift + 7
+
+
+def _width(category, lexeme):
+    """Returns the number of characters the lexeme of a token
+    took up in the statement, counting the quotes of a string
+
+    :param category: The category of the token
+    :param lexeme: The lexeme of the token
+
+    :return: The width of the token
+    """
+    if category == Token.STRING:
+        return len(lexeme) + 2
+
+    return len(lexeme)
+
+
+def write_tokens(tokenlists, source_size=0, source_crc=0):
+    """Builds the binary form of the supplied token lists
+
+    :param tokenlists: The token lists of the program, each
+    starting with its line number
+    :param source_size: The size of the source text, in bytes
+    :param source_crc: The CRC32 of the source text
+
+    :return: The binary form, as bytes
+    """
+    entries = []
+    positions = {}
+    parts = []
+
+    for tokenlist in tokenlists:
+        parts.append(_number(tokenlist[0].value))
+        parts.append(_number(len(tokenlist) - 1))
+        end = len(str(tokenlist[0].value))
+
+        for token in tokenlist[1:]:
+            key = (token.category, token.lexeme)
+            position = positions.get(key)
+            if position == None:
+                position = len(entries)
+                positions[key] = position
+                entries.append(token)
+
+            gap = token.column - end
+            if 0 <= gap < _LONG_GAP:
+                parts.append(_number((position << 2) | gap))
+
+            else:
+                # Fold negative gaps, which can follow a lexeme
+                # that changed length when put into upper case
+                parts.append(_number((position << 2) | _LONG_GAP))
+                if gap < 0:
+                    parts.append(_number(-gap * 2 - 1))
+                else:
+                    parts.append(_number(gap * 2))
+
+            end = token.column + _width(token.category, token.lexeme)
+
+    table = [
+        pack(_HEADER, MAGIC, VERSION, source_size, source_crc),
+        _number(len(entries)),
+    ]
+    for token in entries:
+        encoded = token.lexeme.encode("utf-8")
+        if token.category == None:
+            table.append(bytes((_NO_CATEGORY,)))
+        elif token.category >= len(Token.catnames):
+            table.append(bytes((_ADDED_KEYWORD,)))
+        else:
+            table.append(bytes((token.category,)))
+
+        table.append(_number(len(encoded)))
+        table.append(encoded)
+
+        if token.category == Token.UNSIGNEDFLOAT:
+            table.append(pack("<d", token.value))
+
+        elif token.category == Token.UNSIGNEDINT:
+            table.append(_number(token.value))
+
+    table.append(_number(len(tokenlists)))
+
+    return b"".join(table) + b"".join(parts)
+
+
+def source_stamp(data):
+    """Returns the size and CRC32 of the source text
+    recorded in the binary form of a program
+
+    :param data: The binary form
+
+    :return: A tuple of the size and CRC32, or None if the
+    data is not a tokenized program of this version
+    """
+    if len(data) < _HEADER_SIZE:
+        return None
+
+    magic, version, source_size, source_crc = unpack_from(_HEADER, data, 0)
+    if magic != MAGIC or version != VERSION:
+        return None
+
+    return source_size, source_crc
+
+
+def read_tokens(data, keywords=None):
+    """Rebuilds the token lists from the binary form of a
+    program. Tokens with the same lexeme share a single
+    string, and numbers a single value.
+
+    :param data: The binary form
+    :param keywords: A dictionary mapping the keywords added to
+    the language to their token categories, as given to the Lexer,
+    or None if there are none
+
+    :return: A list of token lists, each starting with its
+    line number
+    """
+    if source_stamp(data) == None:
+        raise ValueError("Not a tokenized program")
+
+    # Each entry is held as its category, lexeme, value and width
+    entries = []
+    count, offset = _read_number(data, _HEADER_SIZE)
+    for i in range(count):
+        category = data[offset]
+        if category == _NO_CATEGORY:
+            category = None
+
+        length, offset = _read_number(data, offset + 1)
+        lexeme = str(data[offset : offset + length], "utf-8")
+        offset = offset + length
+
+        if category == Token.NAME or category == _ADDED_KEYWORD:
+            category = Token.NAME
+            if keywords:
+                category = keywords.get(lexeme, Token.NAME)
+
+        value = None
+        if category == Token.UNSIGNEDFLOAT:
+            value = unpack_from("<d", data, offset)[0]
+            offset = offset + 8
+
+        elif category == Token.UNSIGNEDINT:
+            value, offset = _read_number(data, offset)
+
+        entries.append((category, lexeme, value, _width(category, lexeme)))
+
+    count, offset = _read_number(data, offset)
+    tokenlists = []
+    for i in range(count):
+        line_number, offset = _read_number(data, offset)
+        length, offset = _read_number(data, offset)
+        lexeme = str(line_number)
+        tokenlist = [Token(0, Token.UNSIGNEDINT, lexeme, line_number)]
+        end = len(lexeme)
+
+        for j in range(length):
+            code = data[offset]
+            offset = offset + 1
+            if code >= 0x80:
+                code, offset = _read_number(data, offset - 1)
+
+            gap = code & 3
+            if gap == _LONG_GAP:
+                gap, offset = _read_number(data, offset)
+                if gap & 1:
+                    gap = -((gap + 1) >> 1)
+                else:
+                    gap = gap >> 1
+
+            category, lexeme, value, width = entries[code >> 2]
+            column = end + gap
+            tokenlist.append(Token(column, category, lexeme, value))
+            end = column + width
+
+        tokenlists.append(tokenlist)
+
+    return tokenlists
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
@@ -0,0 +1,313 @@
+import os
+import sys
+import tracemalloc
+from time import monotonic
+from basic2040.term import SimpleTerm
+from basic2040.program import Program
+from basic2040.lexer import Lexer
+
+
+class NullTerm(SimpleTerm):
+    """
+    A terminal which discards all output, so that
+    benchmarks measure the interpreter rather than
+    the console
+    """
+
+    def print(self, to_print):
+        return
+
+    def write(self, to_write):
+        return
+
+    def enter(self):
+        return
+
+
+def load_lines(program, lines):
+    """
+    Tokenizes and adds the supplied list of program lines
+    """
+    lexer = Lexer()
+    for line in lines:
+        program.add_stmt(lexer.tokenize(line))
+
+
+def jump_benchmark(sizes=(100, 400, 1600, 6400), iterations=2000):
+    """
+    Times GOTO/IF branches in programs of increasing size.
+    Each program is padded with REM lines between a
+    short loop at the start and its branch back from
+    the final line, so every iteration jumps across
+    the whole program twice.  The cost per jump should
+    not grow with program size.
+    """
+    print("Jump cost by program size")
+    for size in sizes:
+        lines = ["10 I = 0", "20 I = I + 1", "30 GOTO " + str(size * 10)]
+        for line_number in range(4, size):
+            lines.append(str(line_number * 10) + " REM PADDING")
+        lines.append(str(size * 10) + " IF I < " + str(iterations) + " THEN 20")
+
+        program = Program(NullTerm())
+        load_lines(program, lines)
+
+        start = monotonic()
+        program.execute()
+        elapsed = monotonic() - start
+
+        print(
+            "  %5d lines: %6.2f us per jump"
+            % (size, elapsed * 1000000 / (iterations * 2))
+        )
+
+
+def lexer_benchmark(directory="BAS", repeats=5):
+    """
+    Times tokenization of every BASIC program in the
+    supplied directory.  Each file is read once and then
+    tokenized line by line, keeping the best of several
+    repeats to reduce the effect of other activity on
+    the machine.
+    """
+    print("Lexer speed by program")
+    lexer = Lexer()
+    total_chars = 0
+    total_time = 0
+    for filename in sorted(os.listdir(directory)):
+        if not filename.lower().endswith(".bas"):
+            continue
+
+        with open(directory + "/" + filename, "r") as infile:
+            lines = [
+                line.replace("\r", "").replace("\n", "").strip() for line in infile
+            ]
+        chars = sum(len(line) for line in lines)
+
+        best = None
+        for repeat in range(repeats):
+            start = monotonic()
+            for line in lines:
+                lexer.tokenize(line)
+            elapsed = monotonic() - start
+            if best == None or elapsed < best:
+                best = elapsed
+
+        total_chars = total_chars + chars
+        total_time = total_time + best
+        print(
+            "  %-24s %7d chars %8.2f ms %6.2f MB/s"
+            % (filename, chars, best * 1000, chars / best / 1000000)
+        )
+
+    print(
+        "  %-24s %7d chars %8.2f ms %6.2f MB/s"
+        % ("total", total_chars, total_time * 1000, total_chars / total_time / 1000000)
+    )
+
+
+def load_benchmark(
+    names=("amazing", "eliza", "PyBStartrek", "adventure-fast"), repeats=20
+):
+    """
+    Times loading each of the larger sample programs,
+    including building the line index that a RUN would
+    otherwise have to build first, keeping the best of
+    several repeats.
+    """
+    print("Load time by program")
+    for name in names:
+        program = Program(NullTerm())
+        best = None
+        for repeat in range(repeats):
+            start = monotonic()
+            program.load("BAS/" + name + ".bas")
+            lines = len(program.line_numbers())
+            elapsed = monotonic() - start
+            if best == None or elapsed < best:
+                best = elapsed
+
+        print("  %-16s %5d lines %8.2f ms" % (name, lines, best * 1000))
+
+
+def memory_report(
+    names=(
+        "factorial",
+        "bagels",
+        "amazing",
+        "eliza",
+        "PyBStartrek",
+        "adventure-fast",
+    )
+):
+    """
+    Reports the memory taken up by each of the sample
+    programs once loaded, measured as the difference in
+    traced allocations before and after the load.  The
+    token count is taken from a separate tokenization of
+    the same file, so that it is not included in the
+    footprint.
+    """
+    print("Memory footprint of loaded programs")
+    lexer = Lexer()
+    for name in names:
+        path = "BAS/" + name + ".bas"
+        tokens = 0
+        with open(path, "r") as infile:
+            for line in infile:
+                line = line.replace("\r", "").replace("\n", "").strip()
+                tokens = tokens + len(lexer.tokenize(line))
+
+        program = Program(NullTerm())
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        program.load(path)
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        print(
+            "  %-16s %6d tokens %8d bytes %6.1f bytes per token"
+            % (name, tokens, after - before, (after - before) / tokens)
+        )
+
+
+def array_benchmark(size=100, repeats=5):
+    """
+    Reports the memory taken up by a two dimensional
+    numeric array once dimensioned, and the time taken
+    to fill every element and then read each one back,
+    first with integer values and then with floats,
+    keeping the best of several repeats.
+    """
+    print("Array storage for DIM A(%d,%d)" % (size, size))
+    program = Program(NullTerm())
+    load_lines(program, ["10 DIM A(%d,%d)" % (size, size)])
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    program.execute()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(
+        "  %-16s %8d bytes %6.1f bytes per element"
+        % ("dimensioned", after - before, (after - before) / (size + 1) ** 2)
+    )
+
+    for label, value in (("integers", "I + J"), ("floats", "I / 2 + J")):
+        program = Program(NullTerm())
+        loops = ["FOR I = 0 TO %d" % size, "FOR J = 0 TO %d" % size]
+        load_lines(
+            program,
+            [
+                "10 DIM A(%d,%d)" % (size, size),
+                "20 " + loops[0],
+                "30 " + loops[1],
+                "40 A(I,J) = " + value,
+                "50 NEXT J",
+                "60 NEXT I",
+                "70 T = 0",
+                "80 " + loops[0],
+                "90 " + loops[1],
+                "100 T = T + A(I,J)",
+                "110 NEXT J",
+                "120 NEXT I",
+            ],
+        )
+
+        best = None
+        for repeat in range(repeats):
+            start = monotonic()
+            program.execute()
+            elapsed = monotonic() - start
+            if best == None or elapsed < best:
+                best = elapsed
+
+        print(
+            "  %-16s %8.2f ms %6.2f us per element access"
+            % (label, best * 1000, best * 1000000 / (2 * (size + 1) ** 2))
+        )
+
+
+def variable_benchmark(iterations=20000, repeats=5):
+    """
+    Times a loop reading and assigning simple variables,
+    with variables looked up by name, then held in slots,
+    and then with the statements translated into Python,
+    keeping the best of several repeats.
+    """
+    print("Variable access by storage")
+    lines = [
+        "10 A = 1",
+        "20 B = 2",
+        "30 FOR I = 1 TO " + str(iterations),
+        "40 C = A + B * I",
+        "50 A = C - A",
+        "60 NEXT I",
+    ]
+    for label, slots, codegen in (
+        ("names", False, False),
+        ("slots", True, False),
+        ("codegen", True, True),
+    ):
+        program = Program(NullTerm(), slots, codegen)
+        load_lines(program, lines)
+
+        best = None
+        for repeat in range(repeats):
+            start = monotonic()
+            program.execute()
+            elapsed = monotonic() - start
+            if best == None or elapsed < best:
+                best = elapsed
+
+        print(
+            "  %-16s %8.2f ms %6.2f us per iteration"
+            % (label, best * 1000, best * 1000000 / iterations)
+        )
+
+
+def expression_benchmark(iterations=20000, repeats=5):
+    """
+    Times a loop evaluating an expression made up mostly of
+    constants, which are folded when the statement is
+    compiled, keeping the best of several repeats.
+    """
+    print("Expression with constant parts")
+    program = Program(NullTerm())
+    load_lines(
+        program,
+        [
+            "10 FOR I = 1 TO " + str(iterations),
+            "20 X = I * (3.14159 / 180) + SQR(2) * PI / 2",
+            "30 NEXT I",
+        ],
+    )
+
+    best = None
+    for repeat in range(repeats):
+        start = monotonic()
+        program.execute()
+        elapsed = monotonic() - start
+        if best == None or elapsed < best:
+            best = elapsed
+
+    print(
+        "  %-16s %8.2f ms %6.2f us per iteration"
+        % ("folded", best * 1000, best * 1000000 / iterations)
+    )
+
+
+def main():
+    print("+++++++++ BENCHMARKS STARTING +++++")
+    jump_benchmark()
+    lexer_benchmark()
+    load_benchmark()
+    memory_report()
+    array_benchmark()
+    variable_benchmark()
+    expression_benchmark()
+    print("+++++++++ BENCHMARKS COMPLETE +++++")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,42 @@ from basic2040.term import TestTerm
 from basic2040.program import Program
 
 
+def register_natives(program):
+    """
+    Registers the statements and functions written in Python
+    that the tests use, which must be done before the tests
+    are loaded
+    """
+    memory = {}
+    program.register_statement("POKE", memory.__setitem__, "NN")
+    program.register_function("PEEK", memory.get, "N")
+    program.register_function("REPEAT$", lambda text, count: text * count, "SN")
+
+
 def main():
     try:
         print("+++++++++ TESTS STARTING +++++")
-        terminal = TestTerm()
-        test_program = Program(terminal)
-        test_program.load("BAS/tests.bas")
-        test_program.execute()
+        # Run the tests with variables held by name, then in slots,
+        # each with and without statements translated into Python
+        for slots, codegen in (
+            (False, False),
+            (True, False),
+            (False, True),
+            (True, True),
+        ):
+            terminal = TestTerm()
+            test_program = Program(terminal, slots, codegen)
+            register_natives(test_program)
+            test_program.load("BAS/tests.bas")
+            try:
+                test_program.execute()
+
+            except RuntimeError as e:
+                # The last test may end the run with an error,
+                # whose message is then the result of that test
+                terminal.write(str(e))
+                terminal.enter()
+
         print("+++++++++ TESTS COMPLETE +++++")
         # Exit with success code
         sys.exit(0)